@@ -1,12 +1,13 @@
 # -*- mode: python ; coding: utf-8 -*-
+from PyInstaller.utils.hooks import collect_data_files
 
 
 a = Analysis(
     ['viki_ui.py'],
     pathex=[],
     binaries=[],
-    datas += [('jarvis', 'jarvis'), ('click.wav', '.')],
-    hiddenimports=['PIL.Image', 'PIL.ImageTk', 'tkinter', 'tkinter.scrolledtext', 'tkinter.messagebox', 'tkinter.filedialog', 'customtkinter'],
+    datas=[('jarvis', 'jarvis'), ('click.wav', '.'), ('plugins', 'plugins')] + collect_data_files('pocketsphinx'),
+    hiddenimports=['viki_llm', 'pocketsphinx', 'PIL.Image', 'PIL.ImageTk', 'tkinter', 'tkinter.scrolledtext', 'tkinter.messagebox', 'tkinter.filedialog', 'customtkinter'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -0,0 +1,21 @@
+import viki_llm  # only imported once someone asks the AI something
+
+
+def get_chatgpt_response(prompt):
+    try:
+        return viki_llm.default_client().complete(prompt)
+    except viki_llm.LLMTimeout:
+        return "Sorry, the AI took too long to answer."
+    except viki_llm.LLMError as e:
+        return f"Error: {str(e)}"
+
+
+def answer(context, question):
+    context.speak(get_chatgpt_response(question))
+
+
+def handle(context, query, argument):
+    if argument:
+        answer(context, argument)
+    else:
+        context.ask("What would you like to ask?", lambda question: answer(context, question))
@@ -1,77 +1,177 @@
 import os
-import webbrowser
 import datetime
 import speech_recognition as sr
 import pyttsx3
-import openai
-import wikipedia
-import subprocess
 import time
 import threading
+import contextlib
+import importlib.util
 import requests
-from bs4 import BeautifulSoup
 import urllib.request
 import re
+import logging
+import viki_actions
+from viki_actions import executor as actions
+from viki_tts_cache import TTSCache, COMMON_PHRASES
+from viki_reader import ArticleReader, fetch_wikipedia_reader
+import viki_knowledge
+import viki_search
+import viki_audio
+import viki_log
+from viki_hedge import Hedger, AllBackendsFailed
+from viki_dialog import DialogManager, UNHANDLED
+import viki_compound
+from viki_plugins import PluginRegistry, PluginContext
+
+log = logging.getLogger(__name__)
 
 # Initialize the speech engine
 try:
     engine = pyttsx3.init()
 except Exception as e:
     engine = None
-    print("Warning: pyttsx3 initialization failed. Text-to-speech functionality will be disabled.")
+    log.warning("pyttsx3 initialization failed. Text-to-speech functionality will be disabled.")
 
 # Initialize recognizer
 recognizer = sr.Recognizer()
 
-openai.api_key = 'paste your api key here'
 
-print("API Key:", "Present" if openai.api_key else "Missing")
+# --- Sessions ---
+# perform_task always runs on behalf of a session: the local microphone/UI user by
+# default, or a remote client of viki_server. The session decides where spoken
+# output goes and where follow-up answers come from, and holds per-user state
+# such as the article currently being read.
+class Session:
+    def __init__(self, session_id="local", sink=None, listen=None):
+        self.id = session_id
+        self.sink = sink        # callable(text) receiving spoken output; None means local TTS
+        self.listen = listen    # callable() returning the user's next utterance; None means microphone
+        self.state = {}
+
+local_session = Session()
+_current = threading.local()
+
+def current_session():
+    return getattr(_current, "session", local_session)
+
+@contextlib.contextmanager
+def use_session(session):
+    previous = getattr(_current, "session", None)
+    _current.session = session
+    try:
+        yield session
+    finally:
+        _current.session = previous
+
+def session_speaker(session):
+    """Return a speak() that keeps talking to `session` from any thread."""
+    def speak_to_session(text):
+        with use_session(session):
+            speak(text)
+    return speak_to_session
+
+# Serializes use of the shared pyttsx3 engine (live speech and cache renders)
+engine_lock = threading.Lock()
+
+# Render cache for common phrases; prewarm_speech() fills it in the background
+tts_cache = None
+if engine is not None:
+    try:
+        tts_cache = TTSCache(engine, engine_lock)
+    except Exception as e:
+        log.warning("Speech cache unavailable: %s", e)
+
+def prewarm_speech():
+    """Render the common phrases in the background. Only for processes that will speak."""
+    if tts_cache is not None:
+        tts_cache.prewarm(COMMON_PHRASES, engine.getProperty("voice"), engine.getProperty("rate"))
 
 def speak(text):
+    session = current_session()
+    if session.sink is not None:
+        session.sink(text)
+        return
     if engine is None:
-        print("TTS disabled: " + text)
+        log.info("TTS disabled: %s", text)
         return
-    engine.say(text)
-    engine.runAndWait()
+    if tts_cache is not None:
+        voice, rate = engine.getProperty("voice"), engine.getProperty("rate")
+        cached_path = tts_cache.lookup(text, voice, rate)
+        if cached_path and tts_cache.play(cached_path):
+            return
+    with engine_lock:
+        engine.say(text)
+        engine.runAndWait()
+    if tts_cache is not None:
+        tts_cache.note_spoken(text, voice, rate)
+
+# Remote calls go through the hedger: a backup starts when the first attempt is slower
+# than its recent p95, and backends that keep failing are skipped for a while
+hedger = Hedger()
+RECOGNITION_TIMEOUT = 8.0
+WIKIPEDIA_TIMEOUT = 8.0
+# Socket timeout for the recognizer's HTTP calls, so an abandoned attempt frees its hedge thread
+recognizer.operation_timeout = RECOGNITION_TIMEOUT
+# The offline backup needs pocketsphinx; without it the hedge is Google alone
+HAVE_SPHINX = importlib.util.find_spec("pocketsphinx") is not None
+
+def transcribe(audio):
+    """
+    Text for an AudioData: Google first, the offline Sphinx recognizer (if pocketsphinx is
+    installed) as the hedge. Returns "" if speech was heard but not understood; raises
+    AllBackendsFailed.
+    """
+    def google(cancel):
+        try:
+            return recognizer.recognize_google(audio, language='en-US')
+        except sr.UnknownValueError:
+            return ""
 
-def get_chatgpt_response(prompt):
-    try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        return response.choices[0].message.content
-    except Exception as e:
-        return f"Error: {str(e)}"
+    def sphinx(cancel):
+        try:
+            return recognizer.recognize_sphinx(audio, language='en-US')
+        except sr.UnknownValueError:
+            return ""
+
+    attempts = [("google_stt", google)] + ([("sphinx_stt", sphinx)] if HAVE_SPHINX else [])
+    _, text = hedger.call(attempts, timeout=RECOGNITION_TIMEOUT)
+    return text
 
 def recognize_speech():
+    session = current_session()
+    if session.listen is not None:
+        return session.listen()
     with sr.Microphone() as source:
-        print("Listening...")
+        log.debug("Listening")
         recognizer.adjust_for_ambient_noise(source)
         audio = recognizer.listen(source)
+    # Trimmed 16 kHz mono: a much smaller upload than the raw capture
+    audio = viki_audio.prepare(audio)
     try:
-        query = recognizer.recognize_google(audio, language='en-US')
-        print(f"User said: {query}")
-        return query
-    except sr.UnknownValueError:
-        print("Sorry, I didn't catch that.")
-        speak("Sorry, I didn't catch that.")
+        query = transcribe(audio)
+    except AllBackendsFailed as e:
+        log.warning("Could not request results; %s", e)
         return None
-    except sr.RequestError as e:
-        print(f"Could not request results; {e}")
+    if not query:
+        log.info("Nothing recognized")
+        speak("Sorry, I didn't catch that.")
         return None
+    log.info("User said: %s", query)
+    return query
 
 def open_chrome():
     speak("Opening Google Chrome")
     try:
-        subprocess.Popen("C:\\Program Files\\Google\\Chrome\\Application\\chrome.exe")
+        if actions.launch_app("chrome") == viki_actions.NOT_FOUND:
+            speak("Chrome browser not found on your system.")
     except FileNotFoundError:
         speak("Chrome browser not found on your system.")
 
 def set_reminder(reminder_text, delay_seconds):
+    speak_later = session_speaker(current_session())
     def reminder():
         time.sleep(delay_seconds)
-        speak(f"Reminder: {reminder_text}")
+        speak_later(f"Reminder: {reminder_text}")
     reminder_thread = threading.Thread(target=reminder)
     reminder_thread.daemon = True
     reminder_thread.start()
@@ -84,17 +184,43 @@ def set_reminder(reminder_text, delay_seconds):
     speak(f"Reminder set for {time_str} from now.")
 
 SEARCH_ENGINE_ID = "82b9d3ed58f984546"
+# Custom Search JSON API key; without one, searches open in the browser
+GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY", "")
+
+_page_fetcher = None
+
+def page_fetcher():
+    global _page_fetcher
+    if _page_fetcher is None:
+        _page_fetcher = viki_search.PageFetcher()
+    return _page_fetcher
+
+def search_result_urls(query, count=viki_search.MAX_PAGES):
+    response = requests.get("https://www.googleapis.com/customsearch/v1",
+                            params={"key": GOOGLE_API_KEY, "cx": SEARCH_ENGINE_ID, "q": query, "num": count},
+                            timeout=viki_search.READ_TIMEOUT)
+    response.raise_for_status()
+    return [item["link"] for item in response.json().get("items", [])]
 
 def search_google_and_read(query):
     speak("Searching Google...")
+    if GOOGLE_API_KEY:
+        # Fetch the top results in parallel and read a short summary aloud
+        try:
+            answer = viki_search.summarize(query, page_fetcher().fetch_pages(search_result_urls(query)))
+            if answer:
+                speak(answer)
+                return
+        except Exception as e:
+            log.warning("Error reading search results: %s", e)
     try:
         # Use the Google Custom Search Engine URL directly
         search_url = f"https://cse.google.com/cse?cx={SEARCH_ENGINE_ID}&q={query}"
-        webbrowser.open(search_url)
+        actions.open_url(search_url)
         speak("Search results are on your screen.")
     except Exception as e:
         speak("Sorry, I had trouble opening the search page.")
-        print(f"Error opening search page: {e}")
+        log.warning("Error opening search page: %s", e)
 
 import json
 import os
@@ -120,181 +246,372 @@ custom_commands = load_custom_commands()
 
 import os
 
-def perform_task(query):
-    import json
-    CUSTOM_COMMANDS_FILE = "custom_commands.json"
+# Built-in intents in priority order: (intent name, trigger phrases).
+# The first intent with a trigger phrase contained in the query wins.
+BUILTIN_INTENTS = [
+    ("read_more", ["tell me more", "continue reading"]),
+    ("greeting", ["hello"]),
+    ("name", ["what's your name"]),
+    ("time", ["what is the time"]),
+    ("open_google", ["open google"]),
+    ("open_notepad", ["open notepad"]),
+    ("open_calculator", ["open calculator"]),
+    ("open_word", ["open word"]),
+    ("open_excel", ["open excel"]),
+    ("open_chrome", ["open chrome"]),
+    ("open_youtube", ["open youtube"]),
+    ("workout", ["time for workout", "start workout"]),
+    ("play_music", ["play music"]),
+    ("search", ["search"]),
+    ("wikipedia", ["wikipedia"]),
+    ("exit", ["exit", "quit", "stop"]),
+]
+
+# Intent plugins from plugins/ (see viki_plugins.py); checked after the built-ins
+plugins = PluginRegistry()
+
+WIKIPEDIA_INTRO_SENTENCES = 3
+READ_MORE_SENTENCES = 3
+
+def active_reader():
+    """Article the current session is reading aloud; "tell me more" / "stop" act on it."""
+    return current_session().state.get("reader")
+
+KNOWLEDGE_RETRY_SECONDS = 60
+
+_knowledge_index = None
+_knowledge_checked = None
+
+def local_knowledge():
+    """
+    Offline index built with viki_knowledge.py, or None if there isn't one. Only an
+    opened index is kept; a missing or unreadable one is looked for again after
+    KNOWLEDGE_RETRY_SECONDS, so an index built while VIKI runs gets picked up.
+    """
+    global _knowledge_index, _knowledge_checked
+    now = time.monotonic()
+    if _knowledge_index is None and (_knowledge_checked is None or now - _knowledge_checked >= KNOWLEDGE_RETRY_SECONDS):
+        _knowledge_checked = now
+        try:
+            _knowledge_index = viki_knowledge.open_index()
+        except Exception as e:
+            log.warning("Local knowledge index unavailable: %s", e)
+    return _knowledge_index
+
+def start_wikipedia_reader(search_term):
+    session = current_session()
+    # Answer from the local index when it has a good match; Wikipedia online otherwise
+    index = local_knowledge()
+    found = index.answer(search_term) if index else None
+    if found:
+        title, text, url = found
+        reader = ArticleReader(title, text, session_speaker(session), url=url)
+    else:
+        import wikipedia
+        fetch = lambda cancel: fetch_wikipedia_reader(search_term, session_speaker(session))
+        # The same request twice: the backup only starts if the first is slower than usual.
+        # "No such page" and "ambiguous" are answers, not failures.
+        _, reader = hedger.call([("wikipedia", fetch), ("wikipedia", fetch)], timeout=WIKIPEDIA_TIMEOUT,
+                                passthrough=(wikipedia.exceptions.DisambiguationError, wikipedia.exceptions.PageError))
+    if active_reader() is not None:
+        active_reader().cancel()
+    session.state["reader"] = reader
+    return reader
+
+# --- Multi-turn dialogs ---
+# A follow-up question is asked with ask() and answered by the session's next
+# utterance, which perform_task passes to the pending continuation.
+dialogs = DialogManager()
+
+def ask(prompt, handler, session=None, **kwargs):
+    session = session or current_session()
+    return dialogs.ask(session, prompt, handler, session_speaker(session), **kwargs)
+
+def is_yes(reply):
+    return bool(reply) and "yes" in reply.lower()
+
+def is_no(reply):
+    return bool(reply) and "no" in reply.lower()
+
+def answer_wikipedia_question(question):
+    import wikipedia  # loaded on first use; only needed for its exception types here
     try:
-        with open(CUSTOM_COMMANDS_FILE, "r") as f:
-            custom_commands = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        custom_commands = {}
-
+        search_term = question.replace("wikipedia", "").strip()
+        # Fetched once; speech starts after the first sentence
+        reader = start_wikipedia_reader(search_term)
+        log.info("Wikipedia: %s", reader.title)
+        read_then_check(reader, WIKIPEDIA_INTRO_SENTENCES)
+    except wikipedia.exceptions.DisambiguationError as e:
+        speak("there are multiple matches for your query. please be more specific")
+    except AllBackendsFailed as e:
+        log.warning("Wikipedia lookup failed: %s", e)
+        speak("wikipedia is not responding right now. let me search google for you")
+        actions.open_url(f"https://www.google.com/search?q={question}")
+    except wikipedia.exceptions.PageError:
+        speak("i couldn't find any information about that. let me search google for you")
+        actions.open_url(f"https://www.google.com/search?q={question}")
+
+def read_then_check(reader, sentences):
+    """Read the next chunk, then ask whether it helped. Returns False if the article is finished."""
+    session = current_session()
+    # Asked from the reading thread once the chunk has been spoken; "stop" cancels both
+    return reader.read(sentences, on_done=lambda: ask("Dose your doubt clear yes or no ",
+                                                      lambda reply: wikipedia_clarity(reader, reply),
+                                                      session=session))
+
+def wikipedia_clarity(reader, clarity):
+    if is_yes(clarity):
+        ask("Do you want to know more about this topic? yes or no", lambda reply: wikipedia_more(reader, reply))
+    elif is_no(clarity):
+        speak("let me try to explain it differently")
+        # Continue from where the intro stopped instead of refetching
+        if not read_then_check(reader, READ_MORE_SENTENCES):
+            speak("that is everything the article has")
+    else:
+        return UNHANDLED
+
+def wikipedia_more(reader, more_info):
+    if is_yes(more_info):
+        actions.open_url(reader.url)
+        speak("I have opened the wikipedia page for more detailed information")
+    elif not is_no(more_info):
+        return UNHANDLED
+
+def play_song(song_query):
+    search_query = song_query.replace(" ", "+")
+    # Search YouTube and get first video
+    youtube_url = f"https://www.youtube.com/watch?v=" # Direct video URL format
+    search_url = f"https://www.youtube.com/results?search_query={search_query}"
+    import urllib.request
+    import re
+    html = urllib.request.urlopen(search_url)
+    video_ids = re.findall(r"watch\?v=(\S{11})", html.read().decode())
+    if video_ids:
+        first_video = youtube_url + video_ids[0]
+        actions.open_url(first_video)
+        speak(f"Playing {song_query} from YouTube")
+
+def route_query(query, custom_commands=None):
+    """
+    Match a query to an intent without performing it.
+    Returns (intent, argument), or (None, None) if nothing matches.
+    """
     if query is None:
-        return
-
+        return None, None
+    if custom_commands is None:
+        custom_commands = load_custom_commands()
     query_lower = query.lower().strip()
-    print(f"Recognized query: '{query_lower}'")  # Debug print
-    print("Available voice commands:")
-    for vc in custom_commands.keys():
-        print(f" - '{vc}'")
 
     # Check custom commands first
     for voice_cmd, app_path in custom_commands.items():
         voice_cmd_lower = voice_cmd.lower().strip()
         # Match if exact or if voice command is a separate word in query
         if query_lower == voice_cmd_lower or f" {voice_cmd_lower} " in f" {query_lower} ":
-            print(f"Matched voice command: '{voice_cmd}' with path: '{app_path}'")  # Debug print
-            try:
-                if app_path.startswith("web://"):
-                    webapp_name = app_path[len("web://"):]
-                    url = f"{webapp_name}"
-                    speak(f"Opening web application {webapp_name}")
-                    # Open URL in Chrome
-                    chrome_path = "C:\\Program Files\\Google\\Chrome\\Application\\chrome.exe"
-                    webbrowser.get(f'"{chrome_path}" %s').open(url)
-                else:
-                    # Try to open executable or file with default application
-                    if os.path.isfile(app_path):
-                        print(f"Path exists: {app_path}")  # Debug print
-                        if app_path.lower().endswith(".exe"):
-                            print(f"Opening executable: {app_path}")  # Debug print
-                            subprocess.Popen(app_path)
-                            speak(f"Opening {app_path}")
-                        else:
-                            print(f"Opening file with default app: {app_path}")  # Debug print
-                            os.startfile(app_path)
-                            speak(f"Opening file {app_path}")
-                    else:
-                        print(f"Path does not exist: {app_path}")  # Debug print
-                        speak(f"The path {app_path} does not exist.")
-            except Exception as e:
-                print(f"Exception when opening path: {app_path}, error: {e}")  # Debug print
-                speak(f"Failed to open {app_path}. Error: {str(e)}")
+            return "custom", (voice_cmd, app_path)
+
+    for intent, phrases in BUILTIN_INTENTS:
+        if any(phrase in query_lower for phrase in phrases):
+            if intent == "search":
+                return intent, query_lower.replace("search", "").strip()
+            return intent, None
+
+    # Plugins last; only their manifests are loaded at this point
+    plugin, argument = plugins.route(query_lower)
+    if plugin is not None:
+        return "plugin", (plugin.name, argument)
+    return None, None
+
+def starts_with_command(text, custom_commands):
+    """True if `text` begins with a trigger phrase or custom command, as whole words."""
+    text = text.lower().strip()
+    phrases = [phrase for _, intent_phrases in BUILTIN_INTENTS for phrase in intent_phrases]
+    phrases += [voice_cmd.lower().strip() for voice_cmd in custom_commands]
+    phrases += [trigger for plugin in plugins.plugins for trigger in plugin.triggers]
+    return any(text.startswith(phrase) and not text[len(phrase):len(phrase) + 1].isalnum()
+               for phrase in phrases if phrase)
+
+def perform_task(query, dry_run=False):
+    """
+    Run the intent matched by `query`, or each intent of a multi-intent query. With
+    dry_run=True nothing is executed and the routing result is returned as a dict instead.
+    """
+    custom_commands = load_custom_commands()
+
+    if query is None:
+        return
+
+    session = current_session()
+    route = lambda text: route_query(text, custom_commands)
+    starts_command = lambda text: starts_with_command(text, custom_commands)
+    if dry_run:
+        pending = dialogs.pending(session)
+        if pending is not None:
+            return {"query": query, "intent": "dialog_reply", "argument": pending.name}
+        steps = viki_compound.plan(query, route, starts_command)
+        if len(steps) > 1:
+            return {"query": query, "intent": "multi", "argument": [(s.text, s.intent, s.argument) for s in steps]}
+        return {"query": query, "intent": steps[0].intent, "argument": steps[0].argument}
+
+    # An answer to a question asked on an earlier turn continues that dialog
+    if dialogs.resume(session, query):
+        return
+    # "open youtube and start workout": one step per intent, independent ones concurrently
+    steps = viki_compound.plan(query, route, starts_command)
+    if len(steps) > 1:
+        run_steps(steps, custom_commands)
+        return
+    run_intent(query, steps[0].intent, steps[0].argument, custom_commands)
+
+_plan_runner = None
+
+def run_steps(steps, custom_commands):
+    """Run a multi-intent plan; the concurrent steps' confirmations are spoken as one response."""
+    global _plan_runner
+    if _plan_runner is None:
+        _plan_runner = viki_compound.PlanRunner()
+    session = current_session()
+
+    def execute(step):
+        if step.interactive:
+            run_intent(step.text, step.intent, step.argument, custom_commands)
             return
+        # Same user and state, but speech is collected for the merged response
+        collector = Session(session.id, sink=step.spoken.append, listen=session.listen)
+        collector.state = session.state
+        with use_session(collector):
+            run_intent(step.text, step.intent, step.argument, custom_commands)
+
+    log.info("Multi-intent query", extra={"data": {"steps": [(s.text, s.intent) for s in steps]}})
+    _plan_runner.run(steps, execute, speak, proceed=lambda: dialogs.pending(session) is None)
+
+def run_intent(query, intent, argument, custom_commands):
+    query_lower = query.lower().strip()
+    log.debug("Running %s for %r", intent, query_lower)
+
+    if intent == "custom":
+        voice_cmd, app_path = argument
+        log.info("Matched voice command %r with path %r", voice_cmd, app_path)
+        try:
+            if app_path.startswith("web://"):
+                webapp_name = app_path[len("web://"):]
+                url = f"{webapp_name}"
+                speak(f"Opening web application {webapp_name}")
+                # Open URL in Chrome (falls back to the default browser)
+                actions.open_url(url, browser="chrome")
+            else:
+                # Launch executables, open other files with the default application
+                result = actions.open_path(app_path)
+                log.info("Opening %s: %s", app_path, result)
+                if result == viki_actions.NOT_FOUND:
+                    speak(f"The path {app_path} does not exist.")
+                elif result == viki_actions.FOCUSED:
+                    speak(f"Switching to {app_path}")
+                elif result == viki_actions.LAUNCHED:
+                    speak(f"Opening {app_path}")
+        except Exception as e:
+            log.exception("Exception when opening path %s", app_path)
+            speak(f"Failed to open {app_path}. Error: {str(e)}")
+        return
+
+    if intent == "plugin":
+        name, plugin_argument = argument
+        context = PluginContext(speak=speak, listen=recognize_speech, open_url=actions.open_url,
+                                session=current_session(), ask=ask)
+        try:
+            plugins.run(name, context, query, plugin_argument)
+        except Exception as e:
+            log.exception("Plugin %s failed", name)
+            speak(f"Sorry, the {name} plugin ran into a problem.")
+        return
 
     # Basic tasks
-    if "hello" in query_lower:
+    if intent == "greeting":
         speak("Hey there! What can I do for you today?")
 
-    elif "what's your name" in query_lower:
+    elif intent == "name":
         speak("I'm Viky, your friendly assistant. How can I help?")
 
-    elif "what is the time" in query_lower:
+    elif intent == "time":
         current_time = datetime.datetime.now().strftime("%I:%M %p")
         speak(f"It's {current_time} right now.")
 
-    elif "open google" in query_lower:
-        webbrowser.open("https://www.google.com")
+    elif intent == "open_google":
+        actions.open_url("https://www.google.com")
 
-    elif "open notepad" in query_lower:
-        subprocess.Popen("notepad.exe")
-        speak("Opening Notepad")
+    elif intent == "open_notepad":
+        if actions.launch_app("notepad") == viki_actions.NOT_FOUND:
+            speak("No text editor is installed on this computer")
+        else:
+            speak("Opening Notepad")
 
-    elif "open calculator" in query_lower:
-        subprocess.Popen("calc.exe")
-        speak("Opening Calculator")
+    elif intent == "open_calculator":
+        if actions.launch_app("calculator") == viki_actions.NOT_FOUND:
+            speak("No calculator is installed on this computer")
+        else:
+            speak("Opening Calculator")
 
-    elif "open word" in query_lower:
+    elif intent == "open_word":
         try:
-            subprocess.Popen(["winword.exe"])
+            if actions.launch_app("word") == viki_actions.NOT_FOUND:
+                raise FileNotFoundError("word")
             speak("Opening Microsoft Word")
         except FileNotFoundError:
             speak("Microsoft Word is not installed on this computer")
 
-    elif "open excel" in query_lower:
+    elif intent == "open_excel":
         try:
-            subprocess.Popen(["excel.exe"])
+            if actions.launch_app("excel") == viki_actions.NOT_FOUND:
+                raise FileNotFoundError("excel")
             speak("Opening Microsoft Excel")
         except FileNotFoundError:
             speak("Microsoft Excel is not installed on this computer")
 
-    elif "open chrome" in query_lower:
+    elif intent == "open_chrome":
         open_chrome()
 
-    elif "open youtube" in query_lower:
-        webbrowser.open("https://www.youtube.com/")
+    elif intent == "open_youtube":
+        actions.open_url("https://www.youtube.com/")
         speak("Opening YouTube")
 
-    elif "time for workout" in query_lower:
-        webbrowser.open("https://workout.lol/")
-        speak("Time for a workout!")
-        
-    elif "start workout" in query_lower:
-        webbrowser.open("https://workout.lol/")
+    elif intent == "workout":
+        actions.open_url("https://workout.lol/")
         speak("Time for a workout!")
 
-    elif "play music" in query_lower:
-        speak("What song would you like me to play?")
-        song_query = recognize_speech()
-        if song_query:
-            search_query = song_query.replace(" ", "+")
-            # Search YouTube and get first video
-            youtube_url = f"https://www.youtube.com/watch?v=" # Direct video URL format
-            search_url = f"https://www.youtube.com/results?search_query={search_query}"
-            import urllib.request
-            import re
-            html = urllib.request.urlopen(search_url)
-            video_ids = re.findall(r"watch\?v=(\S{11})", html.read().decode())
-            if video_ids:
-                first_video = youtube_url + video_ids[0]
-                webbrowser.open(first_video)
-                speak(f"Playing {song_query} from YouTube")
-    elif "search" in query_lower:
-        search_query = query_lower.replace("search", "").strip()
-        if search_query:
+    elif intent == "play_music":
+        ask("What song would you like me to play?", play_song)
+    elif intent == "search":
+        search_query = argument
+        if search_query and GOOGLE_API_KEY:
+            search_google_and_read(search_query)
+        elif search_query:
             search_url = f"https://www.google.com/search?q={search_query}"
-            webbrowser.open(search_url)
+            actions.open_url(search_url)
             speak("The search results are on your screen.")
 
-    elif "wikipedia" in query_lower:
-        speak("What would you like to know about?")
-        question = recognize_speech()
-        if question:
-            try:
-                search_term = question.replace("wikipedia", "").strip()
-                response = wikipedia.summary(search_term, sentences=3)
-                print(f"Wikipedia: {response}")
-                speak(response)
-
-                while True:
-                    speak("Dose your doubt clear yes or no ")
-                    clarity = recognize_speech()
-
-                    if clarity and "yes" in clarity.lower():
-                        speak("Do you want to know more about this topic? yes or no")
-                        more_info = recognize_speech()
-                        if more_info and "yes" in more_info.lower():
-                            wiki_page = wikipedia.page(search_term)
-                            webbrowser.open(wiki_page.url)
-                            speak("I have opened the wikipedia page for more detailed information")
-                        break
-
-                    elif clarity and "no" in clarity.lower():
-                        speak("let me try to explain it differently")
-                        detailed_response = wikipedia.summary(search_term, sentences=5)
-                        print(f"Detailed explanation: {detailed_response}")
-                        speak(detailed_response)
-                    else:
-                        break
-
-            except wikipedia.exceptions.DisambiguationError as e:
-                speak("there are multiple matches for your query. please be more specific")
-            except wikipedia.exceptions.PageError:
-                speak("i couldn't find any information about that. let me search google for you")
-                search_url = f"https://www.google.com/search?q={question}"
-                webbrowser.open(search_url)
-        else:
-            speak("i didn't catch your question. please try again")
-
-    elif "exit" in query_lower or "stop" in query_lower:
-        speak("goodbye!")
-        # exit() removed to prevent UI blocking
-    elif "quit" in query_lower or "stop" in query_lower:
+    elif intent == "wikipedia":
+        ask("What would you like to know about?", answer_wikipedia_question)
+
+    elif intent == "read_more":
+        reader = active_reader()
+        if reader is None:
+            speak("There is nothing to continue reading.")
+        elif not reader.read(READ_MORE_SENTENCES):
+            speak("That's the end of the article.")
+
+    elif intent == "exit":
+        reader = active_reader()
+        if reader is not None and reader.is_reading():
+            # "stop" while an article is being read only stops the reading
+            reader.cancel()
+            return
         speak("goodbye!")
         # exit() removed to prevent UI blocking
 
 # Main loop
 if __name__ == "__main__":
+    # Log records are written by a background thread to logs/viki.jsonl
+    viki_log.setup()
+    prewarm_speech()
     while True:
         query = recognize_speech()
         perform_task(query)
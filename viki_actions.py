@@ -0,0 +1,279 @@
+"""
+Side-effect executor for VIKI: launching applications, opening files and URLs.
+
+perform_task goes through the module-level `executor` instead of calling
+subprocess / os.startfile / webbrowser directly, so that:
+  * browser controllers are built once and cached,
+  * an app that is already running is brought to the front instead of relaunched,
+  * repeated commands inside DEBOUNCE_SECONDS are ignored,
+  * finished child processes are reaped by a background thread,
+  * the OS specific bits live in one backend class per platform.
+"""
+import os
+import sys
+import shutil
+import subprocess
+import threading
+import time
+import webbrowser
+
+DEBOUNCE_SECONDS = 2.0
+REAP_INTERVAL_SECONDS = 1.0
+
+# Result codes returned by the executor so callers can choose what to say.
+LAUNCHED = "launched"
+FOCUSED = "focused"
+DEBOUNCED = "debounced"
+NOT_FOUND = "not_found"
+
+
+# --- Platform Backends ---
+
+class PlatformBackend:
+    """Base backend. Subclasses fill in the OS specific behaviour."""
+    name = "generic"
+    # Logical app name -> list of candidate commands, first one found wins.
+    app_aliases = {}
+    browser_paths = {}
+
+    def resolve_app(self, app):
+        for candidate in self.app_aliases.get(app, [app]):
+            if os.path.isfile(candidate) or shutil.which(candidate):
+                return candidate
+        return None
+
+    def is_executable(self, path):
+        return os.path.isfile(path) and os.access(path, os.X_OK)
+
+    def spawn(self, command):
+        return subprocess.Popen([command])
+
+    def open_file(self, path):
+        webbrowser.open(f"file://{os.path.abspath(path)}")
+
+    def browser_spec(self, browser):
+        """Return a webbrowser.get() spec for a named browser, or None for the default."""
+        for path in self.browser_paths.get(browser, []):
+            if os.path.isfile(path) or shutil.which(path):
+                return f'"{path}" %s'
+        return None
+
+    def focus(self, process):
+        """Bring the window of a running process to the front. Returns True on success."""
+        return False
+
+
+class WindowsBackend(PlatformBackend):
+    name = "windows"
+    app_aliases = {
+        "notepad": ["notepad.exe"],
+        "calculator": ["calc.exe"],
+        "word": ["winword.exe"],
+        "excel": ["excel.exe"],
+        "chrome": ["C:\\Program Files\\Google\\Chrome\\Application\\chrome.exe",
+                   "C:\\Program Files (x86)\\Google\\Chrome\\Application\\chrome.exe"],
+    }
+    browser_paths = {"chrome": app_aliases["chrome"]}
+
+    def resolve_app(self, app):
+        # Office apps are usually registered through App Paths rather than PATH,
+        # so let Popen try the bare name instead of reporting it missing.
+        return super().resolve_app(app) or self.app_aliases.get(app, [app])[0]
+
+    def is_executable(self, path):
+        return os.path.isfile(path) and path.lower().endswith((".exe", ".bat", ".cmd", ".com"))
+
+    def open_file(self, path):
+        os.startfile(path)
+
+    def focus(self, process):
+        try:
+            import ctypes
+            from ctypes import wintypes
+        except ImportError:
+            return False
+        user32 = ctypes.windll.user32
+        found = []
+
+        @ctypes.WINFUNCTYPE(wintypes.BOOL, wintypes.HWND, wintypes.LPARAM)
+        def enum_handler(hwnd, _):
+            pid = wintypes.DWORD()
+            user32.GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
+            if pid.value == process.pid and user32.IsWindowVisible(hwnd):
+                found.append(hwnd)
+                return False
+            return True
+
+        user32.EnumWindows(enum_handler, 0)
+        if not found:
+            return False
+        user32.ShowWindow(found[0], 9)  # SW_RESTORE
+        return bool(user32.SetForegroundWindow(found[0]))
+
+
+class LinuxBackend(PlatformBackend):
+    name = "linux"
+    app_aliases = {
+        "notepad": ["gnome-text-editor", "gedit", "kate", "mousepad", "xed"],
+        "calculator": ["gnome-calculator", "kcalc", "galculator", "xcalc"],
+        "word": ["libreoffice --writer", "lowriter"],
+        "excel": ["libreoffice --calc", "localc"],
+        "chrome": ["google-chrome", "google-chrome-stable", "chromium", "chromium-browser"],
+    }
+    browser_paths = {"chrome": app_aliases["chrome"]}
+
+    def resolve_app(self, app):
+        for candidate in self.app_aliases.get(app, [app]):
+            if os.path.isfile(candidate) or shutil.which(candidate.split()[0]):
+                return candidate
+        return None
+
+    def spawn(self, command):
+        args = command.split() if not os.path.isfile(command) else [command]
+        return subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                start_new_session=True)
+
+    def open_file(self, path):
+        subprocess.Popen(["xdg-open", path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                         start_new_session=True)
+
+    def focus(self, process):
+        if shutil.which("xdotool"):
+            result = subprocess.run(["xdotool", "search", "--pid", str(process.pid), "windowactivate"],
+                                    capture_output=True)
+            return result.returncode == 0
+        if shutil.which("wmctrl"):
+            listing = subprocess.run(["wmctrl", "-lp"], capture_output=True, text=True).stdout
+            for line in listing.splitlines():
+                fields = line.split()
+                if len(fields) > 2 and fields[2] == str(process.pid):
+                    return subprocess.run(["wmctrl", "-i", "-a", fields[0]]).returncode == 0
+        return False
+
+
+class MacBackend(PlatformBackend):
+    name = "mac"
+    app_aliases = {
+        "notepad": ["TextEdit"],
+        "calculator": ["Calculator"],
+        "word": ["Microsoft Word"],
+        "excel": ["Microsoft Excel"],
+        "chrome": ["Google Chrome"],
+    }
+
+    def resolve_app(self, app):
+        return self.app_aliases.get(app, [app])[0]
+
+    def spawn(self, command):
+        if os.path.isfile(command):
+            return subprocess.Popen([command])
+        # `open -a` both launches and focuses, so no separate focus step is needed.
+        return subprocess.Popen(["open", "-a", command])
+
+    def open_file(self, path):
+        subprocess.Popen(["open", path])
+
+    def browser_spec(self, browser):
+        app = self.app_aliases.get(browser, [None])[0]
+        return f'open -a "{app}" %s' if app else None
+
+
+def default_backend():
+    if sys.platform.startswith("win"):
+        return WindowsBackend()
+    if sys.platform == "darwin":
+        return MacBackend()
+    return LinuxBackend()
+
+
+# --- Executor ---
+
+class ActionExecutor:
+    def __init__(self, backend=None, debounce_seconds=DEBOUNCE_SECONDS):
+        self.backend = backend or default_backend()
+        self.debounce_seconds = debounce_seconds
+        self._lock = threading.Lock()
+        self._browsers = {}   # browser name -> webbrowser controller
+        self._running = {}    # launch key -> Popen of the instance we started
+        self._last_seen = {}  # launch key -> monotonic time of the last request
+        self._reaper = None
+
+    def _debounced(self, key):
+        # Caller holds self._lock
+        now = time.monotonic()
+        last = self._last_seen.get(key)
+        if last is not None and now - last < self.debounce_seconds:
+            return True   # the window runs from the last request that went through, so repeats cannot extend it
+        self._last_seen[key] = now
+        return False
+
+    def _browser(self, browser):
+        controller = self._browsers.get(browser)
+        if controller is None:
+            spec = self.backend.browser_spec(browser) if browser else None
+            try:
+                controller = webbrowser.get(spec) if spec else webbrowser.get()
+            except webbrowser.Error:
+                controller = webbrowser.get()
+            self._browsers[browser] = controller
+        return controller
+
+    def open_url(self, url, browser=None):
+        with self._lock:
+            if self._debounced(("url", url)):
+                return DEBOUNCED
+            controller = self._browser(browser)
+        controller.open(url)
+        return LAUNCHED
+
+    def launch_app(self, app):
+        """Launch a logical app name ("notepad") or an executable path."""
+        key = ("app", app.lower())
+        with self._lock:
+            if self._debounced(key):
+                return DEBOUNCED
+            process = self._running.get(key)
+        # focus() runs xdotool/wmctrl and spawn() starts a process; neither holds the lock,
+        # so other launches and the reaper are not held up behind them
+        if process is not None and process.poll() is None and self.backend.focus(process):
+            return FOCUSED
+        command = self.backend.resolve_app(app)
+        if command is None:
+            return NOT_FOUND
+        process = self.backend.spawn(command)
+        with self._lock:
+            self._running[key] = process
+            self._start_reaper()
+        return LAUNCHED
+
+    def open_path(self, path):
+        """Open a custom command target: executables are launched, other files use the default app."""
+        if not os.path.exists(path):
+            return NOT_FOUND
+        if self.backend.is_executable(path):
+            return self.launch_app(path)
+        with self._lock:
+            if self._debounced(("file", path)):
+                return DEBOUNCED
+        self.backend.open_file(path)
+        return LAUNCHED
+
+    def _start_reaper(self):
+        # Caller holds self._lock
+        if self._reaper is None or not self._reaper.is_alive():
+            self._reaper = threading.Thread(target=self._reap_loop, daemon=True)
+            self._reaper.start()
+
+    def _reap_loop(self):
+        while True:
+            time.sleep(REAP_INTERVAL_SECONDS)
+            with self._lock:
+                for key, process in list(self._running.items()):
+                    if process.poll() is not None:  # poll() collects the exit status
+                        del self._running[key]
+                if not self._running:
+                    self._reaper = None
+                    return
+
+
+executor = ActionExecutor()
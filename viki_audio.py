@@ -0,0 +1,252 @@
+"""
+Audio front-end applied to captured speech before it is sent for recognition.
+
+recognize_google uploads FLAC of whatever the microphone captured: the device's
+native rate (often 44.1 or 48 kHz), including the silence before and after the
+utterance. prepare() shrinks that with a few vectorised NumPy steps:
+
+    downmix to mono -> trim leading/trailing silence -> resample to 16 kHz
+    -> automatic gain control -> 16-bit PCM
+
+16 kHz mono is what the recognizer works at anyway, so recognition is not
+affected; the FLAC it uploads is several times smaller. encode() can also
+produce Opus (via the optional soundfile package) for services that accept it.
+
+`python viki_audio.py --bench` builds a WAV fixture corpus, reports bytes per
+utterance and upload time before and after, and checks that a local stand-in
+recognizer returns the same transcript for both.
+"""
+import io
+import time
+import argparse
+
+import numpy as np
+
+TARGET_RATE = 16000
+FRAME_SECONDS = 0.02
+SILENCE_DBFS = -45.0          # frames quieter than this (relative to full scale) count as silence
+TRIM_PADDING_SECONDS = 0.2    # kept either side of the speech so word edges are not clipped
+AGC_TARGET_DBFS = -20.0
+AGC_MAX_GAIN_DB = 24.0
+PEAK_LIMIT = 0.97
+RESAMPLE_TAPS = 63
+
+try:
+    import soundfile
+except ImportError:
+    soundfile = None
+
+
+def pcm_to_float(data, sample_width, channels=1):
+    """Interleaved little-endian PCM bytes -> float32 array of shape (frames, channels) in [-1, 1]."""
+    if sample_width == 1:
+        samples = (np.frombuffer(data, np.uint8).astype(np.float32) - 128) / 128
+    elif sample_width == 3:
+        raw = np.frombuffer(data, np.uint8).reshape(-1, 3)
+        ints = (raw[:, 0].astype(np.int32) | (raw[:, 1].astype(np.int32) << 8) | (raw[:, 2].astype(np.int32) << 16))
+        samples = (np.where(ints >= 1 << 23, ints - (1 << 24), ints) / float(1 << 23)).astype(np.float32)
+    else:
+        dtype = {2: np.int16, 4: np.int32}[sample_width]
+        samples = np.frombuffer(data, dtype).astype(np.float32) / float(np.iinfo(dtype).max + 1)
+    return samples.reshape(-1, channels)
+
+
+def float_to_pcm16(samples):
+    return (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+
+def downmix(samples):
+    return samples.mean(axis=1) if samples.ndim == 2 else samples
+
+
+def frame_dbfs(samples, rate, frame_seconds=FRAME_SECONDS):
+    """RMS level per frame in dBFS."""
+    size = max(1, int(rate * frame_seconds))
+    count = len(samples) // size
+    frames = samples[:count * size].reshape(count, size)
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-10)), size
+
+
+def trim_silence(samples, rate, threshold_dbfs=SILENCE_DBFS, padding=TRIM_PADDING_SECONDS):
+    levels, size = frame_dbfs(samples, rate)
+    voiced = np.flatnonzero(levels > threshold_dbfs)
+    if len(voiced) == 0:
+        return samples[:0]
+    pad = int(padding * rate)
+    start = max(0, voiced[0] * size - pad)
+    end = min(len(samples), (voiced[-1] + 1) * size + pad)
+    return samples[start:end]
+
+
+def resample(samples, rate, target=TARGET_RATE, taps=RESAMPLE_TAPS):
+    """Windowed-sinc low-pass (when downsampling) followed by linear interpolation."""
+    if rate == target or len(samples) == 0:
+        return samples
+    if target < rate:
+        cutoff = 0.5 * target / rate * 0.9
+        n = np.arange(taps) - (taps - 1) / 2
+        kernel = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(taps)
+        samples = np.convolve(samples, kernel / kernel.sum(), mode="same")
+    count = int(round(len(samples) * target / rate))
+    positions = np.arange(count) * (rate / target)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def agc(samples, rate, target_dbfs=AGC_TARGET_DBFS, max_gain_db=AGC_MAX_GAIN_DB, silence_dbfs=SILENCE_DBFS):
+    """One gain for the utterance: speech frames brought to target_dbfs, peaks kept below PEAK_LIMIT."""
+    if len(samples) == 0:
+        return samples
+    levels, _ = frame_dbfs(samples, rate)
+    speech = levels[levels > silence_dbfs]
+    if len(speech) == 0:
+        return samples
+    # Power average over speech frames only, so pauses do not inflate the gain
+    level = 10 * np.log10(np.mean(10 ** (speech / 10)))
+    gain = 10 ** (min(target_dbfs - level, max_gain_db) / 20)
+    peak = np.max(np.abs(samples)) * gain
+    if peak > PEAK_LIMIT:
+        gain *= PEAK_LIMIT / peak
+    return (samples * gain).astype(np.float32)
+
+
+def process(data, sample_rate, sample_width, channels=1, target_rate=TARGET_RATE):
+    """Raw PCM in -> (16-bit mono PCM bytes at target_rate, target_rate)."""
+    samples = downmix(pcm_to_float(data, sample_width, channels))
+    samples = trim_silence(samples, sample_rate)
+    samples = resample(samples, sample_rate, target_rate)
+    samples = agc(samples, target_rate)
+    return float_to_pcm16(samples), target_rate
+
+
+def prepare(audio):
+    """Front-end for an sr.AudioData (mono, as recognizer.listen returns it). Returns a new AudioData."""
+    import speech_recognition as sr
+    data, rate = process(audio.frame_data, audio.sample_rate, audio.sample_width)
+    if not data:
+        return audio   # nothing above the silence threshold; let the recognizer decide
+    return sr.AudioData(data, rate, 2)
+
+
+def encode(pcm16, rate, codec="flac"):
+    """Encode 16-bit mono PCM as FLAC (what recognize_google uploads) or Opus (needs soundfile)."""
+    if codec == "flac":
+        import speech_recognition as sr
+        return sr.AudioData(pcm16, rate, 2).get_flac_data()
+    if codec == "opus":
+        if soundfile is None:
+            raise RuntimeError("Opus encoding needs the soundfile package")
+        buffer = io.BytesIO()
+        soundfile.write(buffer, np.frombuffer(pcm16, "<i2"), rate, format="OGG", subtype="OPUS")
+        return buffer.getvalue()
+    raise ValueError(f"Unknown codec: {codec}")
+
+
+# --- Fixture corpus, stand-in recognizer and benchmark ---
+
+# The stand-in "speaks" words as tones and recognizes them by their dominant frequency,
+# so a transcript survives the front-end only if timing, pitch and levels do.
+TONE_WORDS = {"open": 440, "google": 660, "what": 550, "is": 880, "the": 990, "time": 1210,
+              "play": 1320, "music": 1480, "search": 1650, "weather": 1870}
+WORD_SECONDS = 0.3
+GAP_SECONDS = 0.15
+
+
+def synthesize_utterance(words, rate=44100, channels=2, lead=0.8, tail=1.2, level=0.08, noise=0.002, seed=0):
+    """A WAV-like int16 utterance: silence, one tone per word with gaps, silence."""
+    rng = np.random.default_rng(seed)
+    parts = [np.zeros(int(lead * rate))]
+    for word in words:
+        t = np.arange(int(WORD_SECONDS * rate)) / rate
+        envelope = np.minimum(1, np.minimum(t, WORD_SECONDS - t) / 0.02)
+        parts.append(level * envelope * np.sin(2 * np.pi * TONE_WORDS[word] * t))
+        parts.append(np.zeros(int(GAP_SECONDS * rate)))
+    parts.append(np.zeros(int(tail * rate)))
+    mono = np.concatenate(parts) + rng.normal(0, noise, sum(len(p) for p in parts))
+    stereo = np.repeat(mono[:, None], channels, axis=1)
+    return (np.clip(stereo, -1, 1) * 32767).astype("<i2").tobytes()
+
+
+def standin_recognize(pcm16, rate):
+    """Decode tone words: split on silence, map each segment's dominant frequency to a word."""
+    samples = pcm_to_float(pcm16, 2)[:, 0]
+    levels, size = frame_dbfs(samples, rate)
+    # Relative to the loudest frame, like a real recognizer's VAD: the result must not depend on input level
+    voiced = levels > levels.max() - 12
+    words = []
+    start = None
+    for i, is_voiced in enumerate(np.append(voiced, False)):
+        if is_voiced and start is None:
+            start = i
+        elif not is_voiced and start is not None:
+            segment = samples[start * size:i * size]
+            start = None
+            if len(segment) < 0.1 * rate:
+                continue
+            spectrum = np.abs(np.fft.rfft(segment * np.hanning(len(segment))))
+            peak = np.fft.rfftfreq(len(segment), 1 / rate)[np.argmax(spectrum)]
+            words.append(min(TONE_WORDS, key=lambda w: abs(TONE_WORDS[w] - peak)))
+    return " ".join(words)
+
+
+FIXTURE_UTTERANCES = [
+    ["open", "google"], ["what", "is", "the", "time"], ["play", "music"],
+    ["search", "weather"], ["what", "is", "the", "weather"],
+]
+
+
+def benchmark(links_kbps=(256, 1000)):
+    import wave
+    corpus = []
+    for i, words in enumerate(FIXTURE_UTTERANCES):
+        for rate, channels, level in ((44100, 2, 0.08), (48000, 1, 0.02), (16000, 1, 0.3)):
+            pcm = synthesize_utterance(words, rate, channels, level=level, seed=i)
+            wav = io.BytesIO()
+            with wave.open(wav, "wb") as w:
+                w.setnchannels(channels)
+                w.setsampwidth(2)
+                w.setframerate(rate)
+                w.writeframes(pcm)
+            corpus.append((" ".join(words), rate, channels, pcm, len(wav.getvalue())))
+
+    totals = {"wav": 0, "flac before": 0, "flac after": 0, "opus after": 0}
+    parity = 0
+    started = time.perf_counter()
+    processing = 0.0
+    for expected, rate, channels, pcm, wav_bytes in corpus:
+        # What recognize_google gets today: listen() output is mono at the device rate
+        mono = float_to_pcm16(downmix(pcm_to_float(pcm, 2, channels)))
+        before = standin_recognize(mono, rate)
+        t0 = time.perf_counter()
+        processed, new_rate = process(pcm, rate, 2, channels)
+        processing += time.perf_counter() - t0
+        after = standin_recognize(processed, new_rate)
+        parity += before == after == expected
+        totals["wav"] += wav_bytes
+        totals["flac before"] += len(encode(mono, rate, "flac"))
+        totals["flac after"] += len(encode(processed, new_rate, "flac"))
+        if soundfile is not None:
+            totals["opus after"] += len(encode(processed, new_rate, "opus"))
+    count = len(corpus)
+    print(f"{count} utterances (44.1 kHz stereo, 48 kHz quiet mono, 16 kHz loud mono); "
+          f"front-end {processing / count * 1000:.1f} ms/utterance")
+    for label, total in totals.items():
+        if total == 0:
+            continue
+        per = total / count
+        uploads = ", ".join(f"{per * 8 / kbps:.0f} ms @ {kbps} kbit/s" for kbps in links_kbps)
+        print(f"{label:>12}: {per / 1024:6.1f} KiB/utterance  ({uploads})")
+    saved = 1 - totals["flac after"] / totals["flac before"]
+    print(f"FLAC upload reduced by {saved * 100:.0f}%; stand-in recognizer parity {parity}/{count}")
+    assert parity == count
+    print(f"total benchmark time {time.perf_counter() - started:.1f} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Speech audio front-end")
+    parser.add_argument("--bench", action="store_true", help="Bytes/upload-time report and recognition parity check")
+    args = parser.parse_args()
+    if args.bench:
+        benchmark()
+    else:
+        parser.print_help()
@@ -0,0 +1,264 @@
+"""
+Batch speech recognition for VIKI: transcribe a folder of voice memos.
+
+Each audio file is split into utterances at stretches of silence, the segments
+are recognized concurrently on a thread or process pool (with a cap on how many
+requests are in flight), and every transcript is routed through
+viki.perform_task(..., dry_run=True) to extract its intent. Results are
+written as JSON lines as soon as each segment finishes.
+
+Usage:
+    python viki_batch.py memos/ -o memos.jsonl --workers 8
+    python viki_batch.py --bench memos/      # throughput vs worker count
+    python viki_batch.py --bench fixtures/ --engine standin --fixtures 8
+
+The "standin" engine decodes viki_audio's synthetic tone words locally and
+waits STANDIN_LATENCY_SECONDS per segment in place of the network round trip,
+so worker-count scaling can be measured without a recognition service.
+"""
+import os
+import sys
+import json
+import time
+import wave
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import numpy as np
+import speech_recognition as sr
+
+import viki_audio
+import viki_log
+
+AUDIO_EXTENSIONS = (".wav", ".aif", ".aiff", ".aifc", ".flac")
+
+# Silence segmentation defaults
+FRAME_SECONDS = 0.03
+MIN_SILENCE_SECONDS = 0.5
+MIN_SEGMENT_SECONDS = 0.3
+PADDING_SECONDS = 0.2
+
+STANDIN_LATENCY_SECONDS = 0.25  # a typical cloud recognition round trip
+
+
+def find_audio_files(folder):
+    paths = []
+    for dirpath, _, filenames in os.walk(folder):
+        for name in filenames:
+            if name.lower().endswith(AUDIO_EXTENSIONS):
+                paths.append(os.path.join(dirpath, name))
+    return sorted(paths)
+
+
+def load_audio(path):
+    with sr.AudioFile(path) as source:
+        return sr.Recognizer().record(source)
+
+
+def segment_by_silence(audio, energy_threshold=300, min_silence=MIN_SILENCE_SECONDS,
+                       min_segment=MIN_SEGMENT_SECONDS, padding=PADDING_SECONDS):
+    """
+    Split an sr.AudioData into speech segments separated by silence.
+    Returns a list of (start_seconds, end_seconds, AudioData).
+    """
+    width = audio.sample_width
+    rate = audio.sample_rate
+    frame_bytes = max(width, int(rate * FRAME_SECONDS) * width)
+    data = audio.frame_data
+    total_frames = len(data) // frame_bytes
+
+    # RMS per frame on the 16-bit scale that energy_threshold is given in, whatever the sample width
+    samples = viki_audio.pcm_to_float(data[:total_frames * frame_bytes], width)[:, 0]
+    frames = samples.reshape(total_frames, -1) * 32768
+    voiced = list(np.sqrt(np.mean(frames * frames, axis=1)) > energy_threshold)
+
+    silence_frames = int(min_silence / FRAME_SECONDS)
+    segments = []
+    start = None
+    silent_run = 0
+    for i, is_voiced in enumerate(voiced + [False] * silence_frames):
+        if is_voiced:
+            if start is None:
+                start = i
+            silent_run = 0
+        elif start is not None:
+            silent_run += 1
+            if silent_run >= silence_frames:
+                segments.append((start, i - silent_run + 1))
+                start = None
+                silent_run = 0
+
+    pad_frames = int(padding / FRAME_SECONDS)
+    results = []
+    for first, last in segments:
+        if (last - first) * FRAME_SECONDS < min_segment:
+            continue
+        first = max(0, first - pad_frames)
+        last = min(total_frames, last + pad_frames)
+        chunk = data[first * frame_bytes:last * frame_bytes]
+        results.append((round(first * FRAME_SECONDS, 3), round(last * FRAME_SECONDS, 3),
+                        sr.AudioData(chunk, rate, width)))
+    return results
+
+
+def recognize_segment(frame_data, sample_rate, sample_width, engine="google", language="en-US"):
+    """Recognize one segment. Takes raw bytes so it can run in a worker process."""
+    recognizer = sr.Recognizer()
+    audio = viki_audio.prepare(sr.AudioData(frame_data, sample_rate, sample_width))
+    try:
+        if engine == "sphinx":
+            return recognizer.recognize_sphinx(audio, language=language), None
+        return recognizer.recognize_google(audio, language=language), None
+    except sr.UnknownValueError:
+        return None, "unintelligible"
+    except sr.RequestError as e:
+        return None, f"request failed: {e}"
+
+
+def standin_recognize_segment(frame_data, sample_rate, sample_width, engine="standin", language="en-US"):
+    """Same signature as recognize_segment; decodes tone words and sleeps for the network round trip."""
+    audio = viki_audio.prepare(sr.AudioData(frame_data, sample_rate, sample_width))
+    text = viki_audio.standin_recognize(audio.frame_data, audio.sample_rate)
+    time.sleep(STANDIN_LATENCY_SECONDS)
+    return (text, None) if text else (None, "unintelligible")
+
+
+def write_fixtures(folder, files=8, utterances=5, rate=16000):
+    """Write `files` WAV memos of `utterances` tone-word utterances each, for the stand-in engine."""
+    os.makedirs(folder, exist_ok=True)
+    phrases = viki_audio.FIXTURE_UTTERANCES
+    for i in range(files):
+        pcm = b"".join(viki_audio.synthesize_utterance(phrases[(i + j) % len(phrases)], rate, 1, seed=i * utterances + j)
+                       for j in range(utterances))
+        with wave.open(os.path.join(folder, f"memo_{i:03d}.wav"), "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(rate)
+            w.writeframes(pcm)
+
+
+def transcribe_folder(folder, workers=4, max_in_flight=None, use_processes=False,
+                      engine="google", language="en-US", energy_threshold=300,
+                      recognize=recognize_segment):
+    """
+    Yield one result dict per speech segment, in completion order.
+    At most `max_in_flight` segments (default 2 * workers) are submitted at a time,
+    so memory stays bounded no matter how large the folder is.
+    """
+    import viki  # perform_task's router, only needed by the coordinating process
+
+    max_in_flight = max_in_flight or workers * 2
+    slots = threading.BoundedSemaphore(max_in_flight)
+    done = []
+    done_ready = threading.Condition()
+    pool_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+
+    def on_done(future, meta):
+        slots.release()
+        with done_ready:
+            done.append((future, meta))
+            done_ready.notify()
+
+    def drain(block):
+        with done_ready:
+            if block and not done:
+                done_ready.wait()
+            finished = done[:]
+            done.clear()
+        for future, meta in finished:
+            try:
+                text, error = future.result()
+            except Exception as e:
+                text, error = None, str(e)
+            record = dict(meta, text=text, error=error)
+            if text:
+                record.update(viki.perform_task(text, dry_run=True))
+                del record["query"]
+            yield record
+
+    submitted = 0
+    completed = 0
+    with pool_class(max_workers=workers) as pool:
+        for path in find_audio_files(folder):
+            try:
+                segments = segment_by_silence(load_audio(path), energy_threshold=energy_threshold)
+            except Exception as e:
+                yield {"file": path, "segment": None, "error": f"could not read audio: {e}"}
+                continue
+            for index, (start, end, audio) in enumerate(segments):
+                # Blocks while max_in_flight segments are outstanding
+                while not slots.acquire(timeout=0.05):
+                    for record in drain(block=False):
+                        completed += 1
+                        yield record
+                meta = {"file": path, "segment": index, "start": start, "end": end}
+                future = pool.submit(recognize, audio.frame_data, audio.sample_rate,
+                                     audio.sample_width, engine, language)
+                future.add_done_callback(lambda f, meta=meta: on_done(f, meta))
+                submitted += 1
+            for record in drain(block=False):
+                completed += 1
+                yield record
+        while completed < submitted:
+            for record in drain(block=True):
+                completed += 1
+                yield record
+
+
+def write_jsonl(records, stream):
+    count = 0
+    for record in records:
+        stream.write(json.dumps(record) + "\n")
+        stream.flush()
+        count += 1
+    return count
+
+
+def benchmark(folder, worker_counts=(1, 2, 4, 8, 16), **kwargs):
+    """Print segments/second for each worker count over the same folder."""
+    print(f"{'workers':>8} {'segments':>9} {'seconds':>9} {'seg/s':>8}")
+    for workers in worker_counts:
+        started = time.perf_counter()
+        count = sum(1 for _ in transcribe_folder(folder, workers=workers, **kwargs))
+        elapsed = time.perf_counter() - started
+        print(f"{workers:>8} {count:>9} {elapsed:>9.2f} {count / elapsed:>8.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Transcribe a folder of audio files and extract VIKI intents.")
+    parser.add_argument("folder")
+    parser.add_argument("-o", "--output", help="JSONL output file (default: stdout)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--max-in-flight", type=int, default=None)
+    parser.add_argument("--processes", action="store_true", help="Use a process pool instead of threads")
+    parser.add_argument("--engine", choices=["google", "sphinx", "standin"], default="google")
+    parser.add_argument("--language", default="en-US")
+    parser.add_argument("--energy-threshold", type=int, default=300)
+    parser.add_argument("--bench", action="store_true", help="Report throughput for 1-16 workers")
+    parser.add_argument("--fixtures", type=int, default=0, metavar="N",
+                        help="First write N synthetic memos into the folder (for --engine standin)")
+    args = parser.parse_args(argv)
+    viki_log.setup()
+
+    if args.fixtures:
+        write_fixtures(args.folder, files=args.fixtures)
+    options = dict(max_in_flight=args.max_in_flight, use_processes=args.processes,
+                   engine=args.engine, language=args.language, energy_threshold=args.energy_threshold)
+    if args.engine == "standin":
+        options["recognize"] = standin_recognize_segment
+    if args.bench:
+        benchmark(args.folder, **options)
+        return
+
+    records = transcribe_folder(args.folder, workers=args.workers, **options)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            count = write_jsonl(records, f)
+    else:
+        count = write_jsonl(records, sys.stdout)
+    print(f"Transcribed {count} segments.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Camera capture configuration for VIKI.
+
+open_camera() asks the device for the resolution, frame rate and FOURCC in a
+CaptureConfig (MJPG by default, so USB webcams can deliver 640x480@30 without
+saturating the bus) and reads back what it actually agreed to. Only if the
+device refuses the size does Camera.frames() fall back to cv2.resize.
+
+Camera.frames() paces itself against deadlines instead of sleeping a fixed
+time after each frame: it sleeps until the next frame is due, and when the
+consumer has fallen behind it grab()s the one stale frame the driver has
+buffered (no decode) and retrieve()s the fresh one after it. It never grabs
+once per missed frame: with CAP_PROP_BUFFERSIZE=1 every extra grab blocks for
+a future frame and makes the loop later still. Achieved vs requested FPS and
+the number of skipped frames are reported by Camera.report().
+
+FakeCapture implements the cv2.VideoCapture methods used here with synthetic
+frames at a fixed native rate; `python viki_camera.py` runs the capture loop
+against it with a fast and a slow consumer.
+"""
+import time
+
+import cv2
+import numpy as np
+
+DEFAULT_DEVICE = 0
+DEFAULT_WIDTH = 640
+DEFAULT_HEIGHT = 480
+DEFAULT_FPS = 30.0
+DEFAULT_FOURCC = "MJPG"
+FPS_WINDOW_SECONDS = 2.0
+
+
+class CaptureConfig:
+    def __init__(self, device=DEFAULT_DEVICE, width=DEFAULT_WIDTH, height=DEFAULT_HEIGHT, fps=DEFAULT_FPS, fourcc=DEFAULT_FOURCC):
+        self.device = device
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.fourcc = fourcc
+
+    def __repr__(self):
+        return f"{self.width}x{self.height}@{self.fps:g} {self.fourcc or 'default'}"
+
+
+def decode_fourcc(value):
+    value = int(value)
+    return "".join(chr((value >> (8 * i)) & 0xFF) for i in range(4)).strip("\x00") or "?"
+
+
+class Camera:
+    def __init__(self, cap, config):
+        self.cap = cap
+        self.config = config
+        self.width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)) or config.width
+        self.height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) or config.height
+        self.device_fps = cap.get(cv2.CAP_PROP_FPS) or config.fps
+        self.fourcc = decode_fourcc(cap.get(cv2.CAP_PROP_FOURCC))
+        self.needs_resize = (self.width, self.height) != (config.width, config.height)
+        self.delivered = 0
+        self.skipped = 0
+        self._window = []   # delivery times within the last FPS_WINDOW_SECONDS
+
+    @property
+    def achieved_fps(self):
+        if len(self._window) < 2:
+            return 0.0
+        return (len(self._window) - 1) / (self._window[-1] - self._window[0])
+
+    def frames(self, should_run):
+        """
+        Yield (timestamp, BGR frame) at the configured rate while should_run() is true.
+        Stops early if the device stops delivering frames.
+        """
+        interval = 1.0 / self.config.fps
+        deadline = time.monotonic()
+        while should_run():
+            now = time.monotonic()
+            if now < deadline:
+                time.sleep(deadline - now)
+                now = deadline
+            if now - deadline >= interval:
+                # Late: the frame the driver buffered is stale; drop it undecoded
+                if not self.cap.grab():
+                    return
+                self.skipped += 1
+            if not self.cap.grab():
+                return
+            ret, frame = self.cap.retrieve()
+            captured = time.time()
+            if not ret:
+                return
+            # Pace from this frame when late, so lateness is never paid back with extra grabs
+            deadline = max(deadline + interval, time.monotonic())
+            if self.needs_resize:
+                frame = cv2.resize(frame, (self.config.width, self.config.height))
+            self._count(time.monotonic())
+            yield captured, frame
+
+    def _count(self, now):
+        self.delivered += 1
+        self._window.append(now)
+        while now - self._window[0] > FPS_WINDOW_SECONDS:
+            self._window.pop(0)
+
+    def report(self):
+        return (f"camera: requested {self.config}, device {self.width}x{self.height}@{self.device_fps:g} {self.fourcc}"
+                f"{' (resizing)' if self.needs_resize else ''}; achieved {self.achieved_fps:.1f} fps, "
+                f"{self.delivered} delivered, {self.skipped} skipped")
+
+    def release(self):
+        self.cap.release()
+
+
+def open_camera(config=None, backend=cv2.VideoCapture):
+    """Open and configure a capture device. Returns a Camera, or None if it cannot be opened."""
+    config = config or CaptureConfig()
+    cap = backend(config.device)
+    if not cap.isOpened():
+        return None
+    # FOURCC first: many drivers only offer the higher resolutions/rates in MJPG
+    if config.fourcc:
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*config.fourcc))
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, config.width)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, config.height)
+    cap.set(cv2.CAP_PROP_FPS, config.fps)
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)   # keep the driver queue short so frames are fresh
+    return Camera(cap, config)
+
+
+class FakeCapture:
+    """
+    Stand-in for cv2.VideoCapture: frames appear at `native_fps` and `modes`
+    lists the (width, height) sizes it accepts; anything else is refused.
+    """
+
+    def __init__(self, device=0, native_fps=30.0, modes=((640, 480), (1280, 720)), decode_seconds=0.0):
+        self.native_fps = native_fps
+        self.modes = modes
+        self.decode_seconds = decode_seconds
+        self.props = {cv2.CAP_PROP_FRAME_WIDTH: modes[-1][0], cv2.CAP_PROP_FRAME_HEIGHT: modes[-1][1],
+                      cv2.CAP_PROP_FPS: native_fps, cv2.CAP_PROP_FOURCC: cv2.VideoWriter_fourcc(*"YUYV")}
+        self.opened = True
+        self.started = time.monotonic()
+        self.index = -1
+        self.grabs = self.retrieves = 0
+
+    def isOpened(self):
+        return self.opened
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            if any(w == int(value) for w, _ in self.modes):
+                self.props[prop] = int(value)
+                return True
+            return False
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            if (self.props[cv2.CAP_PROP_FRAME_WIDTH], int(value)) in self.modes:
+                self.props[prop] = int(value)
+                return True
+            return False
+        if prop == cv2.CAP_PROP_FPS:
+            self.props[prop] = min(float(value), self.native_fps)
+            return True
+        if prop == cv2.CAP_PROP_FOURCC:
+            self.props[prop] = value
+            return True
+        return False
+
+    def get(self, prop):
+        return self.props.get(prop, 0)
+
+    def grab(self):
+        # Block until the next frame the sensor produces, like a real device
+        interval = 1.0 / self.props[cv2.CAP_PROP_FPS]
+        next_index = max(self.index + 1, int((time.monotonic() - self.started) / interval))
+        wait = self.started + next_index * interval - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        self.index = next_index
+        self.grabs += 1
+        return self.opened
+
+    def retrieve(self):
+        if self.decode_seconds:
+            time.sleep(self.decode_seconds)
+        self.retrieves += 1
+        width = int(self.props[cv2.CAP_PROP_FRAME_WIDTH])
+        height = int(self.props[cv2.CAP_PROP_FRAME_HEIGHT])
+        frame = np.full((height, width, 3), self.index % 256, dtype=np.uint8)
+        return True, frame
+
+    def read(self):
+        return self.grab() and self.retrieve()
+
+    def release(self):
+        self.opened = False
+
+
+def self_check(seconds=2.0):
+    for label, config, work, min_fps in [
+        ("fast consumer", CaptureConfig(), 0.0, 28),
+        ("slow consumer (50 ms/frame)", CaptureConfig(), 0.05, 14),
+        # A consumer that just keeps up must not be pushed further behind by extra grabs
+        ("25 fps device, 40 ms consumer", CaptureConfig(fps=25), 0.04, 22),
+        ("15 fps requested", CaptureConfig(fps=15), 0.0, 14),
+        ("unsupported size", CaptureConfig(width=800, height=600), 0.0, 28),
+    ]:
+        fake = None
+
+        def backend(device):
+            nonlocal fake
+            fake = FakeCapture(device)
+            return fake
+
+        camera = open_camera(config, backend=backend)
+        stop_at = time.monotonic() + seconds
+        for _, frame in camera.frames(lambda: time.monotonic() < stop_at):
+            assert frame.shape == (config.height, config.width, 3)
+            if work:
+                time.sleep(work)
+        print(f"{label}: {camera.report()} [grab {fake.grabs}, retrieve {fake.retrieves}]")
+        assert camera.needs_resize == ((config.width, config.height) not in fake.modes)
+        assert fake.retrieves == camera.delivered
+        assert camera.achieved_fps >= min_fps, camera.achieved_fps
+        camera.release()
+
+
+if __name__ == "__main__":
+    self_check()
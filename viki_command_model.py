@@ -0,0 +1,176 @@
+"""
+Model layer behind the "Applications Voice Command Mapping" table.
+
+CommandTableModel owns the rows and keeps dict indexes (voice command -> row id,
+path -> row ids), so lookups and duplicate checks never walk the Treeview.
+TreeviewSync mirrors model changes into a ttk.Treeview one row at a time and
+implements filtering by re-parenting the matching rows in a single Tk call.
+"""
+import os
+from collections import defaultdict
+
+
+class DuplicateCommandError(ValueError):
+    def __init__(self, voice_cmd, existing_iid):
+        super().__init__(f"Voice command '{voice_cmd}' is already mapped.")
+        self.voice_cmd = voice_cmd
+        self.existing_iid = existing_iid
+
+
+def display_name(app_path):
+    if app_path.startswith("web://"):
+        return app_path[len("web://"):]
+    return os.path.basename(app_path)
+
+
+def _voice_key(voice_cmd):
+    return voice_cmd.lower().strip()
+
+
+class CommandTableModel:
+    def __init__(self):
+        self._rows = {}                     # iid -> (app name, voice command, path), insertion ordered
+        self._by_voice = {}                 # normalized voice command -> iid
+        self._by_path = defaultdict(set)    # path -> set of iids
+        self._next_id = 0
+        self._listeners = []
+
+    # --- Observers ---
+
+    def subscribe(self, listener):
+        """listener(action, iid, values) with action in "insert", "update", "delete"."""
+        self._listeners.append(listener)
+
+    def _notify(self, action, iid, values):
+        for listener in self._listeners:
+            listener(action, iid, values)
+
+    # --- Queries ---
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, iid):
+        return iid in self._rows
+
+    def get(self, iid):
+        return self._rows.get(iid)
+
+    def rows(self):
+        return list(self._rows.items())
+
+    def find_by_voice(self, voice_cmd):
+        return self._by_voice.get(_voice_key(voice_cmd))
+
+    def iids_for_path(self, app_path):
+        return set(self._by_path.get(app_path, ()))
+
+    def to_commands(self):
+        """Return the {voice command: path} mapping saved to custom_commands.json."""
+        return {voice_cmd: app_path for _, voice_cmd, app_path in self._rows.values()}
+
+    def search(self, text):
+        """
+        Row ids whose name, voice command or path contains `text` (case-insensitive), in table order.
+        A substring match cannot use the dict indexes, so this is a scan of the model's rows; at the
+        size of a command table that is far below a keystroke's worth of time.
+        """
+        needle = text.lower().strip()
+        if not needle:
+            return list(self._rows)
+        return [iid for iid, values in self._rows.items()
+                if any(needle in value.lower() for value in values)]
+
+    # --- Mutations ---
+
+    def add(self, app_name, voice_cmd, app_path):
+        existing = self.find_by_voice(voice_cmd)
+        if existing is not None:
+            raise DuplicateCommandError(voice_cmd, existing)
+        self._next_id += 1
+        iid = f"cmd{self._next_id}"
+        values = (app_name, voice_cmd, app_path)
+        self._rows[iid] = values
+        self._by_voice[_voice_key(voice_cmd)] = iid
+        self._by_path[app_path].add(iid)
+        self._notify("insert", iid, values)
+        return iid
+
+    def update(self, iid, app_name, voice_cmd, app_path):
+        existing = self.find_by_voice(voice_cmd)
+        if existing is not None and existing != iid:
+            raise DuplicateCommandError(voice_cmd, existing)
+        old_name, old_voice, old_path = self._rows[iid]
+        values = (app_name, voice_cmd, app_path)
+        if values == (old_name, old_voice, old_path):
+            return
+        del self._by_voice[_voice_key(old_voice)]
+        self._by_path[old_path].discard(iid)
+        if not self._by_path[old_path]:
+            del self._by_path[old_path]
+        self._rows[iid] = values
+        self._by_voice[_voice_key(voice_cmd)] = iid
+        self._by_path[app_path].add(iid)
+        self._notify("update", iid, values)
+
+    def remove(self, iid):
+        app_name, voice_cmd, app_path = values = self._rows.pop(iid)
+        del self._by_voice[_voice_key(voice_cmd)]
+        self._by_path[app_path].discard(iid)
+        if not self._by_path[app_path]:
+            del self._by_path[app_path]
+        self._notify("delete", iid, values)
+
+    def replace_all(self, commands):
+        """
+        Make the model match a {voice command: path} mapping, touching only rows
+        that changed. Returns (added, updated, removed) counts.
+        """
+        wanted = {_voice_key(voice_cmd): (voice_cmd, app_path) for voice_cmd, app_path in commands.items()}
+        removed = updated = added = 0
+        for key, iid in list(self._by_voice.items()):
+            if key not in wanted:
+                self.remove(iid)
+                removed += 1
+        for key, (voice_cmd, app_path) in wanted.items():
+            iid = self._by_voice.get(key)
+            if iid is None:
+                self.add(display_name(app_path), voice_cmd, app_path)
+                added += 1
+            elif self._rows[iid][1:] != (voice_cmd, app_path):
+                self.update(iid, display_name(app_path), voice_cmd, app_path)
+                updated += 1
+        return added, updated, removed
+
+
+class TreeviewSync:
+    """Applies CommandTableModel changes to a ttk.Treeview and handles filtering."""
+
+    def __init__(self, tree, model):
+        self.tree = tree
+        self.model = model
+        self.filter_text = ""
+        model.subscribe(self._on_change)
+        for iid, values in model.rows():
+            tree.insert("", "end", iid=iid, values=values)
+
+    def _matches(self, values):
+        needle = self.filter_text.lower()
+        return not needle or any(needle in value.lower() for value in values)
+
+    def _on_change(self, action, iid, values):
+        if action == "insert":
+            self.tree.insert("", "end", iid=iid, values=values)
+            if not self._matches(values):
+                self.tree.detach(iid)
+        elif action == "update":
+            self.tree.item(iid, values=values)
+            if self.filter_text:
+                self.set_filter(self.filter_text)
+        elif action == "delete":
+            self.tree.delete(iid)
+
+    def set_filter(self, text):
+        self.filter_text = text.strip()
+        # Detached rows keep their data; set_children re-parents the visible ones in one call.
+        self.tree.set_children("", *self.model.search(self.filter_text))
@@ -0,0 +1,250 @@
+"""
+Multi-intent utterances: "open youtube and start workout".
+
+perform_task used to run the first intent it matched and drop the rest of the
+utterance. split_utterance() cuts a query at conjunctions ("and", "also",
+commas; "then" / "after that" for an explicit order) and keeps a cut only if
+the piece after it starts with a trigger phrase or custom command, so "search
+salt and pepper" stays one search and "search trains and bus stops" does not
+grow a "stop" step. plan() turns the pieces into Steps with dependencies:
+
+  * steps joined by "and" are independent and run concurrently;
+  * a step after "then" waits for every step before it;
+  * interactive intents (follow-up questions, reading aloud, stop) run last,
+    one at a time, in the user's own session.
+
+PlanRunner.run() executes the graph on a small thread pool. Each concurrent step
+speaks into its own collector, and the confirmations are spoken afterwards as
+one response instead of interleaving ("Opening YouTube. Time for a workout!").
+
+`python viki_compound.py --bench` compares end-to-end time against running the
+same steps sequentially with fake actions.
+"""
+import re
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger(__name__)
+
+MAX_STEPS = 6
+STEP_WORKERS = 4
+
+# "then" forms first so "and then" is not read as a plain "and"
+SEPARATOR = re.compile(r"\s*(?:,?\s*\b(?:and then|then|after that|afterwards)\b|,?\s*\b(?:and|also)\b|,)\s*")
+ORDERED_WORDS = ("then", "after that", "afterwards")
+
+# Intents that ask a question, read aloud or act on other output; never run concurrently
+INTERACTIVE_INTENTS = {"play_music", "wikipedia", "read_more", "exit", "plugin"}
+
+
+class Step:
+    def __init__(self, index, text, intent, argument, ordered=False):
+        self.index = index
+        self.text = text
+        self.intent = intent
+        self.argument = argument
+        self.ordered = ordered        # came after "then": waits for everything before it
+        self.after = set()            # indexes of steps that must finish first
+        self.interactive = intent in INTERACTIVE_INTENTS
+        self.spoken = []
+        self.error = None
+
+    def __repr__(self):
+        return f"Step({self.index}, {self.text!r}, {self.intent}, after={sorted(self.after)})"
+
+
+def split_utterance(query, route, starts_command):
+    """
+    [(clause, intent, argument, ordered)] for a query, using route(text) -> (intent, argument).
+    A piece after a conjunction is its own clause only if starts_command(piece) is true;
+    route() matches anywhere in the text, which would split on "bus stops". A single-intent
+    query comes back as one clause.
+    """
+    pieces = []
+    position = 0
+    for match in SEPARATOR.finditer(query):
+        pieces.append((query[position:match.start()], match.group().strip(" ,").lower()))
+        position = match.end()
+    pieces.append((query[position:], None))
+
+    clauses = []
+    joiner = None
+    for text, next_joiner in pieces:
+        text = text.strip()
+        if clauses and text and not starts_command(text):
+            intent = None
+        else:
+            intent, argument = route(text) if text else (None, None)
+        if clauses and intent is None:
+            # Not a command on its own: part of the previous clause ("search salt and pepper")
+            previous, _, _, ordered = clauses[-1]
+            merged = f"{previous} {joiner} {text}" if joiner else f"{previous}, {text}"
+            clauses[-1] = (merged.strip(), *route(merged.strip()), ordered)
+        elif text:
+            clauses.append((text, intent, argument, bool(joiner) and joiner.endswith(ORDERED_WORDS)))
+        joiner = next_joiner
+    if not clauses or any(intent is None for _, intent, _, _ in clauses):
+        return [(query, *route(query), False)]
+    return clauses[:MAX_STEPS]
+
+
+def plan(query, route, starts_command):
+    """Steps with their dependency sets filled in."""
+    steps = [Step(i, *clause) for i, clause in enumerate(split_utterance(query, route, starts_command))]
+    for step in steps:
+        earlier = [s for s in steps[:step.index] if not s.interactive]
+        if step.interactive:
+            # Run after all the others, one at a time
+            step.after = {s.index for s in earlier}
+        elif step.ordered:
+            step.after = {s.index for s in earlier}
+        else:
+            # Independent, but never overtakes a "then" barrier
+            barrier = max((s.index for s in earlier if s.ordered), default=None)
+            step.after = {s.index for s in earlier if barrier is not None and s.index <= barrier}
+    return steps
+
+
+def merge_confirmations(steps):
+    """One spoken response from every step's output, in utterance order."""
+    parts = []
+    for step in steps:
+        for text in step.spoken:
+            text = text.strip()
+            if text:
+                parts.append(text if text[-1] in ".!?" else text + ".")
+    return " ".join(parts)
+
+
+class PlanRunner:
+    def __init__(self, workers=STEP_WORKERS):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="viki-step")
+
+    def run(self, steps, execute, speak, proceed=None):
+        """
+        execute(step) runs one step. Concurrent steps should speak into step.spoken; their
+        output is merged and spoken once. Interactive steps then run in order on this
+        thread and speak for themselves; proceed(), if given, is checked before each one
+        after the first (e.g. to stop once a step has asked a question). Returns the steps.
+        """
+        concurrent = [s for s in steps if not s.interactive]
+        done = set()
+        finished = threading.Condition()
+
+        def run_step(step):
+            try:
+                execute(step)
+            except Exception as e:
+                step.error = e
+                log.exception("Step %r failed", step.text)
+            with finished:
+                done.add(step.index)
+                finished.notify_all()
+
+        waiting = list(concurrent)
+        with finished:
+            while len(done) < len(concurrent):
+                for step in [s for s in waiting if s.after <= done]:
+                    waiting.remove(step)
+                    self.pool.submit(run_step, step)
+                finished.wait()
+
+        response = merge_confirmations(concurrent)
+        if response:
+            speak(response)
+        interactive = [s for s in steps if s.interactive]
+        for position, step in enumerate(interactive):
+            if position and proceed is not None and not proceed():
+                log.info("Skipping %s: waiting for an answer", ", ".join(repr(s.text) for s in interactive[position:]))
+                break
+            run_step(step)
+        return steps
+
+
+# --- Benchmark with fake actions ---
+
+FAKE_INTENTS = [
+    ("time", ["what is the time"], 0.05, "It's 10:30 AM right now"),
+    ("open_youtube", ["open youtube"], 0.6, "Opening YouTube"),
+    ("workout", ["start workout"], 0.6, "Time for a workout!"),
+    ("open_notepad", ["open notepad"], 0.9, "Opening Notepad"),
+    ("open_calculator", ["open calculator"], 0.9, "Opening Calculator"),
+    ("search", ["search"], 1.2, "The search results are on your screen"),
+    ("play_music", ["play music"], 0.1, "What song would you like me to play?"),
+    ("exit", ["exit", "stop"], 0.0, "Goodbye!"),
+]
+
+
+def _fake_route(text):
+    text = text.lower()
+    for intent, phrases, _, _ in FAKE_INTENTS:
+        if any(phrase in text for phrase in phrases):
+            return intent, text.replace("search", "").strip() if intent == "search" else None
+    return None, None
+
+
+def _fake_starts(text):
+    text = text.lower()
+    return any(text.startswith(phrase) for _, phrases, _, _ in FAKE_INTENTS for phrase in phrases)
+
+
+def _fake_plan(query):
+    return plan(query, _fake_route, _fake_starts)
+
+
+def _fake_execute(step, speak):
+    _, _, cost, reply = next(i for i in FAKE_INTENTS if i[0] == step.intent)
+    time.sleep(cost)
+    speak(reply)
+
+
+def benchmark():
+    checks = {
+        "open youtube and start workout": ["open_youtube", "workout"],
+        "search salt and pepper": ["search"],
+        "open notepad, open calculator and then search cats": ["open_notepad", "open_calculator", "search"],
+        "open youtube and play music and open notepad": ["open_youtube", "play_music", "open_notepad"],
+        "what is the time": ["time"],
+        # A trigger inside a piece is not a new command: "stops" contains "stop"
+        "search trains and bus stops": ["search"],
+        "search pros and cons of exit polls": ["search"],
+        "open notepad and stop": ["open_notepad", "exit"],
+    }
+    for query, intents in checks.items():
+        assert [s.intent for s in _fake_plan(query)] == intents, _fake_plan(query)
+    assert _fake_plan("search salt and pepper")[0].argument == "salt and pepper"
+    assert _fake_plan("search trains and bus stops")[0].argument == "trains and bus stops"
+    assert [s.after for s in _fake_plan("open notepad, open calculator and then search cats")] == [set(), set(), {0, 1}]
+
+    runner = PlanRunner()
+    for query in ["open youtube and start workout",
+                  "open notepad and open calculator and search weather",
+                  "open notepad, open calculator and then search cats",
+                  "open youtube and start workout and play music"]:
+        steps = _fake_plan(query)
+        heard = []
+        started = time.perf_counter()
+        for step in steps:
+            _fake_execute(step, heard.append)
+        sequential = time.perf_counter() - started
+
+        heard = []
+        started = time.perf_counter()
+        runner.run(steps, lambda s: _fake_execute(s, heard.append if s.interactive else s.spoken.append), heard.append)
+        parallel = time.perf_counter() - started
+        print(f"{query!r}: {len(steps)} steps, sequential {sequential * 1000:5.0f} ms, "
+              f"parallel {parallel * 1000:5.0f} ms ({sequential / parallel:.1f}x)")
+        print(f"{'':>4}said: {heard[0]!r}" + (f" then {len(heard) - 1} interactive" if len(heard) > 1 else ""))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-intent utterance splitting and execution")
+    parser.add_argument("--bench", action="store_true", help="Compare parallel and sequential execution with fake actions")
+    args = parser.parse_args()
+    if args.bench:
+        benchmark()
+    else:
+        parser.print_help()
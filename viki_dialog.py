@@ -0,0 +1,152 @@
+"""
+Dialog manager for multi-turn intents.
+
+An intent that needs an answer ("What song would you like me to play?") does not
+sit in a loop calling recognize_speech(). It asks through DialogManager.ask(),
+which speaks the prompt, stores a continuation for that session and returns at
+once. The next utterance that session produces through the normal capture path
+(UI listen loop, typed command, server request) goes to perform_task, which
+hands it to resume() instead of routing it. The continuation may ask again,
+giving a chain of turns, or return UNHANDLED to say "that was not an answer";
+the dialog then ends and the utterance is routed as a normal command.
+
+Each session has at most one pending dialog, any number of sessions can have one,
+and an unanswered dialog is dropped after its timeout.
+"""
+import time
+import logging
+import threading
+
+log = logging.getLogger(__name__)
+
+DIALOG_TIMEOUT_SECONDS = 30.0
+SWEEP_INTERVAL_SECONDS = 1.0
+CANCEL_PHRASES = ("cancel", "never mind", "nevermind", "forget it")
+
+UNHANDLED = object()   # returned by a continuation when the utterance was not an answer
+
+
+class Dialog:
+    def __init__(self, name, handler, timeout=DIALOG_TIMEOUT_SECONDS, on_timeout=None):
+        self.name = name
+        self.handler = handler          # callable(reply) -> None or UNHANDLED
+        self.expires_at = time.monotonic() + timeout
+        self.on_timeout = on_timeout    # callable() run when nobody answers in time
+
+    @property
+    def expired(self):
+        return time.monotonic() >= self.expires_at
+
+
+class DialogManager:
+    def __init__(self):
+        self._pending = {}    # session id -> (session, Dialog)
+        self._lock = threading.Lock()
+        self._sweeper = None
+
+    def ask(self, session, prompt, handler, speak, name=None, timeout=DIALOG_TIMEOUT_SECONDS, on_timeout=None):
+        """Speak `prompt` and wait (without blocking) for the session's next utterance."""
+        dialog = Dialog(name or getattr(handler, "__name__", "dialog"), handler, timeout, on_timeout)
+        with self._lock:
+            self._pending[session.id] = (session, dialog)
+            if self._sweeper is None or not self._sweeper.is_alive():
+                self._sweeper = threading.Thread(target=self._sweep, daemon=True)
+                self._sweeper.start()
+        speak(prompt)
+        return dialog
+
+    def pending(self, session):
+        """The session's pending dialog, or None."""
+        with self._lock:
+            entry = self._pending.get(session.id)
+        if entry is None or entry[1].expired:
+            return None
+        return entry[1]
+
+    def cancel(self, session):
+        with self._lock:
+            return self._pending.pop(session.id, None) is not None
+
+    def resume(self, session, utterance):
+        """
+        Give an utterance to the session's pending dialog.
+        Returns True if it was consumed, False if it should be routed as a normal command.
+        """
+        with self._lock:
+            entry = self._pending.pop(session.id, None)
+        if entry is None or entry[1].expired:
+            return False
+        if utterance and any(phrase in utterance.lower() for phrase in CANCEL_PHRASES):
+            return True
+        return entry[1].handler(utterance) is not UNHANDLED
+
+    def _sweep(self):
+        while True:
+            time.sleep(SWEEP_INTERVAL_SECONDS)
+            with self._lock:
+                expired = [(sid, entry) for sid, entry in self._pending.items() if entry[1].expired]
+                for sid, _ in expired:
+                    del self._pending[sid]
+                if not self._pending and not expired:
+                    self._sweeper = None
+                    return
+            for _, (session, dialog) in expired:
+                if dialog.on_timeout is not None:
+                    try:
+                        dialog.on_timeout()
+                    except Exception as e:
+                        log.exception("Dialog %s timeout handler failed", dialog.name)
+
+
+def self_check():
+    """Many sessions with pending dialogs, chained questions, fall-through and timeouts."""
+    class FakeSession:
+        def __init__(self, session_id):
+            self.id = session_id
+
+    manager = DialogManager()
+    said = []
+    answers = {}
+    sessions = [FakeSession(f"s{i}") for i in range(100)]
+
+    def confirm(session, topic):
+        def handler(reply):
+            if "yes" in reply:
+                answers[session.id] = topic
+            elif "no" in reply:
+                manager.ask(session, "Which topic then?", lambda r: answers.__setitem__(session.id, r), said.append)
+            else:
+                return UNHANDLED
+        return handler
+
+    for session in sessions:
+        manager.ask(session, "What topic?",
+                    lambda reply, s=session: manager.ask(s, f"{reply}, right?", confirm(s, reply), said.append),
+                    said.append)
+    started = time.perf_counter()
+    for i, session in enumerate(sessions):
+        assert manager.resume(session, f"topic {i}")
+    for i, session in enumerate(sessions):
+        reply = "yes" if i % 3 == 0 else "no" if i % 3 == 1 else "what is the time"
+        consumed = manager.resume(session, reply)
+        assert consumed == (i % 3 != 2)
+        if i % 3 == 1:
+            assert manager.resume(session, f"other {i}")
+    elapsed = time.perf_counter() - started
+    for i, session in enumerate(sessions):
+        expected = {0: f"topic {i}", 1: f"other {i}", 2: None}[i % 3]
+        assert answers.get(session.id) == expected, (i, answers.get(session.id))
+        assert manager.pending(session) is None
+
+    timed_out = []
+    manager.ask(sessions[0], "Still there?", lambda reply: None, said.append, timeout=0.2,
+                on_timeout=lambda: timed_out.append(True))
+    time.sleep(0.2 + 2 * SWEEP_INTERVAL_SECONDS)
+    assert timed_out and manager.pending(sessions[0]) is None
+    assert not manager.resume(sessions[0], "yes")
+    print(f"dialog self-check passed: {len(sessions)} concurrent dialogs, {len(said)} prompts, "
+          f"{elapsed / (len(sessions) * 2) * 1e6:.1f} us per resume, timeout fired")
+
+
+if __name__ == "__main__":
+    self_check()
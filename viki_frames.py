@@ -0,0 +1,262 @@
+"""
+Frame ring buffer for camera frames.
+
+One producer (the capture loop) writes each frame into the next of N
+preallocated NumPy slots. Any number of consumers (display, recorder, photo
+snapshot, later vision stages) read through their own FrameReader at their own
+rate without locks and without slowing the producer down.
+
+Every slot carries a sequence number used as a seqlock: it is odd while the slot
+is being written and even once the frame is complete, so a reader that raced the
+producer sees the mismatch and retries instead of returning a torn frame.
+
+The ring lives either in ordinary process memory or, with shared=True, in a
+multiprocessing.shared_memory block so another process can attach to it and
+frames cross the process boundary without being pickled.
+
+Layout of the buffer:
+    [latest sequence: int64]
+    slot 0: [sequence: int64][timestamp: float64][frame bytes]
+    slot 1: ...
+
+Run `python viki_frames.py` for the torn-read check and a throughput benchmark.
+"""
+import time
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+
+CONTROL_BYTES = 8
+SLOT_HEADER_BYTES = 16
+DEFAULT_SHAPE = (480, 640, 3)
+DEFAULT_SLOTS = 8
+READ_RETRIES = 8
+
+
+class FrameRing:
+    def __init__(self, shape=DEFAULT_SHAPE, slots=DEFAULT_SLOTS, dtype=np.uint8, shared=False, name=None, create=True):
+        self.shape = tuple(shape)
+        self.slots = slots
+        self.dtype = np.dtype(dtype)
+        self.frame_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        self.slot_bytes = SLOT_HEADER_BYTES + self.frame_bytes
+        size = CONTROL_BYTES + self.slots * self.slot_bytes
+        self.shm = None
+        self.owner = create
+        if shared or name is not None:
+            if create:
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+                self.shm.buf[:size] = bytes(size)
+            else:
+                self.shm = shared_memory.SharedMemory(name=name)
+            buf = self.shm.buf
+        else:
+            buf = memoryview(bytearray(size))
+        self._latest = np.ndarray((1,), dtype=np.int64, buffer=buf, offset=0)
+        self._seqs = []
+        self._stamps = []
+        self._frames = []
+        for i in range(self.slots):
+            base = CONTROL_BYTES + i * self.slot_bytes
+            self._seqs.append(np.ndarray((1,), dtype=np.int64, buffer=buf, offset=base))
+            self._stamps.append(np.ndarray((1,), dtype=np.float64, buffer=buf, offset=base + 8))
+            self._frames.append(np.ndarray(self.shape, dtype=self.dtype, buffer=buf, offset=base + SLOT_HEADER_BYTES))
+
+    @property
+    def name(self):
+        return self.shm.name if self.shm is not None else None
+
+    def spec(self):
+        """Arguments another process needs to attach to a shared ring."""
+        if self.shm is None:
+            raise ValueError("Only a shared=True ring can be attached from another process")
+        return {"name": self.name, "shape": self.shape, "slots": self.slots, "dtype": self.dtype.str}
+
+    @classmethod
+    def attach(cls, spec):
+        return cls(spec["shape"], spec["slots"], np.dtype(spec["dtype"]), name=spec["name"], create=False)
+
+    @property
+    def latest_sequence(self):
+        return int(self._latest[0])
+
+    def write(self, frame, timestamp=None):
+        """Copy a frame into the next slot. Single producer only."""
+        sequence = int(self._latest[0]) + 1
+        slot = sequence % self.slots
+        self._seqs[slot][0] = 2 * sequence - 1       # odd: write in progress
+        self._frames[slot][...] = frame
+        self._stamps[slot][0] = time.time() if timestamp is None else timestamp
+        self._seqs[slot][0] = 2 * sequence           # even: frame complete
+        self._latest[0] = sequence
+        return sequence
+
+    def read(self, sequence, out=None):
+        """
+        Copy frame `sequence` into `out` (allocated if not given).
+        Returns (timestamp, frame), or None if that frame is not complete or was already overwritten.
+        """
+        slot = sequence % self.slots
+        for _ in range(READ_RETRIES):
+            if int(self._seqs[slot][0]) != 2 * sequence:
+                return None
+            if out is None:
+                out = np.empty(self.shape, dtype=self.dtype)
+            np.copyto(out, self._frames[slot])
+            timestamp = float(self._stamps[slot][0])
+            if int(self._seqs[slot][0]) == 2 * sequence:
+                return timestamp, out
+        return None
+
+    def read_latest(self, out=None):
+        """Return (sequence, timestamp, frame) for the newest complete frame, or None."""
+        for _ in range(READ_RETRIES):
+            sequence = int(self._latest[0])
+            if sequence == 0:
+                return None
+            result = self.read(sequence, out)
+            if result is not None:
+                return (sequence,) + result
+        return None
+
+    def reader(self):
+        return FrameReader(self)
+
+    def close(self):
+        # Drop numpy views before closing, or SharedMemory.close() raises BufferError
+        self._latest = self._seqs = self._stamps = self._frames = None
+        if self.shm is not None:
+            self.shm.close()
+            if self.owner:
+                self.shm.unlink()
+
+
+class FrameReader:
+    """Independent cursor over a FrameRing; each consumer owns one."""
+
+    def __init__(self, ring):
+        self.ring = ring
+        self.position = 0   # last sequence handed out
+        self.dropped = 0    # frames skipped because the producer lapped this reader
+
+    def latest(self, out=None, only_new=False):
+        """Newest complete frame as (sequence, timestamp, frame), or None."""
+        if only_new and self.ring.latest_sequence <= self.position:
+            return None
+        result = self.ring.read_latest(out)
+        if result is not None:
+            self.position = max(self.position, result[0])
+        return result
+
+    def next(self, out=None):
+        """
+        Next frame after this reader's position, in order, or None if it has not been written yet.
+        Frames the producer already overwrote are skipped and counted in `dropped`.
+        """
+        while True:
+            latest = self.ring.latest_sequence
+            if latest <= self.position:
+                return None
+            oldest = max(1, latest - self.ring.slots + 2)  # the slot after `latest` may be mid-write
+            if self.position + 1 < oldest:
+                self.dropped += oldest - self.position - 1
+                self.position = oldest - 1
+            sequence = self.position + 1
+            result = self.ring.read(sequence, out)
+            if result is not None:
+                self.position = sequence
+                return (sequence,) + result
+            # Overwritten between the check and the copy; loop re-evaluates the window
+
+
+# --- Self-check and benchmark ---
+
+def _producer(ring, count, pace=0.0):
+    frame = np.empty(ring.shape, dtype=ring.dtype)
+    for sequence in range(1, count + 1):
+        frame.fill(sequence % 251)
+        ring.write(frame)
+        if pace:
+            time.sleep(pace)
+
+
+def _attached_producer(spec, count):
+    ring = FrameRing.attach(spec)
+    _producer(ring, count)
+    ring.close()
+
+
+def _check_reader(index, reader, stop, results, use_next):
+    torn = reads = 0
+    out = np.empty(reader.ring.shape, dtype=reader.ring.dtype)
+    while not stop.is_set():
+        result = reader.next(out) if use_next else reader.latest(out, only_new=True)
+        if result is None:
+            continue
+        sequence, _, frame = result
+        reads += 1
+        expected = sequence % 251
+        if frame.flat[0] != expected or frame.min() != expected or frame.max() != expected:
+            torn += 1
+    results.append((index, "next" if use_next else "latest", reads, torn, reader.dropped))
+
+
+def torn_read_check(frames=3000, readers=3, shape=DEFAULT_SHAPE, slots=DEFAULT_SLOTS, shared=False):
+    """
+    Hammer a ring with one writer and several readers; returns the number of torn frames seen (should be 0).
+    With shared=True the writer runs in a separate process attached to shared memory.
+    """
+    import multiprocessing as mp
+
+    ring = FrameRing(shape, slots, shared=shared)
+    stop = threading.Event()
+    results = []
+    threads = [threading.Thread(target=_check_reader, args=(i, ring.reader(), stop, results, i % 2 == 0))
+               for i in range(readers)]
+    for thread in threads:
+        thread.start()
+    if shared:
+        producer = mp.get_context("spawn").Process(target=_attached_producer, args=(ring.spec(), frames))
+        producer.start()
+        producer.join()
+    else:
+        _producer(ring, frames)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    ring.close()
+    for index, mode, reads, torn, dropped in sorted(results):
+        print(f"reader {index} ({mode}): {reads} frames read, {torn} torn, {dropped} dropped")
+    return sum(result[3] for result in results)
+
+
+def benchmark(frames=2000, shape=DEFAULT_SHAPE, shared=False):
+    ring = FrameRing(shape, shared=shared)
+    frame = np.zeros(shape, dtype=np.uint8)
+    started = time.perf_counter()
+    for _ in range(frames):
+        ring.write(frame)
+    write_rate = frames / (time.perf_counter() - started)
+
+    reader = ring.reader()
+    out = np.empty(shape, dtype=np.uint8)
+    started = time.perf_counter()
+    for _ in range(frames):
+        reader.latest(out)
+    read_rate = frames / (time.perf_counter() - started)
+    ring.close()
+    mb = ring.frame_bytes / 1e6
+    kind = "shared" if shared else "local"
+    print(f"{kind:>6} {shape}: write {write_rate:,.0f} frames/s ({write_rate * mb:,.0f} MB/s), "
+          f"read latest {read_rate:,.0f} frames/s ({read_rate * mb:,.0f} MB/s)")
+
+
+if __name__ == "__main__":
+    for shared in (False, True):
+        torn = torn_read_check(shared=shared)
+        kind = "shared memory" if shared else "in-process"
+        print(f"torn-read check ({kind}):", "PASS" if torn == 0 else f"FAIL ({torn} torn frames)")
+        assert torn == 0, f"{torn} torn frames read from the {kind} ring"
+    benchmark(shared=False)
+    benchmark(shared=True)
@@ -0,0 +1,379 @@
+"""
+Media gallery for photos/ and recordings/ with an on-disk thumbnail cache.
+
+ThumbnailCache keys each thumbnail by a content fingerprint (size plus a hash
+of the first and last 64 KiB), so a file that is renamed or moved keeps its
+thumbnail and a file rewritten in place gets a new one. A small index maps
+path -> (size, mtime, key); when size and mtime still match, opening the
+gallery costs one stat() per file and no reads at all. Thumbnails are made on
+a thread pool: images with PIL (JPEG decoded at reduced scale via draft()),
+videos from a poster frame that OpenCV seeks to a tenth of the way in.
+
+GalleryView draws tiles on a plain tk.Canvas and only asks for the thumbnails
+of tiles that are on screen. Finished thumbnails are reported to on_ready from
+a pool thread; the UI passes them back to show() on the Tk thread, where they
+become PhotoImages. PhotoImages more than EVICT_MARGIN_ROWS rows off screen
+are dropped again, so scrolling through thousands of files holds only about a
+screenful of decoded images.
+
+`python viki_gallery.py --bench` creates 5,000 media files and reports cold
+and warm gallery open times.
+"""
+import os
+import json
+import time
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import PIL.Image
+
+THUMB_CACHE_DIR = "thumb_cache"
+THUMB_SIZE = (160, 120)
+THUMB_WORKERS = 4
+FINGERPRINT_BYTES = 64 * 1024
+POSTER_POSITION = 0.1          # fraction of the video to seek to for the poster frame
+INDEX_SAVE_INTERVAL = 2.0
+MEDIA_DIRS = ("photos", "recordings")
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp", ".bmp", ".gif"}
+VIDEO_EXTENSIONS = {".mp4", ".avi", ".mov", ".mkv"}
+TILE_PADDING = 8
+EVICT_MARGIN_ROWS = 3         # thumbnails kept this many rows above and below the view
+
+
+def media_kind(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in IMAGE_EXTENSIONS:
+        return "image"
+    if ext in VIDEO_EXTENSIONS:
+        return "video"
+    return None
+
+
+def scan_media(dirs=MEDIA_DIRS):
+    """[(path, size, mtime_ns)] for every photo and recording, newest first."""
+    found = []
+    for folder in dirs:
+        if not os.path.isdir(folder):
+            continue
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.is_file() and media_kind(entry.name):
+                    st = entry.stat()
+                    found.append((entry.path, st.st_size, st.st_mtime_ns))
+    found.sort(key=lambda item: item[2], reverse=True)
+    return found
+
+
+def fingerprint(path, size):
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(size).encode())
+    with open(path, "rb") as f:
+        digest.update(f.read(FINGERPRINT_BYTES))
+        if size > 2 * FINGERPRINT_BYTES:
+            f.seek(-FINGERPRINT_BYTES, os.SEEK_END)
+            digest.update(f.read(FINGERPRINT_BYTES))
+    return digest.hexdigest()
+
+
+def make_thumbnail(path, size=THUMB_SIZE):
+    """PIL image no larger than `size`: the picture itself, or a video's poster frame."""
+    if media_kind(path) == "video":
+        capture = cv2.VideoCapture(path)
+        try:
+            frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+            if frames > 1:
+                capture.set(cv2.CAP_PROP_POS_FRAMES, int(frames * POSTER_POSITION))
+            ok, frame = capture.read()
+        finally:
+            capture.release()
+        if not ok:
+            raise ValueError(f"No frame in {path}")
+        image = PIL.Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    else:
+        image = PIL.Image.open(path)
+        image.draft("RGB", size)   # JPEG: decode at 1/2, 1/4 or 1/8 scale instead of full size
+        image = image.convert("RGB")
+    image.thumbnail(size, PIL.Image.Resampling.LANCZOS)
+    return image
+
+
+class ThumbnailCache:
+    def __init__(self, cache_dir=THUMB_CACHE_DIR, size=THUMB_SIZE, workers=THUMB_WORKERS):
+        self.cache_dir = cache_dir
+        self.size = tuple(size)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="viki-thumb")
+        self._index_path = os.path.join(cache_dir, f"index_{self.size[0]}x{self.size[1]}.json")
+        self._index = {}             # path -> [size, mtime_ns, key]
+        self._pending = {}           # path -> Future, so a tile scrolled past twice is made once
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._saved_at = 0.0
+        os.makedirs(cache_dir, exist_ok=True)
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                self._index = json.load(f)
+        except (OSError, ValueError):
+            self._index = {}
+
+    def _thumb_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}_{self.size[0]}x{self.size[1]}.jpg")
+
+    def cached_path(self, path, size, mtime_ns):
+        """Thumbnail file for an unchanged, already indexed file, or None. Only a dict lookup and a stat."""
+        with self._lock:
+            entry = self._index.get(path)
+        if entry and entry[0] == size and entry[1] == mtime_ns:
+            thumb = self._thumb_path(entry[2])
+            if os.path.exists(thumb):
+                return thumb
+        return None
+
+    def thumbnail(self, path, size=None, mtime_ns=None):
+        """Path of the cached thumbnail for `path`, making it if needed. Runs on the calling thread."""
+        if size is None or mtime_ns is None:
+            st = os.stat(path)
+            size, mtime_ns = st.st_size, st.st_mtime_ns
+        thumb = self.cached_path(path, size, mtime_ns)
+        if thumb is not None:
+            return thumb
+        key = fingerprint(path, size)
+        thumb = self._thumb_path(key)
+        if not os.path.exists(thumb):
+            # Same content under another name already has a thumbnail; otherwise make one
+            image = make_thumbnail(path, self.size)
+            os.makedirs(os.path.dirname(thumb), exist_ok=True)
+            partial = f"{thumb}.{threading.get_ident()}.tmp"
+            image.save(partial, "JPEG", quality=85)
+            os.replace(partial, thumb)
+        with self._lock:
+            self._index[path] = [size, mtime_ns, key]
+            self._dirty = True
+        self._maybe_save_index()
+        return thumb
+
+    def request(self, path, size=None, mtime_ns=None, callback=None):
+        """Make the thumbnail on the pool; callback(path, thumb_path or None) runs on a pool thread."""
+        with self._lock:
+            future = self._pending.get(path)
+            submitted = future is None
+            if submitted:
+                future = self.pool.submit(self.thumbnail, path, size, mtime_ns)
+                self._pending[path] = future
+        if submitted:
+            # Outside the lock: an already finished future runs the callback right here
+            future.add_done_callback(lambda f: self._forget(path))
+        if callback is not None:
+            future.add_done_callback(
+                lambda f: callback(path, None if f.cancelled() or f.exception() else f.result()))
+        return future
+
+    def _forget(self, path):
+        with self._lock:
+            self._pending.pop(path, None)
+
+    def _maybe_save_index(self, force=False):
+        with self._lock:
+            if not self._dirty or (not force and time.monotonic() - self._saved_at < INDEX_SAVE_INTERVAL):
+                return
+            snapshot = json.dumps(self._index)
+            self._dirty = False
+            self._saved_at = time.monotonic()
+        partial = f"{self._index_path}.{threading.get_ident()}.tmp"
+        with open(partial, "w", encoding="utf-8") as f:
+            f.write(snapshot)
+        os.replace(partial, self._index_path)
+
+    def close(self):
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        self._maybe_save_index(force=True)
+
+
+class GalleryView:
+    """
+    Virtual grid of thumbnails on a tk.Canvas. Tiles are placeholders until they scroll
+    into view. on_ready(index, path, thumb) is called from a pool thread when a
+    thumbnail is made; the caller must hand it to show() on the Tk thread.
+    """
+
+    def __init__(self, canvas, cache, on_ready, on_open=None):
+        self.canvas = canvas
+        self.cache = cache
+        self.on_ready = on_ready
+        self.on_open = on_open or (lambda path: None)
+        self.items = []
+        self.images = {}          # path -> PhotoImage, kept referenced while shown
+        self.drawn = {}           # index -> path of tiles showing a PhotoImage
+        self.requested = set()
+        self.tile_w, self.tile_h = cache.size
+        self.columns = 1
+        canvas.bind("<Configure>", lambda e: self.layout())
+        canvas.bind("<Button-1>", self._on_click)
+
+    def set_items(self, items):
+        """items: [(path, size, mtime_ns)] as scan_media returns them."""
+        self.items = items
+        self.images.clear()
+        self.drawn.clear()
+        self.requested.clear()
+        self.layout()
+
+    def layout(self):
+        width = max(1, self.canvas.winfo_width())
+        self.columns = max(1, (width - TILE_PADDING) // (self.tile_w + TILE_PADDING))
+        rows = (len(self.items) + self.columns - 1) // self.columns
+        height = rows * (self.tile_h + TILE_PADDING) + TILE_PADDING
+        self.canvas.delete("all")
+        self.canvas.configure(scrollregion=(0, 0, width, height))
+        self.refresh()
+
+    def _tile_origin(self, index):
+        row, column = divmod(index, self.columns)
+        return (TILE_PADDING + column * (self.tile_w + TILE_PADDING),
+                TILE_PADDING + row * (self.tile_h + TILE_PADDING))
+
+    def visible_range(self):
+        top = self.canvas.canvasy(0)
+        bottom = top + self.canvas.winfo_height()
+        row_h = self.tile_h + TILE_PADDING
+        first = max(0, int(top // row_h)) * self.columns
+        last = min(len(self.items), (int(bottom // row_h) + 1) * self.columns)
+        return first, last
+
+    def refresh(self):
+        """Draw the visible tiles and request thumbnails only for those. Call after scrolling."""
+        first, last = self.visible_range()
+        for index in range(first, last):
+            path, size, mtime_ns = self.items[index]
+            tag = f"tile{index}"
+            if self.canvas.find_withtag(tag):
+                continue
+            x, y = self._tile_origin(index)
+            if path in self.images:
+                self.canvas.create_image(x, y, image=self.images[path], anchor="nw", tags=(tag, "tile"))
+                self.drawn[index] = path
+                continue
+            self.canvas.create_rectangle(x, y, x + self.tile_w, y + self.tile_h, outline="#888", tags=(tag, "tile"))
+            label = ("VIDEO " if media_kind(path) == "video" else "") + os.path.basename(path)[:20]
+            self.canvas.create_text(x + 4, y + 4, text=label, anchor="nw", font=("Segoe UI", 8), tags=(tag, "tile"))
+            if path not in self.requested:
+                self.requested.add(path)
+                thumb = self.cache.cached_path(path, size, mtime_ns)
+                if thumb is not None:
+                    self.show(index, path, thumb)
+                else:
+                    self.cache.request(path, size, mtime_ns, callback=lambda p, t, i=index: self.on_ready(i, p, t))
+        self._evict(first, last)
+
+    def _evict(self, first, last):
+        """Drop the PhotoImages, and their tiles, of rows more than EVICT_MARGIN_ROWS away from the view."""
+        margin = EVICT_MARGIN_ROWS * self.columns
+        for index in [i for i in self.drawn if not first - margin <= i < last + margin]:
+            path = self.drawn.pop(index)
+            self.images.pop(path, None)
+            # Redrawn from the disk cache by refresh() when it scrolls back into view
+            self.requested.discard(path)
+            self.canvas.delete(f"tile{index}")
+
+    def show(self, index, path, thumb):
+        import PIL.ImageTk
+        if thumb is None or index >= len(self.items) or self.items[index][0] != path:
+            return
+        self.images[path] = PIL.ImageTk.PhotoImage(PIL.Image.open(thumb))
+        tag = f"tile{index}"
+        self.canvas.delete(tag)
+        x, y = self._tile_origin(index)
+        self.canvas.create_image(x, y, image=self.images[path], anchor="nw", tags=(tag, "tile"))
+        self.drawn[index] = path
+
+    def _on_click(self, event):
+        x, y = self.canvas.canvasx(event.x), self.canvas.canvasy(event.y)
+        column = int((x - TILE_PADDING) // (self.tile_w + TILE_PADDING))
+        row = int((y - TILE_PADDING) // (self.tile_h + TILE_PADDING))
+        index = row * self.columns + column
+        if 0 <= column < self.columns and 0 <= index < len(self.items):
+            self.on_open(self.items[index][0])
+
+
+# --- Benchmark ---
+
+def _make_media(root, count, videos):
+    import numpy as np
+    rng = np.random.default_rng(0)
+    photos = os.path.join(root, "photos")
+    recordings = os.path.join(root, "recordings")
+    os.makedirs(photos)
+    os.makedirs(recordings)
+    base = rng.integers(0, 255, (480, 640, 3), dtype=np.uint8)
+    for i in range(count - videos):
+        frame = np.roll(base, i * 7, axis=1)
+        cv2.putText(frame, str(i), (40, 240), cv2.FONT_HERSHEY_SIMPLEX, 4, (255, 255, 255), 8)
+        cv2.imwrite(os.path.join(photos, f"photo_{i:05d}.jpg"), frame)
+    for i in range(videos):
+        writer = cv2.VideoWriter(os.path.join(recordings, f"viki_recording_{i:03d}.avi"),
+                                 cv2.VideoWriter_fourcc(*"MJPG"), 20, (320, 240))
+        for j in range(40):
+            writer.write(np.roll(base[:240, :320], (i + j) * 5, axis=0))
+        writer.release()
+    return (photos, recordings)
+
+
+def benchmark(count=5000, videos=50, visible=40):
+    import tempfile
+    with tempfile.TemporaryDirectory() as root:
+        started = time.perf_counter()
+        dirs = _make_media(root, count, videos)
+        print(f"created {count} media files ({videos} videos) in {time.perf_counter() - started:.1f} s")
+        cache_dir = os.path.join(root, "thumb_cache")
+
+        # Old behaviour for comparison: open and LANCZOS-thumbnail on the calling (Tk) thread
+        items = scan_media(dirs)
+        started = time.perf_counter()
+        for path, _, _ in items[:visible]:
+            image = PIL.Image.open(path) if media_kind(path) == "image" else make_thumbnail(path, (640, 480))
+            image.thumbnail(THUMB_SIZE, PIL.Image.Resampling.LANCZOS)
+        print(f"{'inline (no cache, Tk thread)':>30}: first screen {(time.perf_counter() - started) * 1000:7.0f} ms")
+
+        for label in ("cold cache", "warm cache"):
+            cache = ThumbnailCache(cache_dir)
+            started = time.perf_counter()
+            items = scan_media(dirs)
+            scanned = time.perf_counter() - started
+            # First screen: the visible tiles, as GalleryView asks for them
+            futures = [cache.request(path, size, mtime) for path, size, mtime in items[:visible]
+                       if cache.cached_path(path, size, mtime) is None]
+            for future in futures:
+                future.result()
+            first_screen = time.perf_counter() - started
+            futures = [cache.request(path, size, mtime) for path, size, mtime in items
+                       if cache.cached_path(path, size, mtime) is None]
+            for future in futures:
+                future.result()
+            everything = time.perf_counter() - started
+            cache.close()
+            print(f"{label:>30}: scan {scanned * 1000:5.0f} ms, first screen ({visible} tiles) "
+                  f"{first_screen * 1000:7.0f} ms, all {len(items)} thumbnails {everything * 1000:7.0f} ms")
+
+        # Renamed file: found by content, no new thumbnail made
+        path = items[0][0]
+        renamed = path + ".renamed.jpg"
+        os.rename(path, renamed)
+        cache = ThumbnailCache(cache_dir)
+        made_before = sum(len(files) for _, _, files in os.walk(cache_dir))
+        cache.thumbnail(renamed)
+        cache.close()
+        assert sum(len(files) for _, _, files in os.walk(cache_dir)) == made_before
+        print("renamed file reused its cached thumbnail")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Media gallery thumbnail cache")
+    parser.add_argument("--bench", action="store_true", help="Cold vs warm gallery open time for --count media files")
+    parser.add_argument("--count", type=int, default=5000)
+    args = parser.parse_args()
+    if args.bench:
+        benchmark(args.count)
+    else:
+        parser.print_help()
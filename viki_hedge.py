@@ -0,0 +1,332 @@
+"""
+Hedged requests for VIKI's remote backends.
+
+A turn used to wait on exactly one remote call (Google speech recognition,
+Wikipedia) with no deadline. Hedger.call() takes a list of attempts in
+preference order, e.g. the remote recognizer then the offline one, and:
+
+  * starts the first attempt;
+  * if it has not answered after that backend's recent p95 latency (clamped to
+    HEDGE_MIN/MAX_DELAY), starts the next attempt as a backup, and so on;
+    with race=True all attempts start at once;
+  * returns the first good result (anything but None or an exception) and
+    cancels the rest: attempts not yet started are dropped, running ones are
+    told to stop through their cancel event and their result is ignored;
+  * skips backends whose CircuitBreaker is open after repeated failures, and
+    lets one trial request through after BREAKER_RESET_SECONDS.
+
+Exceptions listed in `passthrough` (e.g. "no such article") are answers, not
+backend failures: they are re-raised to the caller and do not trip the breaker.
+
+`python viki_hedge.py --bench` runs the hedger against local stand-in HTTP
+servers with injected latency and failures.
+"""
+import time
+import random
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+HEDGE_MIN_DELAY = 0.05
+HEDGE_MAX_DELAY = 1.0         # a backup starts within this however slow the tail gets
+DEFAULT_HEDGE_DELAY = 0.5     # until a backend has enough samples for a p95
+MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+DEFAULT_TIMEOUT = 10.0
+BREAKER_FAILURES = 3
+BREAKER_RESET_SECONDS = 30.0
+
+
+class AllBackendsFailed(Exception):
+    pass
+
+
+class LatencyTracker:
+    def __init__(self, window=LATENCY_WINDOW):
+        self.samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def percentile(self, fraction, default=None):
+        with self._lock:
+            if len(self.samples) < MIN_SAMPLES:
+                return default
+            ordered = sorted(self.samples)
+        # Interpolated between the two nearest samples, so with few samples one outlier
+        # moves the p95 a little instead of becoming it
+        position = fraction * (len(ordered) - 1)
+        lower = int(position)
+        upper = min(lower + 1, len(ordered) - 1)
+        return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class CircuitBreaker:
+    """Closed: calls go through. Open: skipped until reset_seconds pass, then one trial call (half-open)."""
+
+    def __init__(self, failures=BREAKER_FAILURES, reset_seconds=BREAKER_RESET_SECONDS):
+        self.max_failures = failures
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.reset_seconds else "open"
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_seconds and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def release(self):
+        """An allowed attempt never ran: give the half-open trial back."""
+        with self._lock:
+            self._trial = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.max_failures:
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+
+class Backend:
+    def __init__(self, name, failures=BREAKER_FAILURES, reset_seconds=BREAKER_RESET_SECONDS):
+        self.name = name
+        self.latency = LatencyTracker()
+        self.breaker = CircuitBreaker(failures, reset_seconds)
+
+    def hedge_delay(self):
+        p95 = self.latency.percentile(0.95, DEFAULT_HEDGE_DELAY)
+        return min(HEDGE_MAX_DELAY, max(HEDGE_MIN_DELAY, p95))
+
+
+class Hedger:
+    def __init__(self, workers=8):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="viki-hedge")
+        self.backends = {}
+        self._lock = threading.Lock()
+
+    def backend(self, name):
+        with self._lock:
+            if name not in self.backends:
+                self.backends[name] = Backend(name)
+            return self.backends[name]
+
+    def _run(self, backend, fn, cancel):
+        started = time.monotonic()
+        try:
+            result = fn(cancel)
+        except Exception as e:
+            return backend, e, time.monotonic() - started
+        return backend, result, time.monotonic() - started
+
+    def call(self, attempts, timeout=DEFAULT_TIMEOUT, race=False, passthrough=()):
+        """
+        attempts: [(backend name, fn(cancel_event) -> result or None)] in preference order.
+        Returns (backend name, result). Raises AllBackendsFailed, or a passthrough exception.
+        """
+        pending = [(self.backend(name), fn) for name, fn in attempts]
+        pending = [(b, fn) for b, fn in pending if b.breaker.allow()] or pending[-1:]
+        cancel = threading.Event()
+        deadline = time.monotonic() + timeout
+        running = {}
+        timed_out = set()
+        errors = []
+        next_start = time.monotonic()
+        try:
+            while True:
+                now = time.monotonic()
+                # Launch the next attempt when its hedge delay is up (or right away when racing)
+                while pending and (race or now >= next_start or not running):
+                    backend, fn = pending.pop(0)
+                    running[self.pool.submit(self._run, backend, fn, cancel)] = backend
+                    next_start = now + backend.hedge_delay()
+                if not running:
+                    break
+                wake = deadline if not pending else min(deadline, next_start)
+                done, _ = wait(running, timeout=max(0.0, wake - time.monotonic()), return_when=FIRST_COMPLETED)
+                for future in done:
+                    backend, result, elapsed = future.result()
+                    del running[future]
+                    if passthrough and isinstance(result, passthrough):
+                        backend.latency.add(elapsed)
+                        backend.breaker.record_success()
+                        raise result
+                    if isinstance(result, Exception) or result is None:
+                        backend.breaker.record_failure()
+                        errors.append(f"{backend.name}: {result!r}")
+                        next_start = time.monotonic()   # failed: start the next one now
+                        continue
+                    backend.latency.add(elapsed)
+                    backend.breaker.record_success()
+                    return backend.name, result
+                if time.monotonic() >= deadline:
+                    for future, backend in running.items():
+                        timed_out.add(future)
+                        backend.breaker.record_failure()
+                        errors.append(f"{backend.name}: timed out after {timeout:.1f} s")
+                    break
+        finally:
+            cancel.set()
+            # Attempts that never started must not keep a half-open breaker's trial slot
+            for backend, _ in pending:
+                backend.breaker.release()
+            for future, backend in running.items():
+                if future.cancel():
+                    backend.breaker.release()
+                else:
+                    # Still running; its outcome still counts for the breaker
+                    future.add_done_callback(lambda f, b=backend, r=future not in timed_out:
+                                             self._late_result(f, b, r, passthrough))
+        raise AllBackendsFailed("; ".join(errors) or "no backend available")
+
+    def _late_result(self, future, backend, record, passthrough):
+        _, result, elapsed = future.result()
+        ok = (passthrough and isinstance(result, passthrough)) or (not isinstance(result, Exception) and result is not None)
+        # Its latency is not recorded: the stalls a backup was started for would push the p95,
+        # and so the hedge delay, up to the stall itself and switch hedging off
+        if not record:
+            return   # already counted as a timeout
+        if ok:
+            backend.breaker.record_success()
+        else:
+            backend.breaker.record_failure()
+
+
+# --- Stand-in servers and benchmark ---
+
+def _standin_server(latency, failure_rate=0.0, seed=0):
+    """Local HTTP server whose response time is drawn from latency() and that fails at failure_rate."""
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            with lock:
+                delay, fail = latency(rng), rng.random() < failure_rate
+            time.sleep(delay)
+            body = b"error" if fail else b"ok"
+            self.send_response(500 if fail else 200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+def _http_attempt(url, timeout=5.0):
+    import urllib.request
+    import urllib.error
+
+    def attempt(cancel):
+        try:
+            with urllib.request.urlopen(url, timeout=timeout) as response:
+                return response.read().decode()
+        except urllib.error.HTTPError:
+            return None
+    return attempt
+
+
+def _summary(label, latencies, failures):
+    latencies.sort()
+    pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+    print(f"{label:>34}: p50 {pick(0.5):6.0f} ms  p95 {pick(0.95):6.0f} ms  p99 {pick(0.99):6.0f} ms  "
+          f"max {latencies[-1] * 1000:6.0f} ms  failures {failures}")
+    return pick(0.95)
+
+
+def benchmark(requests=200):
+    # Remote backend: usually 30-60 ms, 5% of requests stall for 1.5 s (a slow tail)
+    tail = lambda rng: 1.5 if rng.random() < 0.05 else rng.uniform(0.03, 0.06)
+    remote, remote_url = _standin_server(tail, seed=1)
+    replica, replica_url = _standin_server(tail, seed=2)
+    local, local_url = _standin_server(lambda rng: rng.uniform(0.15, 0.2), seed=3)
+    broken, broken_url = _standin_server(lambda rng: 0.3, failure_rate=1.0, seed=4)
+    try:
+        p95 = {}
+        for label, attempts, race in [
+            ("remote only", [("remote", remote_url)], False),
+            ("remote + hedged replica", [("remote", remote_url), ("replica", replica_url)], False),
+            ("remote raced with local fallback", [("remote", remote_url), ("local", local_url)], True),
+        ]:
+            hedger = Hedger()
+            latencies, failures = [], 0
+            for _ in range(requests):
+                started = time.perf_counter()
+                try:
+                    hedger.call([(name, _http_attempt(url)) for name, url in attempts], race=race)
+                except AllBackendsFailed:
+                    failures += 1
+                latencies.append(time.perf_counter() - started)
+            p95[label] = _summary(label, latencies, failures)
+        assert p95["remote + hedged replica"] < p95["remote only"], "hedging did not cut the tail"
+
+        # Circuit breaker: a backend that always fails is skipped after BREAKER_FAILURES calls
+        hedger = Hedger()
+        latencies, failures, skipped = [], 0, 0
+        for _ in range(50):
+            started = time.perf_counter()
+            if hedger.backend("broken").breaker.state == "open":
+                skipped += 1
+            try:
+                hedger.call([("broken", _http_attempt(broken_url)), ("local", _http_attempt(local_url))])
+            except AllBackendsFailed:
+                failures += 1
+            latencies.append(time.perf_counter() - started)
+        _summary("failing remote behind breaker", latencies, failures)
+        print(f"{'':>34}  broken backend skipped on {skipped}/50 calls, breaker {hedger.backend('broken').breaker.state}")
+        assert skipped >= 50 - BREAKER_FAILURES - 1
+
+        # Half-open trials are always settled: a backup that was never launched gives its
+        # trial back, and a trial that lost the race still records its outcome
+        hedger = Hedger()
+        for name in ("slow", "backup"):
+            breaker = hedger.backend(name).breaker
+            breaker.opened_at = time.monotonic() - breaker.reset_seconds
+        hedger.call([("local", _http_attempt(local_url)), ("backup", _http_attempt(local_url))])
+        assert hedger.backend("backup").breaker.allow(), "unlaunched backup kept its trial slot"
+        hedger.call([("slow", _http_attempt(local_url)), ("remote", _http_attempt(remote_url))], race=True)
+        time.sleep(0.3)
+        assert hedger.backend("slow").breaker.state == "closed", "losing trial left the breaker half-open"
+        print(f"{'':>34}  half-open trials settled after an unlaunched backup and a lost race")
+    finally:
+        for server in (remote, replica, local, broken):
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hedged requests and circuit breakers")
+    parser.add_argument("--bench", action="store_true", help="Run against local stand-in servers with injected latency")
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+    if args.bench:
+        benchmark(args.requests)
+    else:
+        parser.print_help()
@@ -0,0 +1,304 @@
+"""
+Persistent, searchable conversation history.
+
+Chat bubbles used to live only as widgets: "Clear Chat" or closing the app
+lost them. HistoryStore keeps every message in SQLite:
+
+  * add() only puts the message on a queue, so the Tk thread never waits on
+    the database; one writer thread drains the queue and inserts in batches
+    (up to BATCH_SIZE rows per transaction) on a WAL-mode connection;
+  * an FTS5 index over the message text backs search(), with a LIKE scan
+    when the sqlite3 build has no FTS5;
+  * turn latencies are stored on the user message that started the turn;
+  * page() returns older messages a page at a time for lazy loading into
+    the chat view. Reads use their own connection, which WAL lets run
+    alongside the writer.
+
+`python viki_history.py --bench` measures insert throughput and search
+latency at 1M messages.
+"""
+import os
+import time
+import queue
+import logging
+import sqlite3
+import argparse
+import threading
+
+HISTORY_FILE = "viki_history.db"
+BATCH_SIZE = 500
+FLUSH_INTERVAL_SECONDS = 0.25
+PAGE_SIZE = 50
+SEARCH_LIMIT = 20
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    started REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    session_id INTEGER NOT NULL,
+    ts REAL NOT NULL,
+    sender TEXT NOT NULL,
+    text TEXT NOT NULL,
+    latency REAL
+);
+CREATE INDEX IF NOT EXISTS messages_session ON messages(session_id, id);
+"""
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    text, content='messages', content_rowid='id', tokenize='porter unicode61'
+);
+"""
+
+_STOP = object()
+
+
+def fts5_available():
+    try:
+        sqlite3.connect(":memory:").execute("CREATE VIRTUAL TABLE t USING fts5(x)")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def connect(path):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")   # safe with WAL; a crash loses at most the last batch
+    return conn
+
+
+class HistoryStore:
+    def __init__(self, path=HISTORY_FILE, batch_size=BATCH_SIZE):
+        self.path = path
+        self.batch_size = batch_size
+        self.fts = fts5_available()
+        conn = connect(path)
+        with conn:
+            conn.executescript(SCHEMA)
+            if self.fts:
+                conn.executescript(FTS_SCHEMA)
+        self.session_id = None                 # created with the first message, so reading adds no empty session
+        # page(first_id) starts with the messages of earlier runs
+        self.first_id = conn.execute("SELECT coalesce(max(id), 0) + 1 FROM messages").fetchone()[0]
+        self._conn = conn                      # owned by the writer thread from here on
+        self._reader = threading.local()
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="viki-history", daemon=True)
+        self._writer.start()
+
+    # --- Writes (non-blocking) ---
+
+    def add(self, sender, text, ts=None):
+        """Record a message ("user" or "ai"). Returns at once; the writer thread inserts it."""
+        self._queue.put(("message", (ts or time.time(), sender, text)))
+
+    def record_latency(self, seconds):
+        """Attach a turn latency to this session's latest user message."""
+        self._queue.put(("latency", seconds))
+
+    def flush(self, timeout=None):
+        """Block until everything queued so far is written (not for the Tk thread)."""
+        done = threading.Event()
+        self._queue.put(("flush", done))
+        return done.wait(timeout)
+
+    def close(self):
+        self._queue.put((_STOP, None))
+        self._writer.join(timeout=5)
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + FLUSH_INTERVAL_SECONDS
+            # Take whatever else is queued, up to a batch, without waiting past the flush interval;
+            # a flush or close request ends the batch at once
+            while len(batch) < self.batch_size and batch[-1][0] not in ("flush", _STOP):
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            session_id = self.session_id
+            try:
+                self._write_batch(batch)
+            except Exception:
+                # The batch is lost, but the writer carries on and flush() callers are still released
+                self.session_id = session_id    # a session row it created was rolled back with it
+                log.exception("History batch of %d items not written", len(batch))
+            for kind, data in batch:
+                if kind == "flush":
+                    data.set()
+            if batch[-1][0] is _STOP:
+                self._conn.close()
+                return
+
+    def _write_batch(self, batch):
+        rows = []
+        with self._conn:
+            for kind, data in batch:
+                if kind == "message":
+                    rows.append(data)
+                    continue
+                # Keep order: latency updates apply to messages queued before them
+                self._insert(rows)
+                rows = []
+                if kind == "latency":
+                    self._conn.execute("UPDATE messages SET latency = ? WHERE id = (SELECT max(id) FROM messages "
+                                       "WHERE session_id = ? AND sender = 'user')", (data, self.session_id))
+            self._insert(rows)
+
+    def _insert(self, rows):
+        if not rows:
+            return
+        if self.session_id is None:
+            self.session_id = self._conn.execute("INSERT INTO sessions (started) VALUES (?)", (rows[0][0],)).lastrowid
+        insert = "INSERT INTO messages (session_id, ts, sender, text) VALUES (?, ?, ?, ?)"
+        first_id = self._conn.execute(insert, (self.session_id,) + rows[0]).lastrowid
+        self._conn.executemany(insert, [(self.session_id,) + row for row in rows[1:]])
+        if self.fts:
+            # The transaction holds the write lock from the first insert on, so every id from first_id is ours
+            self._conn.execute("INSERT INTO messages_fts (rowid, text) SELECT id, text FROM messages WHERE id >= ?",
+                               (first_id,))
+
+    # --- Reads (any thread but Tk's) ---
+
+    def _read_conn(self):
+        conn = getattr(self._reader, "conn", None)
+        if conn is None:
+            conn = self._reader.conn = connect(self.path)
+        return conn
+
+    def page(self, before_id=None, limit=PAGE_SIZE):
+        """
+        Up to `limit` messages older than before_id (newest first when before_id is None),
+        returned oldest first as (id, session_id, ts, sender, text, latency).
+        """
+        rows = self._read_conn().execute(
+            "SELECT id, session_id, ts, sender, text, latency FROM messages "
+            "WHERE id < ? ORDER BY id DESC LIMIT ?",
+            (before_id if before_id is not None else 2 ** 62, limit)).fetchall()
+        return rows[::-1]
+
+    def user_queries(self, limit=10000):
+        """(ts, text) of the most recent things the user said or typed, oldest first."""
+        rows = self._read_conn().execute(
+            "SELECT ts, text FROM messages WHERE sender = 'user' ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return rows[::-1]
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """Messages containing every word of `query`, newest first, as (id, session_id, ts, sender, text, latency)."""
+        terms = [t for t in query.replace('"', " ").split() if t]
+        if not terms:
+            return []
+        conn = self._read_conn()
+        if self.fts:
+            # Each term quoted so user text cannot inject FTS5 syntax
+            match = " ".join(f'"{t}"' for t in terms)
+            # Newest first lets FTS5 walk the index backwards and stop at `limit`; ranking every
+            # match with bm25() costs time proportional to the number of matches
+            return conn.execute(
+                "SELECT id, session_id, ts, sender, text, latency FROM messages WHERE id IN "
+                "(SELECT rowid FROM messages_fts WHERE messages_fts MATCH ? ORDER BY rowid DESC LIMIT ?) "
+                "ORDER BY id DESC", (match, limit)).fetchall()
+        where = " AND ".join("text LIKE ?" for _ in terms)
+        return conn.execute(
+            f"SELECT id, session_id, ts, sender, text, latency FROM messages WHERE {where} "
+            "ORDER BY id DESC LIMIT ?", [f"%{t}%" for t in terms] + [limit]).fetchall()
+
+    def count(self):
+        return self._read_conn().execute("SELECT count(*) FROM messages").fetchone()[0]
+
+
+# --- Benchmark ---
+
+_WORDS = ("open youtube notepad calculator weather today tomorrow play music song search recipe pasta "
+          "wikipedia speed light reminder meeting workout time chrome word excel news football python "
+          "photo video record burst camera hello name assistant question answer").split()
+
+
+def _synthetic_messages(count, seed=0):
+    import random
+    rng = random.Random(seed)
+    for i in range(count):
+        sender = "user" if i % 2 == 0 else "ai"
+        yield sender, " ".join(rng.choice(_WORDS) for _ in range(rng.randint(3, 12))) + f" m{i}"
+
+
+def benchmark(count=1_000_000, searches=200):
+    import tempfile
+    import random
+    with tempfile.TemporaryDirectory() as root:
+        store = HistoryStore(os.path.join(root, "history.db"))
+        print(f"FTS5 {'available' if store.fts else 'missing (LIKE fallback)'}; inserting {count:,} messages")
+        started = time.perf_counter()
+        enqueue_worst = 0.0
+        for sender, text in _synthetic_messages(count):
+            t0 = time.perf_counter()
+            store.add(sender, text)
+            enqueue_worst = max(enqueue_worst, time.perf_counter() - t0)
+        enqueued = time.perf_counter() - started
+        store.flush()
+        elapsed = time.perf_counter() - started
+        print(f"add(): {enqueued / count * 1e6:.2f} us average, worst {enqueue_worst * 1e6:.0f} us (caller side)")
+        print(f"writer: {count / elapsed:,.0f} messages/s, {elapsed:.1f} s total, "
+              f"database {os.path.getsize(store.path) / 1e6:.0f} MB")
+
+        rng = random.Random(1)
+        queries = [" ".join(rng.sample(_WORDS, rng.randint(1, 3))) for _ in range(searches)]
+        queries += [f"m{rng.randrange(count)}" for _ in range(searches // 4)]
+        timings = []
+        hits = 0
+        for query in queries:
+            t0 = time.perf_counter()
+            hits += bool(store.search(query))
+            timings.append(time.perf_counter() - t0)
+        timings.sort()
+        pick = lambda q: timings[min(len(timings) - 1, int(q * len(timings)))] * 1000
+        print(f"search over {store.count():,} messages: p50 {pick(0.5):.1f} ms, p95 {pick(0.95):.1f} ms, "
+              f"max {timings[-1] * 1000:.1f} ms ({hits}/{len(queries)} with results)")
+
+        t0 = time.perf_counter()
+        rows = store.page()
+        pages = 1
+        while rows and pages < 100:
+            rows = store.page(rows[0][0])
+            pages += 1
+        print(f"lazy loading: {pages} pages of {PAGE_SIZE} in {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+        # A batch that fails (text is NOT NULL) is logged and dropped; the writer keeps going
+        logging.disable(logging.ERROR)
+        store.add("user", None)
+        assert store.flush(5), "flush() must return after a failed batch"
+        logging.disable(logging.NOTSET)
+        store.add("user", "still writing")
+        assert store.flush(5) and store.page(limit=1)[0][4] == "still writing"
+        assert store.search("still writing")[0][4] == "still writing"
+
+        t0 = time.perf_counter()
+        store.add("user", "what is the time")
+        store.record_latency(0.42)
+        store.flush()
+        latest = store.page(limit=1)[0]
+        assert latest[4] == "what is the time" and latest[5] == 0.42, latest
+        store.close()
+        print(f"round trip for one message: {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="VIKI conversation history")
+    parser.add_argument("--bench", action="store_true", help="Insert throughput and search latency at --messages")
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--search", help="Search the history database")
+    args = parser.parse_args()
+    if args.bench:
+        benchmark(args.messages)
+    elif args.search:
+        store = HistoryStore()
+        for _, _, ts, sender, text, _ in store.search(args.search):
+            print(f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(ts))} {sender:>4}: {text}")
+    else:
+        parser.print_help()
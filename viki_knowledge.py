@@ -0,0 +1,337 @@
+"""
+Offline knowledge index for VIKI.
+
+Builds an on-disk inverted index from a Wikipedia abstracts dump
+(enwiki-latest-abstract.xml[.gz]) or a JSON-lines corpus of
+{"title", "text", "url"} records, and answers questions from it with BM25
+ranking. Every file is read through a memory map: opening the index reads
+only meta.json, terms and titles are found by binary search over sorted key
+tables, and a query touches just the postings of its terms. Opening and
+answering take milliseconds at dump scale without loading the index into memory.
+
+Index directory layout:
+    meta.json       document count, average length, BM25 parameters, format
+    lexicon.keys    terms, UTF-8, concatenated in sorted order
+    lexicon.idx     per term: key offset (uint64), key length (uint32), postings offset (uint64), df (uint32)
+    titles.keys     normalised titles, the same way
+    titles.idx      per title: key offset, key length, document id, 0
+    postings.bin    per term: doc ids (uint32[df]) followed by term frequencies (uint16[df])
+    docs.idx        per document: byte offset (uint64), byte length (uint32), token count (uint32)
+    docs.bin        per document: UTF-8 "title\\x00url\\x00text"
+
+    python viki_knowledge.py build enwiki-latest-abstract.xml.gz --out knowledge_index
+    python viki_knowledge.py query "speed of light"
+    python viki_knowledge.py bench
+"""
+import os
+import re
+import gzip
+import json
+import math
+import time
+import random
+import argparse
+from array import array
+from collections import Counter
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+INDEX_DIR = "knowledge_index"
+BM25_K1 = 1.2
+BM25_B = 0.75
+MIN_ANSWER_SCORE = 5.0
+TOP_K = 5
+
+TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has he in is it its of on or that the to was were will with "
+    "what who whom which when where why how tell me about do does did i you your please".split())
+
+INDEX_FORMAT = 2                # 1 kept the lexicon and titles in JSON
+
+DOC_INDEX_DTYPE = np.dtype([("offset", "<u8"), ("length", "<u4"), ("tokens", "<u4")])
+KEY_INDEX_DTYPE = np.dtype([("key_offset", "<u8"), ("key_length", "<u4"), ("value", "<u8"), ("count", "<u4")])
+
+
+def tokenize(text):
+    return [t for t in TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def normalize_title(title):
+    return " ".join(TOKEN.findall(title.lower()))
+
+
+# --- Corpus readers ---
+
+def read_abstracts_dump(path):
+    """Yield (title, text, url) from a Wikipedia abstracts XML dump, streaming."""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        for _, element in ET.iterparse(f, events=("end",)):
+            if element.tag != "doc":
+                continue
+            title = (element.findtext("title") or "").removeprefix("Wikipedia: ")
+            text = element.findtext("abstract") or ""
+            if title and text:
+                yield title, text, element.findtext("url") or ""
+            element.clear()
+
+
+def read_jsonl(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                yield record["title"], record["text"], record.get("url", "")
+
+
+def read_corpus(path):
+    return read_jsonl(path) if path.endswith((".jsonl", ".json")) else read_abstracts_dump(path)
+
+
+# --- Sorted key tables ---
+
+def write_sorted_table(out_dir, name, entries):
+    """Write (key, value, count) entries as name.keys and name.idx, sorted by the key's UTF-8 bytes."""
+    rows = sorted((key.encode("utf-8"), value, count) for key, value, count in entries)
+    index = []
+    offset = 0
+    with open(os.path.join(out_dir, f"{name}.keys"), "wb") as f:
+        for key, value, count in rows:
+            f.write(key)
+            index.append((offset, len(key), value, count))
+            offset += len(key)
+    np.array(index, dtype=KEY_INDEX_DTYPE).tofile(os.path.join(out_dir, f"{name}.idx"))
+
+
+class SortedTable:
+    """Exact-key lookups in a table written by write_sorted_table, by binary search over memory maps."""
+
+    def __init__(self, index, keys):
+        self.key_offsets = index["key_offset"]
+        self.key_lengths = index["key_length"]
+        self.values = index["value"]
+        self.counts = index["count"]
+        self.keys = keys
+
+    def __len__(self):
+        return len(self.values)
+
+    def _key(self, i):
+        start = int(self.key_offsets[i])
+        return bytes(self.keys[start:start + int(self.key_lengths[i])])
+
+    def get(self, key):
+        """(value, count) for `key`, or None."""
+        target = key.encode("utf-8")
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self) and self._key(lo) == target:
+            return int(self.values[lo]), int(self.counts[lo])
+        return None
+
+
+# --- Build ---
+
+def build_index(documents, out_dir=INDEX_DIR):
+    """Index (title, text, url) records into out_dir. Returns the number of documents."""
+    os.makedirs(out_dir, exist_ok=True)
+    postings = {}        # term -> (array of doc ids, array of tfs)
+    titles = {}
+    doc_index = []
+    total_tokens = 0
+    offset = 0
+    with open(os.path.join(out_dir, "docs.bin"), "wb") as docs:
+        for doc_id, (title, text, url) in enumerate(documents):
+            record = f"{title}\x00{url}\x00{text}".encode("utf-8")
+            docs.write(record)
+            tokens = tokenize(title + " " + text)
+            doc_index.append((offset, len(record), len(tokens)))
+            offset += len(record)
+            total_tokens += len(tokens)
+            titles.setdefault(normalize_title(title), doc_id)
+            for term, tf in Counter(tokens).items():
+                entry = postings.get(term)
+                if entry is None:
+                    entry = postings[term] = (array("I"), array("H"))
+                entry[0].append(doc_id)
+                entry[1].append(min(tf, 0xFFFF))
+
+    lexicon = {}
+    position = 0
+    with open(os.path.join(out_dir, "postings.bin"), "wb") as f:
+        for term in sorted(postings):
+            doc_ids, tfs = postings[term]
+            lexicon[term] = (position, len(doc_ids))
+            f.write(doc_ids.tobytes())
+            f.write(tfs.tobytes())
+            position += doc_ids.itemsize * len(doc_ids) + tfs.itemsize * len(tfs)
+    np.array(doc_index, dtype=DOC_INDEX_DTYPE).tofile(os.path.join(out_dir, "docs.idx"))
+
+    count = len(doc_index)
+    write_sorted_table(out_dir, "lexicon", ((term, offset, df) for term, (offset, df) in lexicon.items()))
+    write_sorted_table(out_dir, "titles", ((title, doc_id, 0) for title, doc_id in titles.items()))
+
+    count = len(doc_index)
+    meta = {"documents": count, "average_length": total_tokens / max(count, 1), "k1": BM25_K1, "b": BM25_B,
+            "format": INDEX_FORMAT}
+    with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    return count
+
+
+# --- Query ---
+
+class KnowledgeIndex:
+    def __init__(self, index_dir=INDEX_DIR):
+        self.index_dir = index_dir
+        with open(os.path.join(index_dir, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("format") != INDEX_FORMAT:
+            raise ValueError(f"{index_dir} was built by an older version of viki_knowledge.py; rebuild it")
+        self.count = self.meta["documents"]
+        self.lexicon = SortedTable(self._memmap("lexicon.idx", KEY_INDEX_DTYPE), self._memmap("lexicon.keys", np.uint8))
+        self.titles = SortedTable(self._memmap("titles.idx", KEY_INDEX_DTYPE), self._memmap("titles.keys", np.uint8))
+        self.postings = self._memmap("postings.bin", np.uint8)
+        self.doc_index = self._memmap("docs.idx", DOC_INDEX_DTYPE)
+        self.docs = self._memmap("docs.bin", np.uint8)
+
+    def _memmap(self, name, dtype):
+        path = os.path.join(self.index_dir, name)
+        if os.path.getsize(path) == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r")
+
+    def document(self, doc_id):
+        """Return (title, text, url) for a document id."""
+        entry = self.doc_index[doc_id]
+        start = int(entry["offset"])
+        raw = bytes(self.docs[start:start + int(entry["length"])]).decode("utf-8")
+        title, url, text = raw.split("\x00", 2)
+        return title, text, url
+
+    def _length_norm(self, doc_ids):
+        """k1 * (1 - b + b * len / avg) for the given documents."""
+        k1, b = self.meta["k1"], self.meta["b"]
+        lengths = self.doc_index["tokens"][doc_ids].astype(np.float32)
+        return k1 * (1 - b + b * lengths / max(self.meta["average_length"], 1e-9))
+
+    def _postings(self, offset, df):
+        doc_ids = self.postings[offset:offset + 4 * df].view(np.uint32)
+        tfs = self.postings[offset + 4 * df:offset + 6 * df].view(np.uint16)
+        return doc_ids, tfs
+
+    def search(self, query, top_k=TOP_K):
+        """BM25-ranked [(score, doc_id)] for a free-text query, best first."""
+        entries = [entry for entry in map(self.lexicon.get, set(tokenize(query))) if entry is not None]
+        if not entries:
+            return []
+        k1 = self.meta["k1"]
+        all_ids = []
+        all_scores = []
+        for offset, df in entries:
+            doc_ids, tfs = self._postings(offset, df)
+            df = len(doc_ids)
+            idf = math.log(1 + (self.count - df + 0.5) / (df + 0.5))
+            tf = tfs.astype(np.float32)
+            all_ids.append(doc_ids)
+            all_scores.append(idf * tf * (k1 + 1) / (tf + self._length_norm(doc_ids)))
+        ids = np.concatenate(all_ids)
+        unique_ids, inverse = np.unique(ids, return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(all_scores))
+        top = np.argsort(-scores)[:top_k]
+        return [(float(scores[i]), int(unique_ids[i])) for i in top]
+
+    def answer(self, question, min_score=MIN_ANSWER_SCORE):
+        """Best (title, text, url) for a question, or None if nothing scores well enough."""
+        entry = self.titles.get(normalize_title(question))
+        if entry is not None:
+            return self.document(entry[0])
+        results = self.search(question, top_k=1)
+        if results and results[0][0] >= min_score:
+            return self.document(results[0][1])
+        return None
+
+
+def open_index(index_dir=INDEX_DIR):
+    """The local index if one has been built, otherwise None."""
+    if not os.path.exists(os.path.join(index_dir, "meta.json")):
+        return None
+    return KnowledgeIndex(index_dir)
+
+
+# --- Benchmark on a synthetic corpus ---
+
+def synthetic_corpus(documents, vocabulary=50000, words_per_doc=80, seed=0):
+    """Documents with Zipf-distributed words, roughly like real abstracts."""
+    rng = np.random.default_rng(seed)
+    words = [f"w{i}" for i in range(vocabulary)]
+    for doc_id in range(documents):
+        ids = np.minimum(rng.zipf(1.2, words_per_doc), vocabulary) - 1
+        yield f"Article {doc_id}", " ".join(words[i] for i in ids), f"https://example.org/{doc_id}"
+
+
+def benchmark(documents=100000, queries=500, out_dir="knowledge_bench_index"):
+    started = time.perf_counter()
+    count = build_index(synthetic_corpus(documents), out_dir)
+    elapsed = time.perf_counter() - started
+    size = sum(os.path.getsize(os.path.join(out_dir, name)) for name in os.listdir(out_dir))
+    print(f"build: {count} docs in {elapsed:.1f} s ({count / elapsed:,.0f} docs/s), index {size / 1e6:.1f} MB")
+
+    started = time.perf_counter()
+    index = KnowledgeIndex(out_dir)
+    print(f"open: {(time.perf_counter() - started) * 1000:.0f} ms "
+          f"({len(index.lexicon):,} terms, {len(index.titles):,} titles, all memory-mapped)")
+    assert index.answer(f"Article {count - 1}")[0] == f"Article {count - 1}"
+    assert index.lexicon.get("no-such-term") is None
+    rng = random.Random(0)
+    latencies = []
+    for _ in range(queries):
+        # Mix of rare and common terms
+        query = " ".join(f"w{int(rng.paretovariate(0.8)) % 50000}" for _ in range(rng.randint(1, 4)))
+        started = time.perf_counter()
+        index.search(query)
+        latencies.append(time.perf_counter() - started)
+    for _ in range(queries // 5):
+        started = time.perf_counter()
+        index.answer(f"Article {rng.randrange(count)}")
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+    print(f"query: n={len(latencies)} p50={pick(0.5):.2f} ms p95={pick(0.95):.2f} ms p99={pick(0.99):.2f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline knowledge index for VIKI")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Index an abstracts dump (.xml/.xml.gz) or a .jsonl corpus")
+    build.add_argument("corpus")
+    build.add_argument("--out", default=INDEX_DIR)
+    query = commands.add_parser("query", help="Answer a question from the index")
+    query.add_argument("text")
+    query.add_argument("--index", default=INDEX_DIR)
+    bench = commands.add_parser("bench", help="Build/query benchmark on a synthetic corpus")
+    bench.add_argument("--documents", type=int, default=100000)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        started = time.perf_counter()
+        count = build_index(read_corpus(args.corpus), args.out)
+        print(f"Indexed {count} documents into {args.out} in {time.perf_counter() - started:.1f} s")
+    elif args.command == "query":
+        index = KnowledgeIndex(args.index)
+        for score, doc_id in index.search(args.text):
+            title, text, _ = index.document(doc_id)
+            print(f"{score:6.2f}  {title}: {text[:100]}")
+    else:
+        benchmark(args.documents)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,380 @@
+"""
+Chat model client for "ask AI" questions.
+
+The ask_ai plugin used to call openai.ChatCompletion.create on the legacy SDK:
+one hardcoded model, a placeholder key in the source, no timeout, and a fresh
+connection per call. LLMClient speaks the OpenAI chat completions protocol
+over plain HTTP, so the same code talks to api.openai.com, a local
+OpenAI-compatible server (llama.cpp, Ollama, vLLM, LM Studio) or the stub in
+this module:
+
+  * base URL, model and key come from VIKI_LLM_BASE_URL, VIKI_LLM_MODEL and
+    VIKI_LLM_API_KEY (or OPENAI_API_KEY); a local server needs no key;
+  * requests share a pooled requests.Session with keep-alive connections;
+  * every call has a deadline covering queueing, retries and the response;
+    LLMTimeout is raised when it passes;
+  * identical prompts in flight at the same time are sent once and every
+    caller gets the same answer (single-flight);
+  * RateLimiter caps requests in flight (and optionally per minute). A 429
+    pauses every request for the server's retry-after, then retries while the
+    deadline allows.
+
+    python viki_llm.py --stub --port 8089     # offline: serve canned answers
+    VIKI_LLM_BASE_URL=http://127.0.0.1:8089/v1 python viki_ui.py
+
+`python viki_llm.py --loadtest` runs concurrent sessions against the stub and
+reports throughput and tail latency.
+"""
+import os
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+import requests
+from requests.adapters import HTTPAdapter
+
+log = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+DEFAULT_MODEL = "gpt-3.5-turbo"
+LLM_TIMEOUT = 20.0
+CONNECT_TIMEOUT = 3.05
+MAX_IN_FLIGHT = 4
+POOL_SIZE = 8
+DEFAULT_RETRY_AFTER = 1.0
+
+
+class LLMError(Exception):
+    pass
+
+
+class LLMTimeout(LLMError):
+    pass
+
+
+def normalize_prompt(prompt):
+    return " ".join(prompt.lower().split())
+
+
+def retry_after(response):
+    """Seconds the server asked us to wait, from retry-after-ms or retry-after."""
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = response.headers.get(header)
+        if value:
+            try:
+                return float(value) * scale
+            except ValueError:
+                pass
+    return DEFAULT_RETRY_AFTER
+
+
+class RateLimiter:
+    """
+    At most `in_flight` requests at once and `per_minute` started per minute; a 429 pauses
+    everyone. Waiters are served first come, first served, so a session that has just been
+    answered cannot jump the queue with its next question.
+    """
+
+    def __init__(self, in_flight=MAX_IN_FLIGHT, per_minute=None):
+        self.in_flight = in_flight
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self.active = 0
+        self.next_start = 0.0
+        self.paused_until = 0.0
+        self._waiting = deque()
+        self._ready = threading.Condition()
+
+    def acquire(self, deadline):
+        with self._ready:
+            turn = object()
+            self._waiting.append(turn)
+            try:
+                while True:
+                    now = time.monotonic()
+                    ready_at = max(self.next_start, self.paused_until)
+                    free = self.active < self.in_flight
+                    if free and now >= ready_at and self._waiting[0] is turn:
+                        self.active += 1
+                        self.next_start = now + self.interval
+                        return
+                    if now >= deadline:
+                        raise LLMTimeout("deadline passed while queued for the model")
+                    wait = deadline - now
+                    if free and ready_at > now:
+                        wait = min(wait, ready_at - now)
+                    self._ready.wait(wait)
+            finally:
+                self._waiting.remove(turn)
+                self._ready.notify_all()   # the next in line may be able to go now
+
+    def release(self):
+        with self._ready:
+            self.active -= 1
+            self._ready.notify_all()
+
+    def pause(self, seconds):
+        with self._ready:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class LLMClient:
+    def __init__(self, base_url=None, model=None, api_key=None, timeout=LLM_TIMEOUT,
+                 in_flight=MAX_IN_FLIGHT, per_minute=None, coalesce=True, system_prompt=None):
+        self.base_url = (base_url or os.environ.get("VIKI_LLM_BASE_URL") or DEFAULT_BASE_URL).rstrip("/")
+        self.model = model or os.environ.get("VIKI_LLM_MODEL") or DEFAULT_MODEL
+        self.api_key = api_key or os.environ.get("VIKI_LLM_API_KEY") or os.environ.get("OPENAI_API_KEY")
+        self.timeout = timeout
+        self.coalesce = coalesce
+        self.system_prompt = system_prompt
+        self.limiter = RateLimiter(in_flight, per_minute)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(POOL_SIZE, in_flight))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if self.api_key:
+            self.session.headers["Authorization"] = f"Bearer {self.api_key}"
+        self.requests = 0
+        self.coalesced = 0
+        self.rate_limited = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def complete(self, prompt, timeout=None):
+        """The model's answer to `prompt`. Raises LLMError, or LLMTimeout after `timeout` seconds."""
+        deadline = time.monotonic() + (timeout if timeout is not None else self.timeout)
+        if not self.coalesce:
+            return self._request(prompt, deadline)
+        key = normalize_prompt(prompt)
+        with self._lock:
+            pending = self._in_flight.get(key)
+            leader = pending is None
+            if leader:
+                pending = self._in_flight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            try:
+                return pending.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FutureTimeout:
+                raise LLMTimeout("deadline passed waiting for the same question in flight") from None
+        try:
+            answer = self._request(prompt, deadline)
+            pending.set_result(answer)
+            return answer
+        except Exception as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def _request(self, prompt, deadline):
+        if not self.api_key and self.base_url == DEFAULT_BASE_URL:
+            raise LLMError("no API key: set OPENAI_API_KEY, or VIKI_LLM_BASE_URL for a local server")
+        messages = [{"role": "user", "content": prompt}]
+        if self.system_prompt:
+            messages.insert(0, {"role": "system", "content": self.system_prompt})
+        body = {"model": self.model, "messages": messages}
+        while True:
+            self.limiter.acquire(deadline)
+            try:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise LLMTimeout("deadline passed before the request was sent")
+                with self._lock:
+                    self.requests += 1
+                response = self.session.post(f"{self.base_url}/chat/completions", json=body,
+                                             timeout=(min(CONNECT_TIMEOUT, remaining), remaining))
+            except requests.Timeout as e:
+                raise LLMTimeout(f"model did not answer in time ({e})") from None
+            except requests.RequestException as e:
+                raise LLMError(f"cannot reach the model at {self.base_url}: {e}") from None
+            finally:
+                self.limiter.release()
+            if response.status_code == 429:
+                with self._lock:
+                    self.rate_limited += 1
+                wait = retry_after(response)
+                if time.monotonic() + wait >= deadline:
+                    raise LLMTimeout("rate limited past the deadline")
+                log.info("Rate limited by the model server; retrying in %.2f s", wait)
+                self.limiter.pause(wait)
+                continue
+            if response.status_code != 200:
+                raise LLMError(f"model server returned {response.status_code}: {response.text[:200]}")
+            try:
+                return response.json()["choices"][0]["message"]["content"].strip()
+            except (ValueError, KeyError, IndexError, TypeError) as e:
+                raise LLMError(f"unexpected response from the model server: {e}") from None
+
+    def close(self):
+        self.session.close()
+
+
+_default_client = None
+_default_lock = threading.Lock()
+
+
+def default_client():
+    """The shared client configured from the environment."""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = LLMClient()
+        return _default_client
+
+
+# --- Local OpenAI-compatible stub and load test ---
+
+def stub_server(port=0, latency=lambda rng: 0.0, capacity=None, seed=0):
+    """
+    OpenAI-compatible /v1/chat/completions that answers with canned text after latency(rng)
+    seconds. With `capacity`, requests beyond that many at once get a 429 with retry-after-ms.
+    """
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+    rng = random.Random(seed)
+    lock = threading.Lock()
+    state = {"active": 0, "served": 0, "rejected": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"      # keep-alive, like a real server
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if not self.path.endswith("/chat/completions"):
+                return self._send(404, {"error": {"message": "not found"}})
+            with lock:
+                if capacity is not None and state["active"] >= capacity:
+                    state["rejected"] += 1
+                    return self._send(429, {"error": {"message": "rate limited"}}, {"retry-after-ms": "100"})
+                state["active"] += 1
+                delay = latency(rng)
+            try:
+                time.sleep(delay)
+                question = request.get("messages", [{}])[-1].get("content", "")
+                self._send(200, {
+                    "object": "chat.completion",
+                    "model": request.get("model", "stub"),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": f"This is the offline stub. You asked: {question}"}}],
+                })
+            finally:
+                with lock:
+                    state["active"] -= 1
+                    state["served"] += 1
+
+        def _send(self, status, payload, headers=None):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    server.state = state
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+_POPULAR = ["what is the meaning of life", "tell me a joke", "how far away is the moon", "what should I cook tonight"]
+
+
+def loadtest(sessions=50, questions=10, capacity=8, popular_share=0.3):
+    # Usually 100-200 ms per answer, 5% take a second; more than `capacity` at once get a 429
+    latency = lambda rng: 1.0 if rng.random() < 0.05 else rng.uniform(0.1, 0.2)
+    server, base_url = stub_server(latency=latency, capacity=capacity)
+    print(f"stub at {base_url}: {sessions} sessions x {questions} questions, server capacity {capacity} at once, "
+          f"{popular_share:.0%} popular questions")
+
+    configs = [
+        ("queued + coalesced", dict(in_flight=capacity, coalesce=True)),
+        ("queued, no coalescing", dict(in_flight=capacity, coalesce=False)),
+        ("unqueued (64 in flight)", dict(in_flight=64, coalesce=False)),
+    ]
+    for label, options in configs:
+        client = LLMClient(base_url=base_url, model="stub", timeout=15.0, **options)
+        rng = random.Random(1)
+        plans = [[rng.choice(_POPULAR) if rng.random() < popular_share else f"question {s}-{q}"
+                  for q in range(questions)] for s in range(sessions)]
+        latencies = []
+        failures = {}
+        record = threading.Lock()
+        server.state.update(served=0, rejected=0)
+
+        def session(plan):
+            for prompt in plan:
+                started = time.perf_counter()
+                try:
+                    answer = client.complete(prompt)
+                    assert prompt in answer
+                except LLMError as e:
+                    with record:
+                        failures[type(e).__name__] = failures.get(type(e).__name__, 0) + 1
+                    continue
+                with record:
+                    latencies.append(time.perf_counter() - started)
+
+        threads = [threading.Thread(target=session, args=(plan,)) for plan in plans]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        client.close()
+
+        latencies.sort()
+        pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+        print(f"{label:>24}: {len(latencies) / elapsed:6.1f} answers/s  p50 {pick(0.5):5.0f} ms  "
+              f"p95 {pick(0.95):5.0f} ms  p99 {pick(0.99):5.0f} ms  | sent {client.requests}, "
+              f"coalesced {client.coalesced}, 429s {server.state['rejected']}, failures {failures or 0}")
+    server.shutdown()
+
+    # Deadlines hold even when the server stalls
+    server, base_url = stub_server(latency=lambda rng: 5.0)
+    client = LLMClient(base_url=base_url, model="stub")
+    started = time.perf_counter()
+    try:
+        client.complete("are you there", timeout=0.5)
+        raise AssertionError("expected a timeout")
+    except LLMTimeout:
+        pass
+    print(f"stalled server: LLMTimeout after {(time.perf_counter() - started) * 1000:.0f} ms with a 500 ms deadline")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chat model client and offline stub")
+    parser.add_argument("--stub", action="store_true", help="Serve an OpenAI-compatible stub on --port")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--loadtest", action="store_true", help="Concurrent sessions against a local stub")
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--questions", type=int, default=10)
+    parser.add_argument("--ask", help="Ask the configured model a question")
+    args = parser.parse_args()
+    if args.stub:
+        server, base_url = stub_server(args.port)
+        print(f"Stub chat model at {base_url} (set VIKI_LLM_BASE_URL to use it); Ctrl+C to stop")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
+    elif args.loadtest:
+        loadtest(args.sessions, args.questions)
+    elif args.ask:
+        print(default_client().complete(args.ask))
+    else:
+        parser.print_help()
@@ -0,0 +1,76 @@
+"""
+Load test for viki_server.
+
+Opens N concurrent sessions against a running server and has each one send
+M text queries back to back, then reports requests/sec and latency percentiles.
+
+    python viki_server.py --workers 8 &
+    python viki_loadtest.py --sessions 50 --requests 20 --query "what is the time"
+"""
+import time
+import asyncio
+import argparse
+import statistics
+
+import aiohttp
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def run_session(http, base_url, requests, query, latencies, errors):
+    async with http.post(f"{base_url}/sessions") as response:
+        session_id = (await response.json())["session_id"]
+    try:
+        for _ in range(requests):
+            started = time.perf_counter()
+            try:
+                async with http.post(f"{base_url}/sessions/{session_id}/query", json={"text": query}) as response:
+                    await response.read()
+                    if response.status != 200:
+                        errors[response.status] = errors.get(response.status, 0) + 1
+                        continue
+            except aiohttp.ClientError as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                continue
+            latencies.append(time.perf_counter() - started)
+    finally:
+        async with http.delete(f"{base_url}/sessions/{session_id}"):
+            pass
+
+
+async def run(base_url, sessions, requests, query):
+    latencies = []
+    errors = {}
+    connector = aiohttp.TCPConnector(limit=sessions)
+    async with aiohttp.ClientSession(connector=connector) as http:
+        started = time.perf_counter()
+        await asyncio.gather(*(run_session(http, base_url, requests, query, latencies, errors)
+                               for _ in range(sessions)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"sessions={sessions} requests/session={requests} query={query!r}")
+    print(f"completed: {len(latencies)}  errors: {errors or 0}  wall time: {elapsed:.2f} s")
+    print(f"throughput: {len(latencies) / elapsed:.1f} req/s")
+    if latencies:
+        print("latency ms: "
+              f"p50={percentile(latencies, 0.50) * 1000:.1f} "
+              f"p95={percentile(latencies, 0.95) * 1000:.1f} "
+              f"p99={percentile(latencies, 0.99) * 1000:.1f} "
+              f"max={latencies[-1] * 1000:.1f} "
+              f"mean={statistics.mean(latencies) * 1000:.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test a running viki_server")
+    parser.add_argument("--url", default="http://127.0.0.1:8765")
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--query", default="what is the time")
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.sessions, args.requests, args.query))
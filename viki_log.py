@@ -0,0 +1,283 @@
+"""
+Structured, non-blocking logging.
+
+Diagnostics used to be print() calls on the hot paths: every utterance printed
+the recognized query and then every custom command, and the video and image
+paths printed as well. A print blocks until the console takes the text, which
+a slow or redirected console does not do quickly, and the windowed PyInstaller
+build (console=False) has no console at all.
+
+setup() routes the standard logging module through a queue: a log call only
+fills in the message's %-arguments (and the traceback text, for exceptions)
+and puts the record on the queue; JSON encoding and file writes happen on a
+QueueListener thread, which writes one JSON object per line to logs/viki.jsonl,
+rotated at MAX_BYTES with BACKUPS old files kept. Warnings and errors also go
+to the console when there is one.
+
+Levels are set per module, with a default for everything else, through
+setup(levels=...) or the VIKI_LOG environment variable:
+
+    VIKI_LOG="INFO,viki_camera=DEBUG,viki_search=WARNING"
+
+Per-frame messages go through a Sampler, which passes on one record out of
+every `every` and says how many it skipped.
+
+`python viki_log.py --bench` measures the logging cost of one turn with
+logging on, with logging off, and with the old print() calls on a slow console.
+"""
+import os
+import sys
+import copy
+import json
+import time
+import queue
+import atexit
+import logging
+import argparse
+import logging.handlers
+
+LOG_DIR = "logs"
+LOG_FILE = "viki.jsonl"
+MAX_BYTES = 5 * 1024 * 1024
+BACKUPS = 3
+DEFAULT_LEVEL = "INFO"
+CONSOLE_LEVEL = "WARNING"
+FRAME_LOG_EVERY = 300           # about once every 10 s of 30 fps video
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record; fields passed as extra={"data": {...}} are merged in."""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        data = getattr(record, "data", None)
+        if data:
+            entry.update(data)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler.prepare() formats the whole record, traceback included, into msg on the
+    calling thread. This one only resolves the message and the traceback text, so the
+    listener's JsonFormatter still writes the traceback as its own "exc" field.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None   # tracebacks keep whole stack frames alive
+        return record
+
+
+class Sampler:
+    """Logs one call out of every `every`, for messages that would otherwise come once per frame."""
+
+    def __init__(self, logger, every=FRAME_LOG_EVERY):
+        self.logger = logger
+        self.every = every
+        self.count = 0
+
+    def log(self, level, msg, *args, data=None):
+        if not self.logger.isEnabledFor(level):
+            return
+        self.count += 1
+        if self.count % self.every == 1 or self.every == 1:
+            self.logger.log(level, msg, *args, extra={"data": {**(data or {}), "sampled_1_in": self.every}})
+
+    def debug(self, msg, *args, data=None):
+        self.log(logging.DEBUG, msg, *args, data=data)
+
+    def info(self, msg, *args, data=None):
+        self.log(logging.INFO, msg, *args, data=data)
+
+
+def parse_levels(spec):
+    """"INFO,viki_camera=DEBUG" -> {"": "INFO", "viki_camera": "DEBUG"}."""
+    levels = {}
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, level = part.rpartition("=")
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup(path=None, levels=None, console=True, max_bytes=MAX_BYTES, backups=BACKUPS):
+    """
+    Start the background writer and attach the queue handler to the root logger.
+    `levels` maps module names to level names ("" is the default); VIKI_LOG overrides
+    them. Calling it again replaces the previous setup.
+    """
+    global _listener
+    shutdown()
+    path = path or os.path.join(LOG_DIR, LOG_FILE)
+    handlers = []
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups,
+                                                            encoding="utf-8", delay=True)
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+    except OSError as e:
+        print(f"Warning: cannot write log file {path}: {e}")
+    # sys.stderr is None in the windowed build
+    if console and sys.stderr is not None:
+        console_handler = logging.StreamHandler(sys.stderr)
+        console_handler.setLevel(CONSOLE_LEVEL)
+        console_handler.setFormatter(logging.Formatter("%(levelname)s %(name)s: %(message)s"))
+        handlers.append(console_handler)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(StructuredQueueHandler(log_queue))
+
+    configured = {"": DEFAULT_LEVEL, **(levels or {}), **parse_levels(os.environ.get("VIKI_LOG"))}
+    for name, level in configured.items():
+        logging.getLogger(name or None).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def shutdown():
+    """Write out what is queued and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(shutdown)
+
+
+# --- Benchmark ---
+
+class _SlowConsole:
+    """A console that takes `delay` seconds per write, like a busy terminal or a full pipe."""
+
+    def __init__(self, delay):
+        self.delay = delay
+
+    def write(self, text):
+        time.sleep(self.delay)
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def _turn_with_prints(query, custom_commands):
+    # What recognize_speech and run_intent printed for every utterance
+    print("Listening...")
+    print(f"User said: {query}")
+    print(f"Recognized query: '{query}'")
+    print("Available voice commands:")
+    for vc in custom_commands:
+        print(f" - '{vc}'")
+
+
+def _turn_with_logging(log, query, custom_commands):
+    log.debug("Listening")
+    log.info("Recognized query", extra={"data": {"query": query}})
+    log.debug("Routing %r against %d custom commands", query, len(custom_commands))
+
+
+def benchmark(turns=2000, commands=40, console_delay=0.0005):
+    import tempfile
+    custom_commands = [f"open app {i}" for i in range(commands)]
+    log = logging.getLogger("viki")
+
+    def per_turn(run):
+        started = time.perf_counter()
+        for i in range(turns):
+            run(f"open app {i % commands}")
+        return (time.perf_counter() - started) / turns * 1e6
+
+    saved = sys.stdout
+    sys.stdout = _SlowConsole(console_delay)
+    try:
+        printed = per_turn(lambda q: _turn_with_prints(q, custom_commands))
+    finally:
+        sys.stdout = saved
+    print(f"{commands} custom commands, console at {console_delay * 1000:.1f} ms per write")
+    print(f"{'print() per turn':>28}: {printed:8.1f} us")
+
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, LOG_FILE)
+        for label, levels in [("logging on, DEBUG", {"": "DEBUG"}), ("logging on, INFO", {"": "INFO"}),
+                              ("logging off", {"": "WARNING"})]:
+            os.environ.pop("VIKI_LOG", None)
+            setup(path, levels=levels, console=False)
+            cost = per_turn(lambda q: _turn_with_logging(log, q, custom_commands))
+            started = time.perf_counter()
+            shutdown()
+            drained = time.perf_counter() - started
+            print(f"{label:>28}: {cost:8.1f} us (writer drained the rest in {drained * 1000:.0f} ms)")
+
+        # Sampling: a per-frame message at 30 fps for a minute
+        setup(path, levels={"": "DEBUG"}, console=False, max_bytes=64 * 1024)
+        frames = Sampler(logging.getLogger("viki_ui.video"))
+        started = time.perf_counter()
+        for i in range(1800):
+            frames.debug("frame latency %.1f ms", 12.5, data={"frame": i})
+        sampled = (time.perf_counter() - started) / 1800 * 1e6
+        for i in range(5000):
+            log.info("filler record %d to force a rollover", i, extra={"data": {"padding": "x" * 40}})
+        shutdown()
+        with open(path, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        frame_records = [r for r in records if r["logger"] == "viki_ui.video"]
+        rotated = sorted(name for name in os.listdir(root) if name.startswith(LOG_FILE + "."))
+        print(f"{'sampled per-frame message':>28}: {sampled:8.2f} us per frame; "
+              f"rotated into {', '.join(rotated) or 'nothing'}")
+        assert rotated, "the log should have rotated at 64 KiB"
+        assert all(r["sampled_1_in"] == FRAME_LOG_EVERY for r in frame_records)
+
+    # Tracebacks stay a structured field, not part of the message
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, LOG_FILE)
+        setup(path, console=False)
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            log.exception("turn failed for %s", "what is the time")
+        shutdown()
+        with open(path, encoding="utf-8") as f:
+            record = json.loads(f.readline())
+        assert record["msg"] == "turn failed for what is the time", record
+        assert "ZeroDivisionError" in record["exc"], record
+    print("log.exception(): message and traceback written as separate fields")
+
+    assert parse_levels("INFO, viki_camera=debug") == {"": "INFO", "viki_camera": "DEBUG"}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="VIKI structured logging")
+    parser.add_argument("--bench", action="store_true", help="Per-turn logging cost: on, off, and print()")
+    args = parser.parse_args()
+    if args.bench:
+        benchmark()
+    else:
+        parser.print_help()
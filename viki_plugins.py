@@ -0,0 +1,196 @@
+"""
+Intent plugins for VIKI.
+
+A plugin is a directory under plugins/ with a plugin.json manifest and a Python
+module:
+
+    plugins/ask_ai/plugin.json
+        {"name": "ask_ai",
+         "description": "Answer a question with the language model",
+         "triggers": ["ask ai", "ask chatgpt"],
+         "module": "handler.py",
+         "entry": "handle"}
+    plugins/ask_ai/handler.py
+        def handle(context, query, argument): ...
+
+At startup only the manifests are read. A plugin's module, and whatever it
+imports, is loaded the first time a query matches one of its triggers. The
+handler receives a PluginContext (speak, ask, listen, open_url, session), the
+full query and the query with the trigger phrase removed. Follow-up questions
+should use context.ask(prompt, handler): the answer arrives with the next
+utterance instead of blocking the turn on the microphone.
+
+Plugins are matched after custom commands and the built-in intents.
+`python viki_plugins.py --bench` measures discovery time and memory with 100
+plugins against importing them all eagerly.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import importlib.util
+import threading
+
+log = logging.getLogger(__name__)
+
+PLUGIN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "plugins")
+MANIFEST_NAME = "plugin.json"
+
+
+class PluginError(Exception):
+    pass
+
+
+class PluginContext:
+    """What a plugin handler may use; keeps plugins independent of viki's internals."""
+
+    def __init__(self, speak, listen, open_url, session, ask=None):
+        self.speak = speak
+        self.ask = ask          # ask(prompt, handler): handler(reply) runs on the next utterance
+        self.listen = listen
+        self.open_url = open_url
+        self.session = session
+
+
+class Plugin:
+    def __init__(self, path, manifest):
+        self.path = path
+        self.name = manifest["name"]
+        self.description = manifest.get("description", "")
+        self.triggers = [t.lower() for t in manifest["triggers"]]
+        self.module_file = os.path.join(path, manifest.get("module", "handler.py"))
+        self.entry = manifest.get("entry", "handle")
+        self.priority = manifest.get("priority", 0)
+        self.manifest = manifest
+        self._handler = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._handler is not None
+
+    def match(self, query_lower):
+        """Query with the trigger removed if a trigger matches, otherwise None."""
+        for trigger in self.triggers:
+            if trigger in query_lower:
+                return query_lower.replace(trigger, "", 1).strip()
+        return None
+
+    def handler(self):
+        with self._lock:
+            if self._handler is None:
+                module_name = f"viki_plugin_{self.name}"
+                spec = importlib.util.spec_from_file_location(module_name, self.module_file)
+                if spec is None:
+                    raise PluginError(f"Plugin {self.name}: cannot load {self.module_file}")
+                module = importlib.util.module_from_spec(spec)
+                sys.modules[module_name] = module
+                spec.loader.exec_module(module)
+                self._handler = getattr(module, self.entry)
+            return self._handler
+
+
+class PluginRegistry:
+    def __init__(self, plugin_dir=PLUGIN_DIR):
+        self.plugin_dir = plugin_dir
+        self.plugins = []
+        self.discover()
+
+    def discover(self):
+        """Read every manifest under plugin_dir. Plugin code is not imported."""
+        plugins = []
+        if os.path.isdir(self.plugin_dir):
+            for entry in sorted(os.listdir(self.plugin_dir)):
+                path = os.path.join(self.plugin_dir, entry)
+                manifest_path = os.path.join(path, MANIFEST_NAME)
+                if not os.path.isfile(manifest_path):
+                    continue
+                try:
+                    with open(manifest_path, "r", encoding="utf-8") as f:
+                        plugins.append(Plugin(path, json.load(f)))
+                except (ValueError, KeyError) as e:
+                    log.warning("Skipping plugin %s: invalid manifest (%s)", entry, e)
+        # Higher priority first; ties keep directory order
+        plugins.sort(key=lambda p: -p.priority)
+        self.plugins = plugins
+        return plugins
+
+    def get(self, name):
+        return next((p for p in self.plugins if p.name == name), None)
+
+    def route(self, query_lower):
+        """(plugin, argument) for the first plugin whose trigger is in the query, or (None, None)."""
+        for plugin in self.plugins:
+            argument = plugin.match(query_lower)
+            if argument is not None:
+                return plugin, argument
+        return None, None
+
+    def run(self, name, context, query, argument):
+        return self.get(name).handler()(context, query, argument)
+
+
+# --- Startup benchmark ---
+
+def _make_bench_plugins(root, count):
+    for i in range(count):
+        path = os.path.join(root, f"bench{i:03d}")
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, MANIFEST_NAME), "w") as f:
+            json.dump({"name": f"bench{i:03d}", "triggers": [f"benchmark phrase {i}"], "description": "benchmark"}, f)
+        with open(os.path.join(path, "handler.py"), "w") as f:
+            # Stands in for a plugin with its own dependencies and import-time setup
+            f.write("import json, decimal, fractions, statistics\n"
+                    f"TABLE = [str(n) * 4 for n in range(20000)]\n"
+                    "def handle(context, query, argument):\n    return len(TABLE)\n")
+
+
+def benchmark(count=100):
+    import tempfile
+    import tracemalloc
+
+    with tempfile.TemporaryDirectory() as root:
+        _make_bench_plugins(root, count)
+        for label, eager in (("lazy (manifests only)", False), ("eager (import every plugin)", True)):
+            tracemalloc.start()
+            started = time.perf_counter()
+            registry = PluginRegistry(root)
+            if eager:
+                for plugin in registry.plugins:
+                    plugin.handler()
+            elapsed = time.perf_counter() - started
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{label:>28}: {len(registry.plugins)} plugins, startup {elapsed * 1000:7.1f} ms, "
+                  f"memory {current / 1e6:6.2f} MB")
+            for plugin in registry.plugins:
+                sys.modules.pop(f"viki_plugin_{plugin.name}", None)
+
+        registry = PluginRegistry(root)
+        started = time.perf_counter()
+        plugin, argument = registry.route(f"benchmark phrase {count - 1}")
+        routed = time.perf_counter() - started
+        started = time.perf_counter()
+        registry.run(plugin.name, None, "", argument)
+        first = time.perf_counter() - started
+        started = time.perf_counter()
+        registry.run(plugin.name, None, "", argument)
+        second = time.perf_counter() - started
+        print(f"route through {count} manifests {routed * 1e6:.0f} us; first call (loads plugin) {first * 1000:.1f} ms, "
+              f"second call {second * 1e6:.0f} us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="VIKI intent plugins")
+    parser.add_argument("--bench", action="store_true", help="Measure startup time and memory with 100 plugins")
+    parser.add_argument("--list", action="store_true", help="List installed plugins")
+    args = parser.parse_args()
+    if args.bench:
+        benchmark()
+    elif args.list:
+        for plugin in PluginRegistry().plugins:
+            print(f"{plugin.name}: {', '.join(plugin.triggers)} - {plugin.description}")
+    else:
+        parser.print_help()
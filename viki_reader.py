@@ -0,0 +1,114 @@
+"""
+Chunked article reader for VIKI.
+
+An article is fetched once and split into sentences lazily. A background thread
+speaks it one sentence at a time while the next sentences are prepared, so
+speech starts as soon as the first sentence is ready and the caller is not held
+for the whole answer. Reading can be paused after N sentences, cancelled between
+sentences, and resumed from the same offset without fetching again.
+"""
+import re
+import queue
+import threading
+
+# A sentence ends at . ! or ? followed by whitespace and a capital, digit or quote,
+# or at a line break (paragraphs and section headings).
+SENTENCE_END = re.compile(r"(?<=[.!?])[ \t]+(?=[A-Z0-9\"'(])|\s*\n\s*")
+# Wikipedia plain-text section headings look like "== History ==".
+HEADING = re.compile(r"^=+\s*[^=]+?\s*=+$", re.MULTILINE)
+
+PREFETCH_SENTENCES = 2
+
+
+def iter_sentences(text, offset=0):
+    """Yield (end_offset, sentence) pairs from `offset` on, splitting only as far as consumed."""
+    position = offset
+    length = len(text)
+    while position < length:
+        match = SENTENCE_END.search(text, position)
+        end = match.start() if match else length
+        resume = match.end() if match else length
+        sentence = HEADING.sub("", text[position:end]).strip()
+        position = resume
+        if sentence:
+            yield position, " ".join(sentence.split())
+
+
+class ArticleReader:
+    def __init__(self, title, text, speak, url=None, prefetch=PREFETCH_SENTENCES):
+        self.title = title
+        self.text = text
+        self.url = url
+        self.speak = speak
+        self.prefetch = prefetch
+        self.offset = 0          # start of the next unread sentence
+        self._cancel = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self):
+        return next(iter_sentences(self.text, self.offset), None) is None
+
+    def is_reading(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def read(self, max_sentences=None, on_done=None):
+        """
+        Start reading from the current offset in the background. Returns False if nothing is left.
+        on_done() is called on the reading thread when the chunk ends, unless it was cancelled.
+        """
+        with self._lock:
+            if self.is_reading():
+                return True
+            if self.finished:
+                return False
+            self._cancel.clear()
+            self._thread = threading.Thread(target=self._read_loop, args=(max_sentences, on_done), daemon=True)
+            self._thread.start()
+            return True
+
+    def cancel(self):
+        """Stop after the sentence currently being spoken; the offset is kept for resuming."""
+        self._cancel.set()
+
+    def wait(self, timeout=None):
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _read_loop(self, max_sentences, on_done=None):
+        chunks = queue.Queue(maxsize=self.prefetch)
+        done = object()
+
+        def produce():
+            count = 0
+            for end, sentence in iter_sentences(self.text, self.offset):
+                if self._cancel.is_set() or (max_sentences is not None and count >= max_sentences):
+                    break
+                chunks.put((end, sentence))
+                count += 1
+            chunks.put(done)
+
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+        while True:
+            item = chunks.get()
+            if item is done:
+                break
+            end, sentence = item
+            if self._cancel.is_set():
+                # Drain so the producer is not left blocked on a full queue
+                continue
+            self.speak(sentence)
+            self.offset = end
+        producer.join()
+        if on_done is not None and not self._cancel.is_set():
+            on_done()
+
+
+def fetch_wikipedia_reader(search_term, speak):
+    """Fetch a Wikipedia article once and wrap it in an ArticleReader."""
+    import wikipedia
+    page = wikipedia.page(search_term)
+    return ArticleReader(page.title, page.content, speak, url=page.url)
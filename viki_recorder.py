@@ -0,0 +1,182 @@
+"""
+Video recording with pre-roll for VIKI.
+
+PreRollBuffer follows the frame ring with its own reader and keeps the last
+PREROLL_SECONDS of frames as JPEG bytes, encoded on a background thread.
+Recorder opens the cv2.VideoWriter on its own thread (so pressing "Start
+Recording" never stalls Tk), writes the pre-roll first and then follows the
+ring with live frames until stopped.
+
+Memory at 640x480, 30 fps, 10 s pre-roll (300 frames):
+    raw RGB frames       640 * 480 * 3 = 921,600 B/frame -> ~276 MB
+    JPEG, quality 80     ~20 KB/frame on the synthetic check below (~6 MB);
+                         real webcam scenes are noisier, ~25-60 KB/frame -> ~8-18 MB
+PREROLL_MAX_BYTES caps the buffer regardless of scene complexity; when it is
+reached the oldest frames go first, so the pre-roll gets shorter rather than
+memory growing. `python viki_recorder.py` fills a pre-roll with 10 s of
+synthetic 640x480 frames and reports and checks its memory use.
+"""
+import time
+import threading
+from collections import deque
+
+import cv2
+import numpy as np
+
+PREROLL_SECONDS = 10.0
+PREROLL_JPEG_QUALITY = 80
+PREROLL_MAX_BYTES = 32 * 1024 * 1024
+RECORDING_FPS = 30.0
+IDLE_POLL_SECONDS = 0.005
+
+
+class PreRollBuffer:
+    def __init__(self, ring, seconds=PREROLL_SECONDS, max_bytes=PREROLL_MAX_BYTES, quality=PREROLL_JPEG_QUALITY):
+        self.ring = ring
+        self.seconds = seconds
+        self.max_bytes = max_bytes
+        self.quality = quality
+        self.memory_bytes = 0
+        self.paused = False      # set while nobody is in view; frames are skipped, not encoded
+        self._frames = deque()   # (sequence, timestamp, jpeg bytes), oldest first
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._encode_loop, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self.memory_bytes = 0
+
+    def add(self, sequence, timestamp, frame_rgb):
+        """Encode one frame and append it, trimming by age and by total size."""
+        ok, jpeg = cv2.imencode(".jpg", cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2BGR),
+                                [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            return
+        data = jpeg.tobytes()
+        with self._lock:
+            self._frames.append((sequence, timestamp, data))
+            self.memory_bytes += len(data)
+            while self._frames and (self._frames[0][1] < timestamp - self.seconds
+                                    or self.memory_bytes > self.max_bytes):
+                self.memory_bytes -= len(self._frames.popleft()[2])
+
+    def snapshot(self):
+        """Frames currently held, oldest first, as (sequence, timestamp, jpeg bytes)."""
+        with self._lock:
+            return list(self._frames)
+
+    def _encode_loop(self):
+        reader = self.ring.reader()
+        reader.position = self.ring.latest_sequence
+        while not self._stop.is_set():
+            if self.paused:
+                reader.position = self.ring.latest_sequence
+                time.sleep(IDLE_POLL_SECONDS)
+                continue
+            result = reader.next()
+            if result is None:
+                time.sleep(IDLE_POLL_SECONDS)
+                continue
+            self.add(*result)
+
+
+class Recorder:
+    """
+    Writes ring frames to a video file on a background thread.
+    `on_event(action, data)` receives the same items VikiUI.process_queue handles.
+    """
+
+    def __init__(self, ring, preroll=None, on_event=None, fps=RECORDING_FPS):
+        self.ring = ring
+        self.preroll = preroll
+        self.on_event = on_event or (lambda action, data: None)
+        self.fps = fps
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def recording(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, filename, fourcc_code):
+        if self.recording:
+            return False
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._record, args=(filename, fourcc_code), daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+
+    def _record(self, filename, fourcc_code):
+        height, width = self.ring.shape[:2]
+        writer = cv2.VideoWriter(filename, cv2.VideoWriter_fourcc(*fourcc_code), self.fps, (width, height))
+        if not writer.isOpened():
+            self.on_event("recording_failed", "Failed to open video writer. Check codecs or file path permissions.")
+            return
+        try:
+            reader = self.ring.reader()
+            reader.position = self.ring.latest_sequence
+            preroll_frames = self.preroll.snapshot() if self.preroll is not None else []
+            if preroll_frames:
+                # Continue live frames right after the last pre-rolled one
+                reader.position = preroll_frames[-1][0]
+            self.on_event("log_to_chat", f"Recording started: {filename}"
+                          + (f" (with {len(preroll_frames) / self.fps:.1f} s pre-roll)" if preroll_frames else ""))
+            for _, _, data in preroll_frames:
+                writer.write(cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR))
+            bgr = np.empty(self.ring.shape, dtype=self.ring.dtype)
+            while not self._stop.is_set():
+                result = reader.next()
+                if result is None:
+                    time.sleep(IDLE_POLL_SECONDS)
+                    continue
+                cv2.cvtColor(result[2], cv2.COLOR_RGB2BGR, dst=bgr)
+                writer.write(bgr)
+        finally:
+            writer.release()
+
+
+def preroll_memory_check(seconds=PREROLL_SECONDS, fps=30, shape=(480, 640, 3)):
+    """Fill a pre-roll with `seconds` of synthetic frames and report its memory use."""
+    from viki_frames import FrameRing
+
+    preroll = PreRollBuffer(FrameRing(shape), seconds=seconds)
+    rng = np.random.default_rng(0)
+    height, width = shape[:2]
+    # A gradient background with a moving textured square: compresses roughly like a webcam scene
+    background = np.dstack([np.tile(np.linspace(0, 255, width, dtype=np.uint8), (height, 1))] * 3)
+    patch = rng.integers(0, 255, (120, 120, 3), dtype=np.uint8)
+    frame_count = int(seconds * fps)
+    started = time.perf_counter()
+    for i in range(frame_count):
+        frame = background.copy()
+        x = (i * 4) % (width - 120)
+        frame[180:300, x:x + 120] = patch
+        preroll.add(i + 1, i / fps, frame)
+    elapsed = time.perf_counter() - started
+    frames = preroll.snapshot()
+    raw = frame_count * int(np.prod(shape))
+    print(f"pre-roll: {len(frames)} frames ({len(frames) / fps:.1f} s) at {width}x{height}@{fps}fps, "
+          f"{preroll.memory_bytes / 1e6:.1f} MB JPEG vs {raw / 1e6:.1f} MB raw "
+          f"({preroll.memory_bytes / max(len(frames), 1) / 1e3:.1f} KB/frame); "
+          f"encode {frame_count / elapsed:.0f} frames/s")
+    assert preroll.memory_bytes <= PREROLL_MAX_BYTES
+    assert len(frames) >= seconds * fps - 1
+    return preroll.memory_bytes
+
+
+if __name__ == "__main__":
+    preroll_memory_check()
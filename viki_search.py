@@ -0,0 +1,368 @@
+"""
+Fetch-and-extract pipeline for reading search results aloud.
+
+Given a list of result URLs, fetch_pages() downloads the top N concurrently on
+one pooled requests.Session, with at most PER_HOST_LIMIT requests per host in
+flight and a connect/read timeout on each. Pages are streamed through an
+html.parser-based extractor chunk by chunk, so a page's main text is ready as
+soon as its body arrives and oversized pages are cut off at MAX_PAGE_BYTES.
+Extracted paragraphs are kept in a PageCache keyed by URL.
+
+summarize() drops paragraphs repeated across pages (mirrors and syndicated
+copies are common in result lists) and picks the few sentences that share the
+most words with the query, in page order, for a short spoken answer.
+
+`python viki_search.py --bench` starts a local fixture HTTP server with
+slow pages and compares end-to-end latency against fetching sequentially.
+"""
+import re
+import time
+import codecs
+import logging
+import threading
+import argparse
+from urllib.parse import urlparse
+from collections import OrderedDict
+from html.parser import HTMLParser
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from viki_reader import iter_sentences
+from viki_knowledge import tokenize
+
+log = logging.getLogger(__name__)
+
+MAX_PAGES = 5
+FETCH_WORKERS = 8
+PER_HOST_LIMIT = 2
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 5.0
+MAX_PAGE_BYTES = 2 * 1024 * 1024
+CHUNK_BYTES = 16 * 1024
+SNIFF_BYTES = 1024
+MIN_PARAGRAPH_CHARS = 40
+SUMMARY_SENTENCES = 3
+CACHE_ENTRIES = 256
+CACHE_TTL_SECONDS = 3600
+NEAR_DUPLICATE_SIMILARITY = 0.8
+USER_AGENT = "Mozilla/5.0 (compatible; VIKI assistant)"
+
+WORD = re.compile(r"[a-z0-9]+")
+META_CHARSET = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?([A-Za-z0-9_.:-]+)""", re.IGNORECASE)
+
+
+class MainTextParser(HTMLParser):
+    """Collects the text of paragraphs, headings and list items outside page chrome."""
+
+    SKIP = {"script", "style", "noscript", "nav", "header", "footer", "aside", "form", "svg", "template"}
+    BLOCKS = {"p", "h1", "h2", "h3", "li", "blockquote", "pre", "td"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.paragraphs = []
+        self.title = ""
+        self._skip_depth = 0
+        self._block_depth = 0
+        self._in_title = False
+        self._buffer = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self._skip_depth += 1
+        elif tag in self.BLOCKS:
+            self._block_depth += 1
+        elif tag == "title":
+            self._in_title = True
+        elif tag == "br":
+            self._buffer.append(" ")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP and self._skip_depth:
+            self._skip_depth -= 1
+        elif tag in self.BLOCKS and self._block_depth:
+            self._block_depth -= 1
+            if not self._block_depth:
+                self._flush()
+        elif tag == "title":
+            self._in_title = False
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+        elif self._block_depth and not self._skip_depth:
+            self._buffer.append(data)
+
+    def _flush(self):
+        text = " ".join("".join(self._buffer).split())
+        self._buffer = []
+        if len(text) >= MIN_PARAGRAPH_CHARS:
+            self.paragraphs.append(text)
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+class PageCache:
+    """LRU cache of extracted pages: url -> (title, paragraphs), expiring after a TTL."""
+
+    def __init__(self, max_entries=CACHE_ENTRIES, ttl=CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                return None
+            self._entries.move_to_end(url)
+            return entry[1]
+
+    def put(self, url, page):
+        with self._lock:
+            self._entries[url] = (time.monotonic(), page)
+            self._entries.move_to_end(url)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def make_session(workers=FETCH_WORKERS):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    return session
+
+
+def page_encoding(content_type, head):
+    """
+    Charset from the Content-Type header, else from a <meta> tag in the first bytes, else UTF-8.
+    (requests assumes ISO-8859-1 for any text/* response without a charset.)
+    """
+    match = re.search(r"charset=[\"']?([\w.:-]+)", content_type or "", re.IGNORECASE)
+    if match is None:
+        match = META_CHARSET.search(head)
+        name = match.group(1).decode("ascii") if match else "utf-8"
+    else:
+        name = match.group(1)
+    try:
+        return codecs.lookup(name).name
+    except LookupError:
+        return "utf-8"
+
+
+def extract_page(response):
+    """Stream a response body through MainTextParser. Returns (title, paragraphs)."""
+    parser = MainTextParser()
+    received = 0
+    head = b""
+    decoder = None
+    for chunk in response.iter_content(CHUNK_BYTES):
+        received += len(chunk)
+        if decoder is None:
+            # Hold the first bytes back until a <meta> charset would have shown up
+            head += chunk
+            if len(head) < SNIFF_BYTES and received < MAX_PAGE_BYTES:
+                continue
+            chunk, head = head, None
+            encoding = page_encoding(response.headers.get("Content-Type"), chunk)
+            # Incremental: a multi-byte character split across two chunks is decoded whole
+            decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        parser.feed(decoder.decode(chunk))
+        if received >= MAX_PAGE_BYTES:
+            break
+    if decoder is None:
+        decoder = codecs.getincrementaldecoder(page_encoding(response.headers.get("Content-Type"), head))(errors="replace")
+        parser.feed(decoder.decode(head))
+    parser.feed(decoder.decode(b"", final=True))
+    parser.close()
+    return parser.title.strip(), parser.paragraphs
+
+
+class PageFetcher:
+    def __init__(self, session=None, workers=FETCH_WORKERS, per_host=PER_HOST_LIMIT,
+                 timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), cache=None):
+        self.session = session or make_session(workers)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="viki-fetch")
+        self.per_host = per_host
+        self.timeout = timeout
+        self.cache = cache if cache is not None else PageCache()
+        self._host_limits = {}
+        self._lock = threading.Lock()
+
+    def _host_limit(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.BoundedSemaphore(self.per_host)
+            return self._host_limits[host]
+
+    def fetch(self, url):
+        """Fetch and extract one page; cached. Returns (title, paragraphs) or None on failure."""
+        page = self.cache.get(url)
+        if page is not None:
+            return page
+        try:
+            with self._host_limit(url):
+                with self.session.get(url, timeout=self.timeout, stream=True) as response:
+                    response.raise_for_status()
+                    if "html" not in response.headers.get("Content-Type", "text/html"):
+                        return None
+                    page = extract_page(response)
+        except requests.RequestException as e:
+            log.info("Fetch failed for %s: %s", url, e)
+            return None
+        self.cache.put(url, page)
+        return page
+
+    def fetch_pages(self, urls, max_pages=MAX_PAGES):
+        """Fetch the first max_pages URLs concurrently. Returns [(url, title, paragraphs)] in result order."""
+        urls = list(dict.fromkeys(urls))[:max_pages]
+        futures = {self.pool.submit(self.fetch, url): url for url in urls}
+        pages = {}
+        for future in as_completed(futures):
+            page = future.result()
+            if page is not None:
+                pages[futures[future]] = page
+        return [(url,) + pages[url] for url in urls if url in pages]
+
+
+def _words(text):
+    return set(tokenize(text))   # without stopwords, so "what is the" matches nothing
+
+
+def summarize(query, pages, max_sentences=SUMMARY_SENTENCES):
+    """Short answer from fetched pages: deduplicated, query-relevant sentences in reading order."""
+    query_words = _words(query)
+    seen = set()
+    candidates = []   # (score, order, sentence)
+    for url, title, paragraphs in pages:
+        for paragraph in paragraphs:
+            key = " ".join(WORD.findall(paragraph.lower()))
+            if key in seen:
+                continue
+            seen.add(key)
+            for _, sentence in iter_sentences(paragraph):
+                overlap = len(query_words & _words(sentence))
+                if overlap:
+                    candidates.append((overlap, len(candidates), sentence))
+    best = []
+    for candidate in sorted(candidates, key=lambda c: (-c[0], c[1])):
+        words = _words(candidate[2])
+        # Skip sentences that only differ from a chosen one in a word or two
+        if any(len(words & chosen) / len(words | chosen) >= NEAR_DUPLICATE_SIMILARITY for _, chosen in best):
+            continue
+        best.append((candidate, words))
+        if len(best) == max_sentences:
+            break
+    best = [candidate for candidate, _ in best]
+    return " ".join(sentence for _, _, sentence in sorted(best, key=lambda c: c[1]))
+
+
+# --- Fixture server and latency comparison ---
+
+def _fixture_server(pages, delay):
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = pages.get(self.path)
+            if body is None:
+                self.send_error(404)
+                return
+            time.sleep(delay)
+            data = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _fixture_pages(count):
+    pages = {}
+    shared = "<p>The speed of light in vacuum is exactly 299,792,458 metres per second by definition.</p>"
+    for i in range(count):
+        filler = "".join(f"<p>Paragraph {j} of page {i} talks about unrelated topics such as gardening and music.</p>"
+                         for j in range(200))
+        pages[f"/page{i}"] = (f"<html><head><title>Page {i}</title><script>var x = 'speed of light';</script></head>"
+                              f"<body><nav>Home | About | Speed of light</nav>{shared}"
+                              f"<p>Page {i} notes that light is slower in glass than in vacuum, about two thirds of its speed.</p>"
+                              f"{filler}<footer>Copyright</footer></body></html>")
+    return pages
+
+
+def _check_decoding():
+    """Multi-byte characters split across chunks, and pages that name their charset only in <meta>."""
+    class FakeResponse:
+        def __init__(self, body, content_type):
+            self.body = body
+            self.headers = {"Content-Type": content_type}
+
+        def iter_content(self, size):
+            for i in range(0, len(self.body), 7):   # 7-byte chunks split most multi-byte characters
+                yield self.body[i:i + 7]
+
+    text = "Ångström, naïve café – Привет, мир! 光速は秒速約30万キロメートルです。"
+    html = f"<html><head><title>{text}</title></head><body><p>{text}</p></body></html>"
+    for content_type, body in [("text/html; charset=utf-8", html.encode("utf-8")),
+                               ("text/html", html.encode("utf-8")),
+                               ("text/html", html.replace("<head>", '<head><meta charset="windows-1251">')
+                                .replace(text, "Привет, мир! Это проверка кодировки страницы.").encode("windows-1251"))]:
+        title, paragraphs = extract_page(FakeResponse(body, content_type))
+        assert "\ufffd" not in title + "".join(paragraphs), (content_type, title)
+    print("decoding: split multi-byte characters and <meta> charsets decode cleanly")
+
+
+def benchmark(count=MAX_PAGES, delay=0.3, runs=3):
+    server = _fixture_server(_fixture_pages(count), delay)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    urls = [f"{base}/page{i}" for i in range(count)]
+    query = "what is the speed of light"
+    try:
+        for label, per_host in (("sequential", 1), ("parallel", PER_HOST_LIMIT), ("parallel", count)):
+            timings = []
+            for _ in range(runs):
+                fetcher = PageFetcher(per_host=per_host, cache=PageCache(ttl=0))
+                started = time.perf_counter()
+                if label == "sequential":
+                    pages = [(url,) + fetcher.fetch(url) for url in urls]
+                else:
+                    pages = fetcher.fetch_pages(urls, max_pages=count)
+                answer = summarize(query, pages)
+                timings.append(time.perf_counter() - started)
+            print(f"{label:>10} (per-host limit {per_host}): {count} pages, {delay * 1000:.0f} ms server delay each: "
+                  f"best {min(timings) * 1000:.0f} ms end-to-end")
+        fetcher = PageFetcher()
+        fetcher.fetch_pages(urls)
+        started = time.perf_counter()
+        summarize(query, fetcher.fetch_pages(urls))
+        print(f"{'cached':>10}: {(time.perf_counter() - started) * 1000:.1f} ms end-to-end")
+        print(f"answer: {answer}")
+        assert answer.count("299,792,458") == 1, "shared paragraph should be deduplicated"
+        assert "Home | About" not in answer and "var x" not in answer
+        _check_decoding()
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search result fetch-and-extract pipeline")
+    parser.add_argument("--bench", action="store_true", help="Compare parallel and sequential fetching against a local fixture server")
+    args = parser.parse_args()
+    if args.bench:
+        benchmark()
+    else:
+        parser.print_help()
@@ -0,0 +1,291 @@
+"""
+Headless VIKI: runs the assistant core as a local HTTP/WebSocket service.
+
+    python viki_server.py --port 8765 --workers 8
+
+Endpoints
+    POST   /sessions               create a session -> {"session_id": ...}
+    DELETE /sessions/{id}          close a session
+    POST   /sessions/{id}/query    JSON {"text": "..."} or a WAV body (Content-Type: audio/wav);
+                                   returns the events of that turn
+    GET    /sessions/{id}/ws       WebSocket; send {"text": "..."} or binary WAV, receive events live
+    GET    /health
+
+Events have the same shape as the items VikiUI.process_queue handles, e.g.
+{"event": "update_status", "data": "Processing..."} or
+{"event": "add_message", "data": {"message": "...", "sender": "ai"}}, plus
+"awaiting_reply" when a dialog asks a follow-up question and "turn_done".
+
+Every session has its own viki.Session, so spoken output and state such as the
+article being read stay per client. Backpressure: a session accepts at most
+MAX_PENDING_TURNS queued turns (429 beyond that), and a client that stops
+reading its WebSocket blocks only its own worker until EVENT_PUT_TIMEOUT.
+"""
+import io
+import json
+import time
+import uuid
+import queue
+import asyncio
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web, WSMsgType
+import speech_recognition as sr
+
+import viki
+import viki_audio
+import viki_log
+
+MAX_PENDING_TURNS = 4
+MAX_EVENT_BACKLOG = 64
+EVENT_PUT_TIMEOUT = 10.0
+REPLY_TIMEOUT_SECONDS = 30.0
+SESSION_IDLE_SECONDS = 600.0
+CLEANUP_INTERVAL_SECONDS = 60.0
+
+
+def parse_text(raw):
+    """The "text" of a JSON object body, stripped. Raises ValueError for anything else."""
+    body = json.loads(raw)
+    if not isinstance(body, dict) or not isinstance(body.get("text"), str) or not body["text"].strip():
+        raise ValueError('expected a JSON object like {"text": "..."}')
+    return body["text"].strip()
+
+
+def recognize_wav(data):
+    with sr.AudioFile(io.BytesIO(data)) as source:
+        audio = viki_audio.prepare(viki.recognizer.record(source))
+    try:
+        return viki.transcribe(audio) or None
+    except viki.AllBackendsFailed:
+        return None
+
+
+class ServerSession:
+    def __init__(self, session_id, loop):
+        self.id = session_id
+        self.loop = loop
+        self.subscribers = set()             # asyncio.Queue per connected listener
+        self.turn_lock = asyncio.Lock()      # one turn at a time per session
+        self.pending_turns = 0
+        self.replies = queue.Queue()         # answers to follow-up questions asked mid-turn
+        self.awaiting_reply = threading.Event()
+        self.last_active = time.monotonic()
+        self.turn_counter = 0
+        self.core = viki.Session(session_id, sink=self._on_speak, listen=self._next_reply)
+
+    # --- Called from worker threads ---
+
+    def emit(self, event, data, turn=None):
+        message = {"event": event, "data": data, "turn": turn, "time": time.time()}
+        for subscriber in list(self.subscribers):
+            future = asyncio.run_coroutine_threadsafe(subscriber.put(message), self.loop)
+            try:
+                future.result(timeout=EVENT_PUT_TIMEOUT)
+            except Exception:
+                # Slow or vanished consumer: drop it rather than stall the session
+                future.cancel()
+                self.subscribers.discard(subscriber)
+
+    def _on_speak(self, text):
+        self.emit("add_message", {"message": text, "sender": "ai"})
+
+    def _next_reply(self):
+        self.awaiting_reply.set()
+        self.emit("awaiting_reply", True)
+        try:
+            return self.replies.get(timeout=REPLY_TIMEOUT_SECONDS)
+        except queue.Empty:
+            return None
+        finally:
+            self.awaiting_reply.clear()
+
+    def _run_turn(self, turn, text, audio):
+        with viki.use_session(self.core):
+            self.emit("update_status", "Processing...", turn)
+            self.emit("update_indicator", "orange", turn)
+            try:
+                if audio is not None:
+                    text = recognize_wav(audio)
+                    if text is None:
+                        self.emit("add_message", {"message": "Sorry, I didn't catch that.", "sender": "ai"}, turn)
+                if text:
+                    self.emit("add_message", {"message": text, "sender": "user"}, turn)
+                    viki.perform_task(text)
+            except Exception as e:
+                self.emit("add_message", {"message": f"An unexpected error occurred: {e}", "sender": "ai"}, turn)
+            self.emit("update_status", "Idle", turn)
+            self.emit("update_indicator", "gray", turn)
+            # The next query from this client answers the question rather than starting a new command
+            if viki.dialogs.pending(self.core) is not None:
+                self.emit("awaiting_reply", True, turn)
+            self.emit("turn_done", {"text": text}, turn)
+
+    # --- Called on the event loop ---
+
+    async def submit(self, executor, text=None, audio=None):
+        """Run one turn. Returns the turn id, or None if the input answered a pending question."""
+        self.last_active = time.monotonic()
+        if self.awaiting_reply.is_set():
+            if audio is not None:
+                text = await self.loop.run_in_executor(executor, recognize_wav, audio)
+            self.replies.put(text)
+            return None
+        if self.pending_turns >= MAX_PENDING_TURNS:
+            raise web.HTTPTooManyRequests(text="Too many pending turns for this session")
+        self.pending_turns += 1
+        self.turn_counter += 1
+        turn = self.turn_counter
+        try:
+            async with self.turn_lock:
+                await self.loop.run_in_executor(executor, self._run_turn, turn, text, audio)
+        finally:
+            self.pending_turns -= 1
+            self.last_active = time.monotonic()
+        return turn
+
+    def subscribe(self):
+        subscriber = asyncio.Queue(MAX_EVENT_BACKLOG)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+
+
+class VikiServer:
+    def __init__(self, workers=8):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="viki-turn")
+        self.sessions = {}
+        self.app = web.Application(client_max_size=20 * 1024 * 1024)
+        self.app.add_routes([
+            web.get("/health", self.health),
+            web.post("/sessions", self.create_session),
+            web.delete("/sessions/{session_id}", self.delete_session),
+            web.post("/sessions/{session_id}/query", self.query),
+            web.get("/sessions/{session_id}/ws", self.websocket),
+        ])
+        self.app.on_startup.append(self._start_cleanup)
+        self.app.on_cleanup.append(self._stop)
+
+    def _session(self, request):
+        session = self.sessions.get(request.match_info["session_id"])
+        if session is None:
+            raise web.HTTPNotFound(text="Unknown session")
+        return session
+
+    async def _read_input(self, request):
+        if request.content_type.startswith("audio/"):
+            return None, await request.read()
+        try:
+            return parse_text(await request.text()), None
+        except ValueError as e:
+            raise web.HTTPBadRequest(text=f"Expected {{\"text\": ...}} or an audio/wav body ({e})")
+
+    async def health(self, request):
+        return web.json_response({"status": "ok", "sessions": len(self.sessions)})
+
+    async def create_session(self, request):
+        session_id = uuid.uuid4().hex
+        self.sessions[session_id] = ServerSession(session_id, asyncio.get_running_loop())
+        return web.json_response({"session_id": session_id}, status=201)
+
+    async def delete_session(self, request):
+        session = self._session(request)
+        del self.sessions[session.id]
+        return web.json_response({"closed": session.id})
+
+    async def query(self, request):
+        session = self._session(request)
+        text, audio = await self._read_input(request)
+        events = session.subscribe()
+        submitted = asyncio.create_task(session.submit(self.executor, text=text, audio=audio))
+        received = []
+        try:
+            # Keep draining while the turn runs so the worker never waits on this client
+            while True:
+                next_event = asyncio.create_task(events.get())
+                done, _ = await asyncio.wait({next_event, submitted}, return_when=asyncio.FIRST_COMPLETED)
+                if next_event in done:
+                    received.append(next_event.result())
+                    continue
+                next_event.cancel()
+                break
+            turn = submitted.result()
+            while not events.empty():
+                received.append(events.get_nowait())
+        finally:
+            session.unsubscribe(events)
+        collected = [event for event in received if turn is None or event["turn"] in (turn, None)]
+        return web.json_response({"turn": turn, "events": collected})
+
+    async def websocket(self, request):
+        session = self._session(request)
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        events = session.subscribe()
+
+        async def forward_events():
+            while True:
+                await ws.send_json(await events.get())
+
+        async def submit(**turn_input):
+            try:
+                await session.submit(self.executor, **turn_input)
+            except web.HTTPException as e:
+                if not ws.closed:
+                    await ws.send_json({"event": "error", "data": e.text, "turn": None, "time": time.time()})
+
+        forwarder = asyncio.create_task(forward_events())
+        turns = set()
+        try:
+            async for msg in ws:
+                if msg.type == WSMsgType.TEXT:
+                    try:
+                        text = parse_text(msg.data)
+                    except ValueError as e:
+                        # A bad frame gets an error back; the socket stays open
+                        await ws.send_json({"event": "error", "data": str(e), "turn": None, "time": time.time()})
+                        continue
+                    task = asyncio.create_task(submit(text=text))
+                elif msg.type == WSMsgType.BINARY:
+                    task = asyncio.create_task(submit(audio=msg.data))
+                else:
+                    continue
+                turns.add(task)
+                task.add_done_callback(turns.discard)
+        finally:
+            forwarder.cancel()
+            session.unsubscribe(events)
+        return ws
+
+    async def _start_cleanup(self, app):
+        async def cleanup():
+            while True:
+                await asyncio.sleep(CLEANUP_INTERVAL_SECONDS)
+                now = time.monotonic()
+                for session_id, session in list(self.sessions.items()):
+                    if (not session.subscribers and not session.pending_turns
+                            and now - session.last_active > SESSION_IDLE_SECONDS):
+                        del self.sessions[session_id]
+        app["cleanup_task"] = asyncio.create_task(cleanup())
+
+    async def _stop(self, app):
+        app["cleanup_task"].cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run VIKI as a local HTTP/WebSocket service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent turns across all sessions")
+    args = parser.parse_args(argv)
+    viki_log.setup()
+    web.run_app(VikiServer(workers=args.workers).app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
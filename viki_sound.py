@@ -0,0 +1,337 @@
+"""
+Sound bank and audio output for UI cues (button click, startup chime).
+
+The UI used to call winsound.PlaySound(path) on every click: a Windows-only
+import, a stat() and a file read per click, and each new sound cutting off
+the last. SoundService instead:
+
+  * decodes each cue once into a float32 array at the output rate
+    (click.wav is loaded at startup; the startup chime is synthesized);
+  * play() only appends a voice to the mixer and returns;
+  * the sink pulls fixed-size blocks from render(), which sums all active
+    voices, so overlapping clicks mix instead of interrupting each other.
+
+Sinks: SoundDeviceSink (a callback-driven PortAudio stream through the optional
+sounddevice package, on Windows, macOS and Linux), DropSink (no output and no
+thread: what default_sink() falls back to when there is no device), NullSink
+(discards the audio on a real-time clock, so benchmarks see device-like
+timing) and FileSink (writes what would have been played to a WAV file).
+
+Each voice records the time from play() to the block that first contains it;
+plus the sink's output buffering that is the click-to-sound latency.
+`python viki_sound.py --bench` reports it.
+"""
+import time
+import wave
+import logging
+import argparse
+import threading
+
+import numpy as np
+
+from viki_audio import pcm_to_float, resample
+from viki_workers import LatencyStats
+
+log = logging.getLogger(__name__)
+
+OUTPUT_RATE = 44100
+OUTPUT_CHANNELS = 2
+BLOCK_FRAMES = 256            # 5.8 ms at 44.1 kHz
+MAX_VOICES = 16               # oldest voice dropped beyond this
+CLICK_VOLUME = 0.8
+
+try:
+    import sounddevice
+except (ImportError, OSError):   # OSError: the package is there but PortAudio is not
+    sounddevice = None
+
+
+def load_wav(path, rate=OUTPUT_RATE, channels=OUTPUT_CHANNELS):
+    """Decode a PCM WAV file to float32 (frames, channels) at the output rate."""
+    with wave.open(path, "rb") as w:
+        samples = pcm_to_float(w.readframes(w.getnframes()), w.getsampwidth(), w.getnchannels())
+        source_rate = w.getframerate()
+    if source_rate != rate:
+        samples = np.stack([resample(samples[:, c], source_rate, rate) for c in range(samples.shape[1])], axis=1)
+    if samples.shape[1] != channels:
+        samples = np.repeat(samples.mean(axis=1, keepdims=True), channels, axis=1)
+    return np.ascontiguousarray(samples, dtype=np.float32)
+
+
+def chime(rate=OUTPUT_RATE, channels=OUTPUT_CHANNELS, notes=(660.0, 880.0), note_seconds=0.18, level=0.25):
+    """Short two-note startup cue, in place of Windows' "SystemStart" alias."""
+    parts = []
+    for frequency in notes:
+        t = np.arange(int(note_seconds * rate)) / rate
+        envelope = np.minimum(1.0, t / 0.01) * np.exp(-t * 8)
+        parts.append(level * envelope * np.sin(2 * np.pi * frequency * t))
+    mono = np.concatenate(parts).astype(np.float32)
+    return np.repeat(mono[:, None], channels, axis=1)
+
+
+class Voice:
+    def __init__(self, samples, volume):
+        self.samples = samples
+        self.volume = volume
+        self.position = 0
+        self.queued_at = time.perf_counter()
+        self.done = threading.Event()
+
+
+class SoundService:
+    def __init__(self, sink=None, rate=OUTPUT_RATE, channels=OUTPUT_CHANNELS, blocksize=BLOCK_FRAMES):
+        self.rate = rate
+        self.channels = channels
+        self.blocksize = blocksize
+        self.bank = {}
+        self.voices = []
+        self.latency = LatencyStats("Click-to-sound latency")
+        self._lock = threading.Lock()
+        self.sink = sink if sink is not None else default_sink()
+        self._discard = isinstance(self.sink, DropSink)
+        self.sink.start(self.render, rate, channels, blocksize)
+
+    def load(self, name, path):
+        self.bank[name] = load_wav(path, self.rate, self.channels)
+
+    def add(self, name, samples):
+        self.bank[name] = np.ascontiguousarray(samples, dtype=np.float32)
+
+    def play(self, name, volume=1.0):
+        """Start a cue. Returns its Voice (voice.done is set when it has played), or None if unknown."""
+        samples = self.bank.get(name)
+        if samples is None:
+            return None
+        voice = Voice(samples, volume)
+        if self._discard:
+            voice.done.set()   # nothing will render it
+            return voice
+        with self._lock:
+            self.voices.append(voice)
+            if len(self.voices) > MAX_VOICES:
+                self.voices.pop(0).done.set()
+        return voice
+
+    def render(self, frames):
+        """Next `frames` frames of output: every active voice summed. Called by the sink."""
+        out = np.zeros((frames, self.channels), dtype=np.float32)
+        now = time.perf_counter()
+        with self._lock:
+            voices = self.voices
+            if not voices:
+                return out
+            still_playing = []
+            for voice in voices:
+                if voice.position == 0:
+                    # Buffered output still to drain before this block is heard
+                    self.latency.add(now - voice.queued_at + self.sink.output_latency)
+                chunk = voice.samples[voice.position:voice.position + frames]
+                out[:len(chunk)] += chunk * voice.volume
+                voice.position += len(chunk)
+                if voice.position < len(voice.samples):
+                    still_playing.append(voice)
+                else:
+                    voice.done.set()
+            self.voices = still_playing
+        np.clip(out, -1.0, 1.0, out=out)
+        return out
+
+    def close(self):
+        self.sink.stop()
+
+
+# --- Sinks ---
+
+class SoundDeviceSink:
+    """PortAudio output stream whose callback pulls blocks from render()."""
+
+    def __init__(self, device=None):
+        self.device = device
+        self.stream = None
+        self.output_latency = 0.0
+
+    def start(self, render, rate, channels, blocksize):
+        def callback(outdata, frames, time_info, status):
+            outdata[:] = render(frames)
+
+        self.stream = sounddevice.OutputStream(samplerate=rate, channels=channels, blocksize=blocksize,
+                                               dtype="float32", latency="low", device=self.device, callback=callback)
+        self.stream.start()
+        self.output_latency = self.stream.latency
+
+    def stop(self):
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+
+
+class DropSink:
+    """No output device: nothing is rendered, so there is no clock thread waking every block."""
+
+    output_latency = 0.0
+
+    def start(self, render, rate, channels, blocksize):
+        pass
+
+    def stop(self):
+        pass
+
+
+class NullSink:
+    """Pulls blocks on a real-time clock like a device would, and discards them."""
+
+    def __init__(self, realtime=True):
+        self.realtime = realtime
+        self.output_latency = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, render, rate, channels, blocksize):
+        self.output_latency = blocksize / rate   # one block is always in flight
+        self._thread = threading.Thread(target=self._run, args=(render, rate, blocksize), daemon=True)
+        self._thread.start()
+
+    def _run(self, render, rate, blocksize):
+        interval = blocksize / rate
+        deadline = time.perf_counter()
+        while not self._stop.is_set():
+            self.write(render(blocksize))
+            if self.realtime:
+                deadline += interval
+                time.sleep(max(0.0, deadline - time.perf_counter()))
+
+    def write(self, block):
+        pass
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+
+
+class FileSink(NullSink):
+    """Writes the rendered output to a 16-bit WAV file instead of a device."""
+
+    def __init__(self, path, realtime=True):
+        super().__init__(realtime)
+        self.path = path
+        self._wav = None
+
+    def start(self, render, rate, channels, blocksize):
+        self._wav = wave.open(self.path, "wb")
+        self._wav.setnchannels(channels)
+        self._wav.setsampwidth(2)
+        self._wav.setframerate(rate)
+        super().start(render, rate, channels, blocksize)
+
+    def write(self, block):
+        self._wav.writeframes((block * 32767).astype("<i2").tobytes())
+
+    def stop(self):
+        super().stop()
+        if self._wav is not None:
+            self._wav.close()
+
+
+def default_sink():
+    if sounddevice is not None:
+        try:
+            sounddevice.query_devices(kind="output")
+            return SoundDeviceSink()
+        except Exception as e:
+            log.warning("No audio output device (%s); UI sounds disabled.", e)
+    else:
+        log.warning("sounddevice is not installed; UI sounds disabled.")
+    return DropSink()
+
+
+# --- Benchmark ---
+
+def benchmark(click_path="click.wav", clicks=200):
+    import os
+    import tempfile
+
+    # What the click handler used to do per click before the sound could start
+    started = time.perf_counter()
+    for _ in range(clicks):
+        if os.path.exists(click_path):
+            with wave.open(click_path, "rb") as w:
+                w.readframes(w.getnframes())
+    per_click_disk = (time.perf_counter() - started) / clicks
+    print(f"per click from disk (exists + open + read, before any playback): {per_click_disk * 1e6:.0f} us")
+
+    started = time.perf_counter()
+    service = SoundService(NullSink())
+    service.load("click", click_path)
+    print(f"decode click.wav into the bank once: {(time.perf_counter() - started) * 1000:.1f} ms")
+    started = time.perf_counter()
+    for _ in range(clicks):
+        service.play("click")
+    print(f"play() call: {(time.perf_counter() - started) / clicks * 1e6:.1f} us")
+    service.close()
+
+    # Without a device the UI gets a DropSink: no thread, and played cues are not kept
+    threads = threading.active_count()
+    service = SoundService(DropSink())
+    service.load("click", click_path)
+    assert all(service.play("click").done.is_set() for _ in range(clicks))
+    assert not service.voices and threading.active_count() == threads
+    service.close()
+    print("drop sink (no device): no clock thread, no voices kept")
+
+    # Simulated device timing; a real device adds its own buffering on top
+    sinks = [(f"null sink, {block} frames", lambda: NullSink(), block) for block in (128, 256, 1024)]
+    if sounddevice is not None:
+        sinks.append((f"sounddevice, {BLOCK_FRAMES} frames", SoundDeviceSink, BLOCK_FRAMES))
+    for label, make_sink, block in sinks:
+        try:
+            service = SoundService(make_sink(), blocksize=block)
+        except Exception as e:
+            print(f"{label}: unavailable ({e})")
+            continue
+        service.load("click", click_path)
+        rng = np.random.default_rng(0)
+        for _ in range(50):
+            service.play("click", CLICK_VOLUME)
+            time.sleep(rng.uniform(0.005, 0.03))   # fast clicking: sounds overlap
+        time.sleep(0.2)
+        service.close()
+        print(f"{label:>28}: {service.latency.summary()}")
+
+    # Overlapping sounds are mixed, not cut off: drive render() by hand and compare with the expected sum
+    service = SoundService(NullSink())
+    service.close()
+    service.load("click", click_path)
+    single = service.bank["click"]
+    offset = 441   # second click 10 ms after the first
+    service.play("click", 0.5)
+    rendered = [service.render(offset)]
+    service.play("click", 0.5)
+    while service.voices:
+        rendered.append(service.render(BLOCK_FRAMES))
+    mixed = np.concatenate(rendered)
+    expected = np.zeros((len(single) + offset, single.shape[1]), dtype=np.float32)
+    expected[:len(single)] += single * 0.5
+    expected[offset:offset + len(single)] += single * 0.5
+    assert np.allclose(mixed[:len(expected)], np.clip(expected, -1, 1), atol=1e-6)
+    print("overlapping clicks are mixed sample-exactly")
+
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, "out.wav")
+        service = SoundService(FileSink(path))
+        service.load("click", click_path)
+        assert service.play("click").done.wait(2)
+        service.close()
+        with wave.open(path, "rb") as w:
+            print(f"file sink: {w.getnframes()} frames written for a {len(single)}-frame click")
+            assert w.getnframes() >= len(single)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="UI sound bank and audio output")
+    parser.add_argument("--bench", action="store_true", help="Report click-to-sound latency")
+    parser.add_argument("--click", default="click.wav")
+    args = parser.parse_args()
+    if args.bench:
+        benchmark(args.click)
+    else:
+        parser.print_help()
@@ -0,0 +1,315 @@
+"""
+Typeahead suggestions for the command entry.
+
+SuggestionIndex is a radix trie over every phrase the user might type: the
+built-in intent phrases and plugin triggers, the custom voice commands and
+past queries from the conversation history. Every trie node keeps the top
+TOP_K phrases of its subtree, so a lookup walks at most len(prefix)
+characters of edges and returns a list that is already ranked; it does not
+depend on how many phrases share the prefix.
+
+Phrases are ranked by usage with exponential decay (HALF_LIFE_DAYS). A use
+at time t adds 2 ** ((t - epoch) / half_life) to a phrase's score instead of
+decaying every score as time passes: all scores would shrink by the same
+factor, so the order is unchanged and a score only ever goes up. That keeps
+each update to the path from the root to the phrase. Built-in phrases get a
+small base score so they show up before they have been used.
+
+Adding, using and removing phrases is incremental. `python viki_suggest.py
+--bench` measures per-keystroke lookups at 100k phrases.
+"""
+import math
+import time
+import heapq
+import argparse
+import threading
+
+TOP_K = 8
+SHOW_SUGGESTIONS = 5
+HALF_LIFE_DAYS = 14.0
+BUILTIN_SCORE = 0.5            # a built-in phrase ranks like half a use at the epoch
+REBASE_ABOVE = 1e200           # scores are rescaled before they overflow
+DEBOUNCE_MS = 60
+
+BUILTIN = "builtin"
+CUSTOM = "custom"
+HISTORY = "history"
+
+
+class Entry:
+    __slots__ = ("text", "score", "sources")
+
+    def __init__(self, text):
+        self.text = text
+        self.score = 0.0
+        self.sources = set()
+
+
+class _Node:
+    __slots__ = ("edges", "key", "top")
+
+    def __init__(self):
+        self.edges = {}     # first character -> [label, child node]
+        self.key = None     # phrase ending here
+        self.top = []       # best keys in this subtree, highest score first
+
+
+def normalize(text):
+    return " ".join(text.lower().split())
+
+
+class SuggestionIndex:
+    def __init__(self, half_life_days=HALF_LIFE_DAYS, top_k=TOP_K):
+        self.rate = math.log(2) / (half_life_days * 86400)
+        self.epoch = time.time()
+        self.top_k = top_k
+        self.entries = {}
+        self.root = _Node()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    # --- Updates ---
+
+    def add(self, text, source, score=0.0):
+        """Add a phrase (or another source for an existing one). Returns its Entry."""
+        key = normalize(text)
+        if not key:
+            return None
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = Entry(text.strip())
+                path = self._insert(key)
+            else:
+                path = None
+            entry.sources.add(source)
+            if score:
+                entry.score += score
+            self._promote(key, path)
+        return entry
+
+    def add_builtin(self, phrases):
+        for phrase in phrases:
+            self.add(phrase, BUILTIN, BUILTIN_SCORE)
+
+    def record_use(self, text, when=None, source=HISTORY):
+        """Count one use of a phrase (a sent command or recognized query)."""
+        weight = math.exp(self.rate * ((when or time.time()) - self.epoch))
+        self.add(text, source, weight)
+        if weight > REBASE_ABOVE:
+            self._rebase()
+
+    def remove(self, text, source):
+        """Drop one source of a phrase; the phrase goes when no source is left."""
+        key = normalize(text)
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return
+            entry.sources.discard(source)
+            if entry.sources:
+                return
+            del self.entries[key]
+            path = self._find_path(key)
+            path[-1].key = None
+            # Rare (deleting a custom command): recompute the lists that mentioned it
+            for node in path:
+                if key in node.top:
+                    node.top = self._best_in_subtree(node)
+
+    def _rebase(self):
+        with self._lock:
+            shift = max(entry.score for entry in self.entries.values())
+            for entry in self.entries.values():
+                entry.score /= shift
+            self.epoch += math.log(shift) / self.rate
+
+    # --- Lookup ---
+
+    def suggest(self, prefix, limit=SHOW_SUGGESTIONS):
+        """Best phrases starting with `prefix`, most used first."""
+        key = normalize(prefix)
+        if not key:
+            return []
+        if prefix[-1:].isspace():
+            key += " "    # "open " should not suggest "opensnitch"
+        with self._lock:
+            node = self.root
+            rest = key
+            while rest:
+                edge = node.edges.get(rest[0])
+                if edge is None:
+                    return []
+                label, child = edge
+                if rest.startswith(label):
+                    rest = rest[len(label):]
+                    node = child
+                elif label.startswith(rest):
+                    node = child
+                    break
+                else:
+                    return []
+            return [self.entries[k].text for k in node.top[:limit] if k != key]
+
+    # --- Trie internals (caller holds the lock) ---
+
+    def _insert(self, key):
+        """Add the key to the trie. Returns the nodes from the root to its node."""
+        node = self.root
+        path = [node]
+        rest = key
+        while rest:
+            edge = node.edges.get(rest[0])
+            if edge is None:
+                child = _Node()
+                node.edges[rest[0]] = [rest, child]
+                node = child
+                path.append(node)
+                break
+            label, child = edge
+            common = 0
+            limit = min(len(label), len(rest))
+            while common < limit and label[common] == rest[common]:
+                common += 1
+            if common < len(label):
+                # Split the edge; the middle node covers the same subtree as the old child
+                middle = _Node()
+                middle.top = list(child.top)
+                middle.edges[label[common]] = [label[common:], child]
+                edge[0], edge[1] = label[:common], middle
+                child = middle
+            node = child
+            path.append(node)
+            rest = rest[common:]
+        node.key = key
+        return path
+
+    def _find_path(self, key):
+        node = self.root
+        path = [node]
+        rest = key
+        while rest:
+            label, node = node.edges[rest[0]]
+            path.append(node)
+            rest = rest[len(label):]
+        return path
+
+    def _promote(self, key, path=None):
+        """Score of `key` went up (or it is new): fix the top lists from the root down."""
+        score = self.entries[key].score
+        for node in path or self._find_path(key):
+            top = node.top
+            if key in top:
+                top.remove(key)
+            elif len(top) >= self.top_k and self.entries[top[-1]].score >= score:
+                continue
+            # Insert in place; top_k is small, so a linear scan beats re-sorting
+            position = 0
+            while position < len(top) and self.entries[top[position]].score >= score:
+                position += 1
+            top.insert(position, key)
+            del top[self.top_k:]
+
+    def _best_in_subtree(self, node):
+        keys = []
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            if current.key is not None:
+                keys.append(current.key)
+            stack.extend(child for _, child in current.edges.values())
+        return heapq.nlargest(self.top_k, keys, key=lambda k: self.entries[k].score)
+
+
+# --- Benchmark ---
+
+_VERBS = ["open", "play", "search", "start", "stop", "show", "tell me", "what is", "set", "remind me to"]
+_NOUNS = ("youtube notepad calculator chrome music weather news recipe workout timer reminder photo video "
+          "wikipedia football python email calendar meeting spotify playlist podcast alarm light camera").split()
+
+
+def _synthetic_phrases(count, seed=0):
+    import random
+    rng = random.Random(seed)
+    seen = set()
+    while len(seen) < count:
+        phrase = f"{rng.choice(_VERBS)} {rng.choice(_NOUNS)} {rng.choice(_NOUNS)} {rng.randrange(10000)}"
+        if phrase not in seen:
+            seen.add(phrase)
+            yield phrase
+
+
+def benchmark(count=100_000):
+    import gc
+    import random
+    import tracemalloc
+
+    phrases = list(_synthetic_phrases(count))
+    now = time.time()
+
+    def build():
+        index = SuggestionIndex()
+        rng = random.Random(1)
+        for phrase in phrases:
+            # History spread over the last 90 days, so ranking has something to do
+            index.record_use(phrase, now - rng.uniform(0, 90 * 86400))
+        return index
+
+    tracemalloc.start()
+    index = build()
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del index
+    gc.collect()
+    started = time.perf_counter()
+    index = build()
+    build_time = time.perf_counter() - started
+    rng = random.Random(2)
+    print(f"{len(index):,} phrases indexed in {build_time:.2f} s ({build_time / count * 1e6:.1f} us each), "
+          f"{memory / 1e6:.0f} MB")
+
+    # Every keystroke of 500 typed commands
+    timings = []
+    for phrase in rng.sample(phrases, 500):
+        for end in range(1, len(phrase) + 1):
+            started = time.perf_counter()
+            index.suggest(phrase[:end])
+            timings.append(time.perf_counter() - started)
+    timings.sort()
+    pick = lambda q: timings[min(len(timings) - 1, int(q * len(timings)))] * 1e6
+    print(f"keystroke lookup ({len(timings):,} prefixes): p50 {pick(0.5):.1f} us, p99 {pick(0.99):.1f} us, "
+          f"max {timings[-1] * 1e6:.0f} us")
+    assert pick(0.99) < 1000, "lookups must stay under 1 ms"
+
+    started = time.perf_counter()
+    for i in range(1000):
+        index.add(f"launch custom tool {i}", CUSTOM)
+    print(f"incremental add: {(time.perf_counter() - started) / 1000 * 1e6:.1f} us per phrase")
+    started = time.perf_counter()
+    for phrase in rng.sample(phrases, 1000):
+        index.record_use(phrase)
+    print(f"record_use: {(time.perf_counter() - started) / 1000 * 1e6:.1f} us per use")
+
+    # Ranking: a phrase used just now outranks one used often long ago
+    for days_ago in (60, 59, 58):
+        index.record_use("play old favourite", now - days_ago * 86400)
+    index.record_use("play old fashioned jazz")
+    assert index.suggest("play old f") == ["play old fashioned jazz", "play old favourite"], index.suggest("play old f")
+    started = time.perf_counter()
+    index.remove("play old fashioned jazz", HISTORY)
+    assert index.suggest("play old f") == ["play old favourite"]
+    print(f"remove: {(time.perf_counter() - started) * 1000:.1f} ms (recomputes the lists along its path)")
+    print(f"'open you' -> {index.suggest('open you')}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Typeahead suggestion index")
+    parser.add_argument("--bench", action="store_true", help="Keystroke lookup latency at --phrases entries")
+    parser.add_argument("--phrases", type=int, default=100_000)
+    args = parser.parse_args()
+    if args.bench:
+        benchmark(args.phrases)
+    else:
+        parser.print_help()
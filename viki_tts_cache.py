@@ -0,0 +1,269 @@
+"""
+Response-audio cache for VIKI's text-to-speech.
+
+Phrases such as "Opening YouTube" or "goodbye!" are rendered once to WAV with
+pyttsx3's save_to_file and replayed from disk afterwards. Entries are keyed by
+text + voice + rate, kept in a size-bounded directory and evicted least
+recently used first.
+
+Run `python viki_tts_cache.py --bench` to compare time-to-first-audio for a
+cached and an uncached phrase.
+"""
+import os
+import sys
+import time
+import queue
+import shutil
+import hashlib
+import logging
+import argparse
+import threading
+import subprocess
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
+
+CACHE_DIR = "tts_cache"
+MAX_CACHE_BYTES = 50 * 1024 * 1024
+MAX_CACHEABLE_CHARS = 120
+# A phrase is rendered to the cache the second time it is spoken, so one-off
+# answers (Wikipedia summaries, ChatGPT replies) don't churn the cache.
+RENDER_AFTER_USES = 2
+
+COMMON_PHRASES = [
+    "Hey there! What can I do for you today?",
+    "I'm Viky, your friendly assistant. How can I help?",
+    "Opening YouTube",
+    "Opening Notepad",
+    "Opening Calculator",
+    "Opening Google Chrome",
+    "Time for a workout!",
+    "goodbye!",
+    "Sorry, I didn't catch that.",
+    "Searching Google...",
+    "Search results are on your screen.",
+    "The search results are on your screen.",
+    "What song would you like me to play?",
+    "What would you like to know about?",
+]
+
+
+def find_player():
+    """Command line of the first WAV player on this machine, or None (Windows uses winsound)."""
+    if sys.platform == "darwin":
+        players = [["afplay"]]
+    else:
+        players = [["paplay"], ["pw-play"], ["aplay", "-q"]]
+    return next((player for player in players if shutil.which(player[0])), None)
+
+
+def play_wav(path, on_start=None):
+    """
+    Play a WAV file synchronously. Returns False if no player is available.
+    on_start() is called once playback has been handed to the player (its process is running).
+    """
+    if sys.platform.startswith("win"):
+        import winsound
+        if on_start is not None:
+            on_start()   # PlaySound starts the audio itself, in this thread
+        winsound.PlaySound(path, winsound.SND_FILENAME)
+        return True
+    player = find_player()
+    if player is None:
+        return False
+    process = subprocess.Popen(player + [path])
+    if on_start is not None:
+        on_start()
+    return process.wait() == 0
+
+
+class TTSCache:
+    def __init__(self, engine, engine_lock, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES, player=play_wav):
+        self.engine = engine
+        # pyttsx3.init() hands out one shared engine per driver, so rendering
+        # must not overlap with live speech on the same engine.
+        self.engine_lock = engine_lock
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.player = player
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size in bytes, least recently used first
+        self._total_bytes = 0
+        self._uses = {}
+        self._pending = set()
+        self._render_queue = queue.Queue()
+        self._render_thread = None
+        self._load_index()
+
+    def _load_index(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".wav"):
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                files.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._total_bytes += size
+        self._evict()
+
+    def key(self, text, voice, rate):
+        return hashlib.sha1(f"{voice}\0{rate}\0{text}".encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".wav")
+
+    def lookup(self, text, voice, rate):
+        """Return the cached WAV path for a phrase, or None on a miss."""
+        key = self.key(text, voice, rate)
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+        path = self._path(key)
+        try:
+            os.utime(path)  # keeps LRU order across restarts
+        except FileNotFoundError:
+            with self._lock:
+                self._total_bytes -= self._entries.pop(key, 0)
+            return None
+        return path
+
+    def play(self, path):
+        try:
+            return self.player(path)
+        except Exception as e:
+            log.warning("Error playing cached speech %s: %s", path, e)
+            return False
+
+    def note_spoken(self, text, voice, rate):
+        """Record a live utterance and queue it for rendering once it has proven common."""
+        if len(text) > MAX_CACHEABLE_CHARS:
+            return
+        with self._lock:
+            uses = self._uses.get(text, 0) + 1
+            self._uses[text] = uses
+        if uses >= RENDER_AFTER_USES:
+            self.render_async(text, voice, rate)
+
+    def render(self, text, voice, rate):
+        key = self.key(text, voice, rate)
+        path = self._path(key)
+        temp_path = f"{path}.{threading.get_ident()}.tmp.wav"
+        with self.engine_lock:
+            saved = (self.engine.getProperty("voice"), self.engine.getProperty("rate"))
+            self.engine.setProperty("voice", voice)
+            self.engine.setProperty("rate", rate)
+            try:
+                self.engine.save_to_file(text, temp_path)
+                self.engine.runAndWait()
+            finally:
+                self.engine.setProperty("voice", saved[0])
+                self.engine.setProperty("rate", saved[1])
+        if not os.path.exists(temp_path) or os.path.getsize(temp_path) == 0:
+            return None
+        os.replace(temp_path, path)
+        with self._lock:
+            self._total_bytes += os.path.getsize(path) - self._entries.pop(key, 0)
+            self._entries[key] = os.path.getsize(path)
+            self._evict()
+        return path
+
+    def render_async(self, text, voice, rate):
+        key = self.key(text, voice, rate)
+        with self._lock:
+            if key in self._entries or key in self._pending:
+                return
+            self._pending.add(key)
+            if self._render_thread is None:
+                self._render_thread = threading.Thread(target=self._render_loop, daemon=True)
+                self._render_thread.start()
+        self._render_queue.put((key, text, voice, rate))
+
+    def prewarm(self, phrases, voice, rate):
+        """Render a list of phrases in the background."""
+        for text in phrases:
+            self.render_async(text, voice, rate)
+
+    def _render_loop(self):
+        while True:
+            key, text, voice, rate = self._render_queue.get()
+            try:
+                self.render(text, voice, rate)
+            except Exception as e:
+                log.warning("Error rendering speech to cache: %s", e)
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+
+    def _evict(self):
+        # Caller holds self._lock (or is __init__)
+        while self._total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+
+def benchmark(phrase="Opening YouTube", runs=5):
+    """
+    Print median time-to-first-audio for live synthesis vs cached playback.
+
+    Audio starts when the WAV player is running. Live speech has to synthesize the
+    whole phrase before that (pyttsx3's eSpeak driver renders to a file, then plays
+    it); cached speech only looks the file up. Player start-up is the same for both
+    and is measured separately, as it needs a player and a sound device.
+    """
+    import tempfile
+    import statistics
+    import pyttsx3
+
+    engine = pyttsx3.init()
+    voice, rate = engine.getProperty("voice"), engine.getProperty("rate")
+    median_ms = lambda samples: statistics.median(samples) * 1000
+    with tempfile.TemporaryDirectory() as root:
+        cache = TTSCache(engine, threading.Lock(), cache_dir=root)
+
+        synthesis = []
+        for i in range(runs):
+            started = time.perf_counter()
+            engine.save_to_file(phrase, os.path.join(root, f"live{i}.wav"))
+            engine.runAndWait()
+            synthesis.append(time.perf_counter() - started)
+
+        path = cache.render(phrase, voice, rate)
+        lookup = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            found = cache.lookup(phrase, voice, rate)
+            lookup.append(time.perf_counter() - started)
+            assert found == path
+
+        player_start = []
+        if sys.platform.startswith("win") or find_player():
+            for _ in range(runs):
+                started = time.perf_counter()
+                running = {}
+                play_wav(path, on_start=lambda: running.setdefault("t", time.perf_counter()))
+                player_start.append(running["t"] - started)
+
+    print(f"phrase {phrase!r}, {runs} runs, median:")
+    print(f"  synthesis before the first sample (live):  {median_ms(synthesis):7.2f} ms")
+    print(f"  cache lookup (cached):                     {median_ms(lookup):7.2f} ms")
+    if player_start:
+        print(f"  player running (both):                     {median_ms(player_start):7.2f} ms")
+        print(f"uncached time-to-first-audio: {median_ms(synthesis) + median_ms(player_start):.1f} ms")
+        print(f"cached time-to-first-audio:   {median_ms(lookup) + median_ms(player_start):.1f} ms")
+    else:
+        print("  player running: no WAV player on this machine, not measured")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="VIKI text-to-speech cache tools")
+    parser.add_argument("--bench", action="store_true", help="Measure time-to-first-audio cached vs uncached")
+    parser.add_argument("--phrase", default="Opening YouTube")
+    args = parser.parse_args()
+    if args.bench:
+        benchmark(args.phrase)
@@ -8,19 +8,35 @@ import cv2
 import PIL.Image, PIL.ImageTk
 import time
 import queue
+import logging
 import viki  # Assuming viki.py is in the same directory and importable
 import speech_recognition as sr
 import customtkinter as ctk
 import tkinter.ttk as ttk
 import os # Make sure os is imported for path handling
-import winsound # Make sure winsound is imported
+from viki_command_model import CommandTableModel, TreeviewSync, DuplicateCommandError
+from viki_workers import WorkerSupervisor, LatencyStats, AUDIO, VISION
+from viki_frames import FrameRing
+from viki_recorder import PreRollBuffer, Recorder, PREROLL_SECONDS
+from viki_photos import PhotoCapture, PHOTO_FORMATS
+from viki_camera import CaptureConfig, open_camera
+from viki_motion import MotionDetector, ABSENT_DISPLAY_INTERVAL
+from viki_history import HistoryStore
+from viki_gallery import ThumbnailCache, GalleryView, scan_media
+import viki_suggest
+from viki_suggest import SuggestionIndex, DEBOUNCE_MS
+import multiprocessing
+from viki_sound import SoundService, chime, CLICK_VOLUME
+import viki_log
+from viki_log import Sampler
+
+log = logging.getLogger(__name__)
 
 # --- Configuration for Module Check ---
 APP_NAME = "Viki Voice Assistant"
 REQUIRED_MODULES = [
     "pyttsx3",
     "speech_recognition",
-    "openai",
     "wikipedia",
     "requests",
     "bs4",
@@ -91,9 +107,7 @@ def check_and_install_modules_ui():
 
                 messagebox.showinfo("Installation Complete", "Missing modules installed successfully! "
                                     "Please restart the application for changes to take effect.")
-                print("--- Pip Installation Output ---")
-                print("STDOUT:\n", process.stdout)
-                print("STDERR:\n", process.stderr)
+                log.info("pip install output", extra={"data": {"stdout": process.stdout, "stderr": process.stderr}})
                 sys.exit()
             except subprocess.CalledProcessError as e:
                 temp_root.destroy() if 'temp_root' in locals() else None
@@ -122,10 +136,10 @@ def resource_path(relative_path):
 # --- Opening Video Function ---
 def play_opening_video(video_path):
     full_video_path = resource_path(video_path)
-    print(f"Attempting to open video: {full_video_path}")
+    log.info("Opening splash video %s", full_video_path)
     cap = cv2.VideoCapture(full_video_path)
     if not cap.isOpened():
-        print(f"Error: Cannot open opening video at {full_video_path}. Check file path or codecs.")
+        log.error("Cannot open opening video at %s. Check file path or codecs.", full_video_path)
         return
 
     # Create a small Tkinter window for the video (optional, depends on UX)
@@ -143,7 +157,7 @@ def play_opening_video(video_path):
     video_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
 
     if video_width == 0 or video_height == 0:
-        print("Could not get video dimensions. Skipping splash screen.")
+        log.warning("Could not get video dimensions. Skipping splash screen.")
         cap.release()
         splash_root.destroy()
         return
@@ -180,7 +194,7 @@ ctk.set_appearance_mode("Light")
 ctk.set_default_color_theme("blue") # You can try "dark-blue" or "green"
 
 class VikiUI:
-    def __init__(self, root):
+    def __init__(self, root, use_workers=False):
         self.root = root
         self.root.title("Viki Voice Assistant UI")
         self.root.geometry("900x750") # Slightly taller
@@ -200,7 +214,6 @@ class VikiUI:
         # Add logo image at the top
         try:
             logo_path = resource_path("jarvis/viki_logo.png")
-            print(f"Loading logo image from: {logo_path}")
             logo_image = PIL.Image.open(logo_path)
             max_width = 200
             max_height = 100
@@ -209,13 +222,17 @@ class VikiUI:
             self.logo_label = ctk.CTkLabel(root, image=self.logo_imgtk, text="")
             self.logo_label.grid(row=0, column=0, pady=10) # Use grid for logo
         except Exception as e:
-            print(f"Error loading logo image: {e}")
+            log.warning("Error loading logo image: %s", e)
             self.logo_label = ctk.CTkLabel(root, text="Viki Assistant", font=("Segoe UI", 24, "bold"))
             self.logo_label.grid(row=0, column=0, pady=10)
 
-        # Load click sound file path (adjusted for PyInstaller)
-        self.click_sound_path = resource_path("click.wav")
-        self.bind_button_sounds()
+        # UI sounds are decoded once and mixed on the sound service's stream (adjusted for PyInstaller)
+        self.sounds = SoundService()
+        try:
+            self.sounds.load("click", resource_path("click.wav"))
+        except (OSError, EOFError, ValueError) as e:
+            log.warning("Could not load click sound: %s", e)
+        self.sounds.add("startup", chime())
 
         # Replace text display with canvas for chat bubbles
         self.chat_canvas = tk.Canvas(root, bg=ctk.ThemeManager.theme["CTkFrame"]["fg_color"][0], highlightthickness=0) # Use theme color
@@ -242,6 +259,20 @@ class VikiUI:
         self.entry = ctk.CTkEntry(self.input_frame, font=("Segoe UI", 14), placeholder_text="Type your command here...", corner_radius=8)
         self.entry.grid(row=0, column=0, padx=10, pady=8, sticky="ew")
         self.entry.bind("<Return>", self.send_command)
+        self.entry.bind("<KeyRelease>", self.schedule_suggestions)
+        self.entry.bind("<Down>", self.focus_suggestions)
+        self.entry.bind("<Tab>", self.accept_suggestion)
+        self.entry.bind("<Escape>", lambda e: self.hide_suggestions())
+
+        # Typeahead list under the entry; hidden while there is nothing to suggest
+        self.suggestion_list = tk.Listbox(self.input_frame, height=viki_suggest.SHOW_SUGGESTIONS, font=("Segoe UI", 12),
+                                          activestyle="none", highlightthickness=0)
+        self.suggestion_list.grid(row=1, column=0, columnspan=2, padx=10, pady=(0, 8), sticky="ew")
+        self.suggestion_list.grid_remove()
+        self.suggestion_list.bind("<ButtonRelease-1>", self.accept_suggestion)
+        self.suggestion_list.bind("<Return>", lambda e: (self.accept_suggestion(), self.send_command()))
+        self.suggestion_list.bind("<Escape>", lambda e: (self.hide_suggestions(), self.entry.focus_set()))
+        self._suggest_job = None
 
         self.btn_send = ctk.CTkButton(self.input_frame, text="Send", command=self.send_command, corner_radius=8)
         self.btn_send.grid(row=0, column=1, padx=10, pady=8)
@@ -249,7 +280,7 @@ class VikiUI:
         # Buttons frame (using CTkFrame)
         btn_frame = ctk.CTkFrame(root, fg_color="transparent") # Transparent background
         btn_frame.grid(row=3, column=0, pady=10)
-        btn_frame.grid_columnconfigure((0,1,2,3,4,5,6,7,8,9,10), weight=1) # Make columns expand equally
+        btn_frame.grid_columnconfigure((0,1,2,3,4,5,6,7,8,9,10,11,12), weight=1) # Make columns expand equally
 
         self.btn_listen = ctk.CTkButton(btn_frame, text="Start Listening", command=self.start_listening, corner_radius=8)
         self.btn_listen.grid(row=0, column=0, padx=5, pady=5)
@@ -257,6 +288,11 @@ class VikiUI:
         self.btn_stop_listen = ctk.CTkButton(btn_frame, text="Stop Listening", command=self.stop_listening, state="disabled", corner_radius=8, fg_color="red")
         self.btn_stop_listen.grid(row=0, column=1, padx=5, pady=5)
 
+        # Start/stop listening when the camera sees someone arrive or leave (video mode only)
+        self.auto_listen_var = ctk.BooleanVar(value=False)
+        self.auto_listen_check = ctk.CTkCheckBox(btn_frame, text="Auto-listen on presence", variable=self.auto_listen_var)
+        self.auto_listen_check.grid(row=1, column=0, columnspan=2, padx=5, pady=5)
+
         self.status_label = ctk.CTkLabel(btn_frame, text="Status: Idle", font=("Segoe UI", 12, "bold"))
         self.status_label.grid(row=0, column=2, padx=10)
 
@@ -273,9 +309,22 @@ class VikiUI:
         self.btn_capture_photo = ctk.CTkButton(btn_frame, text="Capture Photo", command=self.capture_photo, state="disabled", corner_radius=8)
         self.btn_capture_photo.grid(row=0, column=6, padx=5, pady=5)
 
+        self.btn_burst_photo = ctk.CTkButton(btn_frame, text="Burst Photos", command=self.capture_burst, state="disabled", corner_radius=8)
+        self.btn_burst_photo.grid(row=1, column=6, padx=5, pady=5)
+
         self.btn_clear = ctk.CTkButton(btn_frame, text="Clear Chat", command=self.clear_text, corner_radius=8)
         self.btn_clear.grid(row=0, column=7, padx=5, pady=5)
 
+        # Conversation history: older messages load above the current ones a page at a time
+        self.btn_earlier = ctk.CTkButton(btn_frame, text="Earlier Messages", command=self.load_earlier_messages, corner_radius=8)
+        self.btn_earlier.grid(row=1, column=7, padx=5, pady=5)
+
+        self.btn_search_history = ctk.CTkButton(btn_frame, text="Search History", command=self.search_history, corner_radius=8)
+        self.btn_search_history.grid(row=1, column=3, padx=5, pady=5)
+
+        self.btn_gallery = ctk.CTkButton(btn_frame, text="Gallery", command=self.open_gallery, corner_radius=8)
+        self.btn_gallery.grid(row=1, column=4, padx=5, pady=5)
+
         # Video format selection
         self.video_format_var = ctk.StringVar(value="mp4")
         self.video_format_label = ctk.CTkLabel(btn_frame, text="Format:")
@@ -283,10 +332,24 @@ class VikiUI:
         self.video_format_option = ctk.CTkComboBox(btn_frame, variable=self.video_format_var, values=["mp4", "avi"], state="readonly", width=80, corner_radius=8)
         self.video_format_option.grid(row=0, column=9, padx=5, pady=5)
 
+        # Photo format selection
+        self.photo_format_var = ctk.StringVar(value="png")
+        self.photo_format_label = ctk.CTkLabel(btn_frame, text="Photo:")
+        self.photo_format_label.grid(row=1, column=8, padx=(20, 5), pady=5)
+        self.photo_format_option = ctk.CTkComboBox(btn_frame, variable=self.photo_format_var, values=list(PHOTO_FORMATS), state="readonly", width=80, corner_radius=8, command=self.set_photo_format)
+        self.photo_format_option.grid(row=1, column=9, padx=5, pady=5)
+
         # Theme toggle button
         self.btn_toggle_theme = ctk.CTkButton(btn_frame, text="Switch to Dark Mode", command=self.toggle_theme, corner_radius=8)
         self.btn_toggle_theme.grid(row=0, column=10, padx=5, pady=5)
 
+        # Pre-roll length: seconds of video kept before "Start Recording" is pressed
+        self.preroll_var = ctk.StringVar(value=str(int(PREROLL_SECONDS)))
+        self.preroll_label = ctk.CTkLabel(btn_frame, text="Pre-roll (s):")
+        self.preroll_label.grid(row=0, column=11, padx=(20, 5), pady=5)
+        self.preroll_option = ctk.CTkComboBox(btn_frame, variable=self.preroll_var, values=["0", "5", "10", "30"], state="readonly", width=70, corner_radius=8, command=self.set_preroll_seconds)
+        self.preroll_option.grid(row=0, column=12, padx=5, pady=5)
+
         # Video display label (initially hidden or small)
         self.video_label = ctk.CTkLabel(root, text="", width=640, height=480) # Placeholder for video
         self.video_label.grid(row=4, column=0, pady=5)
@@ -300,8 +363,6 @@ class VikiUI:
 
         # Initialize recording variables
         self.recording = False
-        self.video_writer = None
-        self.current_frame = None
 
         # New frame for application list and voice command mapping
         self.app_frame = ctk.CTkFrame(root, corner_radius=10) # Use CTkFrame
@@ -325,6 +386,22 @@ class VikiUI:
         self.app_scrollbar.grid(row=1, column=1, padx=5, pady=5, sticky="ns") # Stick to right of treeview
         self.app_tree.configure(yscrollcommand=self.app_scrollbar.set)
 
+        # Model behind the treeview: rows with lookup indexes, incremental updates and filtering
+        self.command_model = CommandTableModel()
+        self.command_sync = TreeviewSync(self.app_tree, self.command_model)
+
+        # Typeahead index: built-in phrases and plugin triggers now, custom commands as the
+        # model changes, past queries once the history has been read
+        self.suggestions = SuggestionIndex()
+        self.suggestions.add_builtin(phrase for _, phrases in viki.BUILTIN_INTENTS for phrase in phrases)
+        self.suggestions.add_builtin(trigger for plugin in viki.plugins.plugins for trigger in plugin.triggers)
+        self._suggested_commands = {}   # model row id -> voice command in the index
+        self.command_model.subscribe(self._sync_suggestions)
+
+        # Filter box scans the model's rows, not the widget
+        self.filter_entry = ctk.CTkEntry(self.app_frame, placeholder_text="Filter commands...", corner_radius=8)
+        self.filter_entry.grid(row=2, column=0, columnspan=2, padx=5, pady=(0, 5), sticky="ew")
+        self.filter_entry.bind("<KeyRelease>", lambda e: self.command_sync.set_filter(self.filter_entry.get()))
 
         # Frame for adding new application, voice command and path
         self.add_app_frame = ctk.CTkFrame(root, fg_color="transparent")
@@ -381,13 +458,56 @@ class VikiUI:
         # Flags and threads
         self.listening = False
         self.video_mode = False
+        self.present = True   # motion detector state; False throttles display and pauses the pre-roll
         self.video_thread = None
         self.listen_thread = None
-        self.stop_event = threading.Event()
+        # Separate events: going idle on absence stops listening, but the camera must keep watching
+        self.listen_stop = threading.Event()
+        self.video_stop = threading.Event()
 
         # Queue for thread-safe UI updates
         self.queue = queue.Queue()
 
+        # Latency measurements, printed on exit so single- and multi-process runs can be compared
+        self.frame_latency = LatencyStats("UI frame latency")
+        self.frame_log = Sampler(logging.getLogger(__name__ + ".video"))
+        self.turn_latency = LatencyStats("Speech turn latency")
+
+        # Multi-process mode: audio and vision run in supervised worker processes
+        self.supervisor = None
+        if use_workers:
+            self.supervisor = WorkerSupervisor()
+            self.supervisor.start()
+            self.root.after(50, self.poll_workers)
+        else:
+            viki.prewarm_speech()   # this process does the talking
+
+        # Camera frames: one producer (video loop or vision worker), one reader per consumer
+        self.frame_ring = self.supervisor.ring if self.supervisor else FrameRing()
+        self.display_reader = self.frame_ring.reader()
+
+        # Recording runs off the Tk thread and starts with the pre-roll
+        # (in multi-process mode the vision worker owns both)
+        self.preroll = PreRollBuffer(self.frame_ring, seconds=float(self.preroll_var.get()))
+        self.recorder = Recorder(self.frame_ring, self.preroll, on_event=lambda action, data: self.queue.put((action, data)))
+        # Photos are copied out of the ring here (shared in both modes) and encoded on a pool
+        self.photos = PhotoCapture(self.frame_ring, fmt=self.photo_format_var.get(), on_event=lambda action, data: self.queue.put((action, data)))
+
+        # Thumbnails for the gallery and for images in the chat are made on pools and cached on disk
+        self.thumbs = ThumbnailCache()
+        self.chat_thumbs = ThumbnailCache(size=(400, 300), workers=1)
+        self.gallery = None
+        self.gallery_window = None
+
+        # Every chat message is also saved; the store's own thread does the SQLite work
+        try:
+            self.history = HistoryStore()
+            self.history_cursor = self.history.first_id
+            threading.Thread(target=self._load_suggestion_history, daemon=True).start()
+        except Exception as e:
+            log.warning("Conversation history unavailable: %s", e)
+            self.history = None
+
         # Start UI update loop
         self.root.after(100, self.process_queue)
 
@@ -397,6 +517,9 @@ class VikiUI:
         # Initialize ttk styling for Treeview
         self._setup_treeview_style()
 
+        # Click sounds on every button, now that they all exist
+        self.bind_button_sounds()
+
     def _setup_treeview_style(self):
         style = ttk.Style()
         # Set custom theme for Treeview
@@ -450,14 +573,8 @@ class VikiUI:
         try:
             with open(CUSTOM_COMMANDS_FILE, "r") as f:
                 commands = json.load(f)
-            for item in self.app_tree.get_children():
-                self.app_tree.delete(item)
-            for voice_cmd, app_path in commands.items():
-                if app_path.startswith("web://"):
-                    app_name = app_path[len("web://"):]
-                else:
-                    app_name = os.path.basename(app_path)
-                self.app_tree.insert("", "end", values=(app_name, voice_cmd, app_path))
+            # Only rows that differ from the current table are touched
+            self.command_model.replace_all(commands)
             self.log_to_chat("Loaded custom commands from file.")
         except FileNotFoundError:
             self.log_to_chat("No custom commands file found to load.")
@@ -475,8 +592,67 @@ class VikiUI:
     def clear_text(self):
         for widget in self.messages_frame.winfo_children():
             widget.destroy()
+        if self.history:
+            self.history_cursor = self.history.first_id
         self.log_to_chat("Chat cleared.")
 
+    def load_earlier_messages(self):
+        if not self.history:
+            return
+        cursor = self.history_cursor
+        # Read on a thread; the page comes back through the queue
+        threading.Thread(target=lambda: self.queue.put(("history_page", self.history.page(cursor))), daemon=True).start()
+
+    def show_history_page(self, rows):
+        if not rows:
+            self.log_to_chat("No earlier messages.")
+            return
+        self.history_cursor = rows[0][0]
+        children = self.messages_frame.winfo_children()
+        first = children[0] if children else None
+        for _, _, _, sender, text, _ in rows:
+            self.add_message(text, sender, record=False, before=first, scroll=False)
+        self.chat_canvas.update_idletasks()
+        self.chat_canvas.yview_moveto(0.0)
+
+    def open_gallery(self):
+        if self.gallery_window is not None and self.gallery_window.winfo_exists():
+            self.gallery_window.lift()
+        else:
+            self.gallery_window = ctk.CTkToplevel(self.root)
+            self.gallery_window.title("Photos and Recordings")
+            self.gallery_window.geometry("720x520")
+            canvas = tk.Canvas(self.gallery_window, highlightthickness=0, bg=ctk.ThemeManager.theme["CTkFrame"]["fg_color"][0])
+            scrollbar = ctk.CTkScrollbar(self.gallery_window, command=lambda *args: (canvas.yview(*args), self.gallery.refresh()))
+            canvas.configure(yscrollcommand=scrollbar.set)
+            scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+            canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+            canvas.bind("<MouseWheel>", lambda e: (canvas.yview_scroll(-1 if e.delta > 0 else 1, "units"), self.gallery.refresh()))
+            # X11 reports the wheel as buttons 4 and 5 instead of <MouseWheel>
+            canvas.bind("<Button-4>", lambda e: (canvas.yview_scroll(-1, "units"), self.gallery.refresh()))
+            canvas.bind("<Button-5>", lambda e: (canvas.yview_scroll(1, "units"), self.gallery.refresh()))
+            # Thumbnails arrive on pool threads; the tile is drawn from process_queue
+            self.gallery = GalleryView(canvas, self.thumbs,
+                                       on_ready=lambda index, path, thumb: self.queue.put(("gallery_tile", (index, path, thumb))),
+                                       on_open=viki.actions.open_path)
+        # Directory listing off the Tk thread too
+        threading.Thread(target=lambda: self.queue.put(("gallery_items", scan_media())), daemon=True).start()
+
+    def search_history(self):
+        text = self.entry.get().strip()
+        if not self.history or not text:
+            self.log_to_chat("Type words to search for, then press Search History.")
+            return
+        threading.Thread(target=lambda: self.queue.put(("history_results", (text, self.history.search(text)))), daemon=True).start()
+
+    def show_history_results(self, text, rows):
+        if not rows:
+            self.add_message(f"Nothing in the history matches '{text}'.", sender="ai", record=False)
+            return
+        lines = [f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(ts))}  {sender}: {message}"
+                 for _, _, ts, sender, message, _ in rows]
+        self.add_message(f"History matches for '{text}':\n" + "\n".join(lines), sender="ai", record=False)
+
     def browse_path(self):
         file_path = filedialog.askopenfilename(title="Select Application Executable")
         if file_path:
@@ -491,7 +667,8 @@ class VikiUI:
             if not os.path.isfile(app_path):
                 messagebox.showwarning("Input Error", "Please select a valid file for the application path.")
                 return
-            self.app_tree.insert("", "end", values=(app_name, voice_cmd, app_path))
+            if not self._add_command_row(app_name, voice_cmd, app_path):
+                return
             self.app_entry.delete(0, tk.END)
             self.voice_entry.delete(0, tk.END)
             self.path_entry.delete(0, tk.END)
@@ -505,7 +682,8 @@ class VikiUI:
         voice_cmd = self.webapp_voice_entry.get().strip()
         if webapp_name and voice_cmd:
             webapp_path = f"web://{webapp_name}"
-            self.app_tree.insert("", "end", values=(webapp_name, voice_cmd, webapp_path))
+            if not self._add_command_row(webapp_name, voice_cmd, webapp_path):
+                return
             self.webapp_entry.delete(0, tk.END)
             self.webapp_voice_entry.delete(0, tk.END)
             self.log_to_chat(f"Added web application '{webapp_name}'")
@@ -519,7 +697,7 @@ class VikiUI:
             messagebox.showwarning("Selection Error", "Please select an application to edit.")
             return
         item = selected[0]
-        values = self.app_tree.item(item, "values")
+        values = self.command_model.get(item) or ()
         if len(values) != 3:
             messagebox.showwarning("Data Error", "Selected item does not have valid data.")
             return
@@ -542,7 +720,7 @@ class VikiUI:
             messagebox.showwarning("Selection Error", "Please select a web application to edit.")
             return
         item = selected[0]
-        values = self.app_tree.item(item, "values")
+        values = self.command_model.get(item) or ()
         if len(values) != 3:
             messagebox.showwarning("Data Error", "Selected item does not have valid data.")
             return
@@ -562,7 +740,8 @@ class VikiUI:
         voice_cmd = self.voice_entry.get().strip()
         app_path = self.path_entry.get().strip()
         if app_name and voice_cmd and app_path:
-            self.app_tree.item(item, values=(app_name, voice_cmd, app_path))
+            if not self._update_command_row(item, app_name, voice_cmd, app_path):
+                return
             self.app_entry.delete(0, tk.END)
             self.voice_entry.delete(0, tk.END)
             self.path_entry.delete(0, tk.END)
@@ -577,7 +756,8 @@ class VikiUI:
         voice_cmd = self.webapp_voice_entry.get().strip()
         if webapp_name and voice_cmd:
             webapp_path = f"web://{webapp_name}"
-            self.app_tree.item(item, values=(webapp_name, voice_cmd, webapp_path))
+            if not self._update_command_row(item, webapp_name, voice_cmd, webapp_path):
+                return
             self.webapp_entry.delete(0, tk.END)
             self.webapp_voice_entry.delete(0, tk.END)
             self.log_to_chat(f"Updated web application '{webapp_name}'")
@@ -592,12 +772,12 @@ class VikiUI:
             messagebox.showwarning("Selection Error", "Please select an application to delete.")
             return
         item = selected[0]
-        values = self.app_tree.item(item, "values")
+        values = self.command_model.get(item) or ()
         if len(values) != 3:
             messagebox.showwarning("Data Error", "Selected item does not have valid data.")
             return
         if messagebox.askyesno("Confirm Delete", f"Are you sure you want to delete application '{values[0]}'?"):
-            self.app_tree.delete(item)
+            self.command_model.remove(item)
             self.log_to_chat(f"Deleted application '{values[0]}'")
             self.save_all_custom_commands()
 
@@ -607,7 +787,7 @@ class VikiUI:
             messagebox.showwarning("Selection Error", "Please select a web application to delete.")
             return
         item = selected[0]
-        values = self.app_tree.item(item, "values")
+        values = self.command_model.get(item) or ()
         if len(values) != 3:
             messagebox.showwarning("Data Error", "Selected item does not have valid data.")
             return
@@ -615,22 +795,37 @@ class VikiUI:
             messagebox.showwarning("Selection Error", "Selected item is not a web application.")
             return
         if messagebox.askyesno("Confirm Delete", f"Are you sure you want to delete web application '{values[0]}'?"):
-            self.app_tree.delete(item)
+            self.command_model.remove(item)
             self.log_to_chat(f"Deleted web application '{values[0]}'")
             self.save_all_custom_commands()
 
 
+    def _add_command_row(self, app_name, voice_cmd, app_path):
+        try:
+            self.command_model.add(app_name, voice_cmd, app_path)
+            return True
+        except DuplicateCommandError as e:
+            existing = self.command_model.get(e.existing_iid)
+            messagebox.showwarning("Duplicate Command", f"The voice command '{voice_cmd}' is already mapped to '{existing[2]}'.")
+            return False
+
+    def _update_command_row(self, item, app_name, voice_cmd, app_path):
+        try:
+            self.command_model.update(item, app_name, voice_cmd, app_path)
+            return True
+        except DuplicateCommandError as e:
+            existing = self.command_model.get(e.existing_iid)
+            messagebox.showwarning("Duplicate Command", f"The voice command '{voice_cmd}' is already mapped to '{existing[2]}'.")
+            return False
+        except KeyError:
+            messagebox.showwarning("Selection Error", "The selected item no longer exists.")
+            return False
+
     def save_all_custom_commands(self):
         try:
             import json
             CUSTOM_COMMANDS_FILE = resource_path("custom_commands.json")
-            commands = {}
-            for item in self.app_tree.get_children():
-                values = self.app_tree.item(item, "values")
-                if len(values) == 3:
-                    voice_cmd = values[1]
-                    app_path = values[2]
-                    commands[voice_cmd] = app_path
+            commands = self.command_model.to_commands()
             with open(CUSTOM_COMMANDS_FILE, "w", encoding="utf-8") as f:
                 json.dump(commands, f, indent=4)
             self.log_to_chat("Saved all custom commands.")
@@ -659,12 +854,8 @@ class VikiUI:
         try:
             CUSTOM_COMMANDS_TXT = resource_path("custom_commands.txt")
             with open(CUSTOM_COMMANDS_TXT, "w", encoding="utf-8") as f:
-                for item in self.app_tree.get_children():
-                    values = self.app_tree.item(item, "values")
-                    if len(values) == 3:
-                        voice_cmd = values[1]
-                        app_path = values[2]
-                        f.write(f"{voice_cmd} : {app_path}\n")
+                for voice_cmd, app_path in self.command_model.to_commands().items():
+                    f.write(f"{voice_cmd} : {app_path}\n")
             self.log_to_chat("Saved commands to custom_commands.txt")
         except Exception as e:
             self.log_to_chat(f"Error saving commands to txt: {e}")
@@ -682,9 +873,12 @@ class VikiUI:
             self.btn_stop_listen.configure(state="normal")
             self.update_status("Listening")
             self.update_indicator("green")
-            self.stop_event.clear()
-            self.listen_thread = threading.Thread(target=self.listen_loop, daemon=True)
-            self.listen_thread.start()
+            if self.supervisor:
+                self.supervisor.send(AUDIO, "start_listening")
+            else:
+                self.listen_stop.clear()
+                self.listen_thread = threading.Thread(target=self.listen_loop, daemon=True)
+                self.listen_thread.start()
             self.log_to_chat("Listening started...")
 
     def stop_listening(self):
@@ -694,13 +888,20 @@ class VikiUI:
             self.btn_stop_listen.configure(state="disabled")
             self.update_status("Idle")
             self.update_indicator("gray")
-            self.stop_event.set()
+            if self.supervisor:
+                self.supervisor.send(AUDIO, "stop_listening")
+            else:
+                self.listen_stop.set()
             self.log_to_chat("Listening stopped.")
 
     def log_to_chat(self, message):
         self.queue.put(("add_message", {"message": message, "sender": "ai"}))
 
-    def add_message(self, message, sender="user"):
+    def add_message(self, message, sender="user", record=True, before=None, scroll=True):
+        if record and self.history:
+            self.history.add(sender, message)
+        if record and sender == "user":
+            self.suggestions.record_use(message)
         def safe_get_color(theme_dict, key, default):
             try:
                 return theme_dict[key][0]
@@ -725,7 +926,10 @@ class VikiUI:
             pack_padx = (10, 50) # More padding on right for AI
 
         bubble_frame = ctk.CTkFrame(self.messages_frame, fg_color="transparent")
-        bubble_frame.pack(fill=tk.X, padx=pack_padx, pady=2, anchor=pack_anchor) # Less pady between bubbles
+        if before is not None:
+            bubble_frame.pack(fill=tk.X, padx=pack_padx, pady=2, anchor=pack_anchor, before=before)
+        else:
+            bubble_frame.pack(fill=tk.X, padx=pack_padx, pady=2, anchor=pack_anchor) # Less pady between bubbles
 
         msg_label = ctk.CTkLabel(bubble_frame, text=message,
                                  bg_color=bg_color, text_color=text_color,
@@ -738,17 +942,21 @@ class VikiUI:
         msg_label.bind("<Leave>", lambda e: msg_label.configure(bg_color=bg_color))
 
         # Auto-scroll to the bottom
-        self.chat_canvas.update_idletasks()
-        self.chat_canvas.yview_moveto(1.0)
+        if scroll:
+            self.chat_canvas.update_idletasks()
+            self.chat_canvas.yview_moveto(1.0)
 
     def add_image_message(self, image_path, sender="ai"):
+        # Thumbnailing happens on the cache's pool; the bubble is added when it is ready
+        full_image_path = resource_path(image_path)
+        self.chat_thumbs.request(full_image_path, callback=lambda path, thumb: self.queue.put(
+            ("image_message", {"path": path, "thumb": thumb, "sender": sender})))
+
+    def show_image_message(self, image_path, thumb, sender="ai"):
         try:
-            full_image_path = resource_path(image_path)
-            img = PIL.Image.open(full_image_path)
-            max_width = 400
-            max_height = 300
-            img.thumbnail((max_width, max_height), PIL.Image.Resampling.LANCZOS)
-            imgtk = PIL.ImageTk.PhotoImage(img)
+            if thumb is None:
+                raise ValueError(f"could not read {image_path}")
+            imgtk = PIL.ImageTk.PhotoImage(PIL.Image.open(thumb))
 
             bubble_frame = ctk.CTkFrame(self.messages_frame, fg_color="transparent")
             if sender == "user":
@@ -767,6 +975,7 @@ class VikiUI:
             self.chat_canvas.update_idletasks()
             self.chat_canvas.yview_moveto(1.0)
         except Exception as e:
+            log.warning("Error displaying image %s: %s", image_path, e)
             self.log_to_chat(f"Error displaying image: {e}")
 
 
@@ -775,7 +984,7 @@ class VikiUI:
         viki.speak(text)
 
     def listen_loop(self):
-        while not self.stop_event.is_set():
+        while not self.listen_stop.is_set():
             try:
                 # Add a message to indicate listening
                 self.queue.put(("update_status", "Listening..."))
@@ -786,7 +995,9 @@ class VikiUI:
                 if query:
                     self.queue.put(("add_message", {"message": query, "sender": "user"}))
                     # Perform task and get response if any
+                    started = time.time()
                     viki.perform_task(query)
+                    self.queue.put(("turn_latency", time.time() - started))
                 self.queue.put(("update_status", "Idle"))
                 self.queue.put(("update_indicator", "gray"))
 
@@ -806,8 +1017,9 @@ class VikiUI:
 
 
     def video_loop(self):
-        cap = cv2.VideoCapture(0)
-        if not cap.isOpened():
+        height, width = self.frame_ring.shape[:2]
+        camera = open_camera(CaptureConfig(width=width, height=height))
+        if camera is None:
             self.queue.put(("log_to_chat", "Error: Cannot open webcam. Make sure it's connected and not in use."))
             self.video_mode = False
             self.queue.put(("update_video_button_text", "Toggle Video Mode"))
@@ -820,26 +1032,31 @@ class VikiUI:
         self.queue.put(("show_video_label", None))
         self.queue.put(("hide_indicator_canvas", None)) # Hide indicator if video is showing
 
-        while self.video_mode and not self.stop_event.is_set():
-            ret, frame = cap.read()
-            if not ret:
-                self.queue.put(("log_to_chat", "Failed to grab frame."))
-                break
-            # Resize frame to 640x480 for display and recording consistency
-            frame_resized = cv2.resize(frame, (640, 480))
-            cv2image = cv2.cvtColor(frame_resized, cv2.COLOR_BGR2RGB)
-            self.current_frame = cv2image # Store current frame for photo capture
+        # Camera.frames paces to the configured FPS and skips frames cheaply when we fall behind
+        running = lambda: self.video_mode and not self.video_stop.is_set()
+        motion = MotionDetector()
+        last_display = 0.0
+        for captured, frame in camera.frames(running):
+            cv2image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            self.frame_ring.write(cv2image, captured) # Publish frame for photo capture and other readers
+
+            change = motion.update(cv2image, captured)
+            if change is not None:
+                self.preroll.paused = not change
+                self.queue.put(("presence", change))
+            # Nobody in view: refresh the display only now and then
+            if not motion.present and captured - last_display < ABSENT_DISPLAY_INTERVAL:
+                continue
+            last_display = captured
 
             # Display frame on Tkinter label
             pil_image = PIL.Image.fromarray(cv2image)
             imgtk = PIL.ImageTk.PhotoImage(image=pil_image)
-            self.queue.put(("update_video_frame", imgtk)) # Use queue for thread-safe update
-
-            if self.recording and self.video_writer:
-                self.video_writer.write(frame_resized) # Write BGR frame
-
-            time.sleep(0.03) # ~30 fps
-        cap.release()
+            self.queue.put(("update_video_frame", {"image": imgtk, "captured": captured})) # Use queue for thread-safe update
+        if running():
+            self.queue.put(("log_to_chat", "Failed to grab frame."))
+        log.info("Camera stopped: %s", camera.report())
+        camera.release()
         self.queue.put(("hide_video_label", None)) # Hide label when video stops
         self.queue.put(("show_indicator_canvas", None)) # Show indicator when video stops
         if self.recording:
@@ -871,9 +1088,40 @@ class VikiUI:
                     self.btn_stop_record.configure(state="normal" if data=="normal" else "disabled")
                 elif action == "update_capture_button_state":
                     self.btn_capture_photo.configure(state=data)
+                    self.btn_burst_photo.configure(state=data)
                 elif action == "update_video_frame":
-                    self.video_label.imgtk = data # Update image on main thread
-                    self.video_label.configure(image=data)
+                    self.video_label.imgtk = data["image"] # Update image on main thread
+                    self.video_label.configure(image=data["image"])
+                    latency = time.time() - data["captured"]
+                    self.frame_latency.add(latency)
+                    self.frame_log.debug("Frame shown %.1f ms after capture", latency * 1000)
+                elif action == "presence":
+                    self.on_presence(data)
+                elif action == "turn_latency":
+                    self.turn_latency.add(data)
+                    if self.history:
+                        self.history.record_latency(data)
+                elif action == "image_message":
+                    self.show_image_message(data["path"], data["thumb"], data["sender"])
+                elif action == "gallery_items":
+                    if self.gallery:
+                        self.gallery.set_items(data)
+                elif action == "gallery_tile":
+                    if self.gallery:
+                        self.gallery.show(*data)
+                elif action == "history_page":
+                    self.show_history_page(data)
+                elif action == "history_results":
+                    self.show_history_results(*data)
+                elif action == "video_failed":
+                    self.add_message(data, sender="ai")
+                    if self.video_mode:
+                        self.toggle_video_mode()
+                elif action == "recording_failed":
+                    self.add_message(data, sender="ai")
+                    self.recording = False
+                    self.btn_start_record.configure(state="normal")
+                    self.btn_stop_record.configure(state="disabled")
                 elif action == "show_video_label":
                     self.video_label.grid() # Show the video label
                 elif action == "hide_video_label":
@@ -891,32 +1139,111 @@ class VikiUI:
 
 
     def send_command(self, event=None):
+        self.hide_suggestions()
         command = self.entry.get().strip()
         if command:
             self.add_message(command, sender="user")
             self.entry.delete(0, tk.END)
-            # Perform task in a separate thread to keep UI responsive
-            threading.Thread(target=viki.perform_task, args=(command,), daemon=True).start()
+            if self.supervisor:
+                self.supervisor.send(AUDIO, "command", command)
+            else:
+                # Perform task in a separate thread to keep UI responsive
+                threading.Thread(target=viki.perform_task, args=(command,), daemon=True).start()
             self.update_status("Processing command...")
             self.update_indicator("orange")
 
 
+    def _sync_suggestions(self, action, iid, values):
+        old = self._suggested_commands.pop(iid, None)
+        if old is not None:
+            self.suggestions.remove(old, viki_suggest.CUSTOM)
+        if action != "delete":
+            self._suggested_commands[iid] = values[1]
+            self.suggestions.add(values[1], viki_suggest.CUSTOM)
+
+    def _load_suggestion_history(self):
+        for ts, text in self.history.user_queries():
+            self.suggestions.record_use(text, ts)
+
+    def schedule_suggestions(self, event=None):
+        if event is not None and event.keysym in ("Return", "Down", "Up", "Tab", "Escape"):
+            return
+        # Debounced: one lookup once typing pauses, not one per key
+        if self._suggest_job is not None:
+            self.root.after_cancel(self._suggest_job)
+        self._suggest_job = self.root.after(DEBOUNCE_MS, self.update_suggestions)
+
+    def update_suggestions(self):
+        self._suggest_job = None
+        matches = self.suggestions.suggest(self.entry.get())
+        self.suggestion_list.delete(0, tk.END)
+        if not matches:
+            self.suggestion_list.grid_remove()
+            return
+        for text in matches:
+            self.suggestion_list.insert(tk.END, text)
+        self.suggestion_list.configure(height=len(matches))
+        self.suggestion_list.grid()
+
+    def hide_suggestions(self):
+        if self._suggest_job is not None:
+            self.root.after_cancel(self._suggest_job)
+            self._suggest_job = None
+        self.suggestion_list.grid_remove()
+
+    def focus_suggestions(self, event=None):
+        if self.suggestion_list.winfo_ismapped():
+            self.suggestion_list.focus_set()
+            self.suggestion_list.selection_clear(0, tk.END)
+            self.suggestion_list.selection_set(0)
+            self.suggestion_list.activate(0)
+        return "break"
+
+    def accept_suggestion(self, event=None):
+        if not self.suggestion_list.winfo_ismapped():
+            return None
+        selection = self.suggestion_list.curselection()
+        text = self.suggestion_list.get(selection[0] if selection else 0)
+        self.entry.delete(0, tk.END)
+        self.entry.insert(0, text)
+        self.hide_suggestions()
+        self.entry.focus_set()
+        return "break"   # keep Tab from moving focus
+
     def toggle_video_mode(self):
         self.video_mode = not self.video_mode
         if self.video_mode:
             self.btn_video.configure(text="Stop Video Mode")
-            self.stop_event.clear()
-            self.video_thread = threading.Thread(target=self.video_loop, daemon=True)
-            self.video_thread.start()
+            if self.supervisor:
+                self.supervisor.send(VISION, "start_video")
+                self.video_label.grid()
+                self.indicator_canvas.grid_remove()
+                self.root.after(15, self.poll_frames)
+            else:
+                self.video_stop.clear()
+                self.video_thread = threading.Thread(target=self.video_loop, daemon=True)
+                self.video_thread.start()
+                self.preroll.start()
             self.btn_start_record.configure(state="normal")
             self.btn_capture_photo.configure(state="normal")
+            self.btn_burst_photo.configure(state="normal")
             self.log_to_chat("Video mode started.")
         else:
             self.btn_video.configure(text="Toggle Video Mode")
-            self.stop_event.set()
+            if self.supervisor:
+                self.supervisor.send(VISION, "stop_video")
+                self.video_label.grid_remove()
+                self.indicator_canvas.grid()
+            else:
+                self.video_stop.set()
+                self.preroll.stop()
+                self.preroll.clear()
+                self.preroll.paused = False
+            self.present = True
             self.btn_start_record.configure(state="disabled")
             self.btn_stop_record.configure(state="disabled")
             self.btn_capture_photo.configure(state="disabled")
+            self.btn_burst_photo.configure(state="disabled")
             if self.recording:
                 self.stop_recording()
             self.log_to_chat("Video mode stopped.")
@@ -924,15 +1251,8 @@ class VikiUI:
 
     def bind_button_sounds(self):
         def play_click(event=None): # Event is optional as sometimes bound without it
-            try:
-                # Play sound only if the sound file exists
-                if os.path.exists(self.click_sound_path):
-                    winsound.PlaySound(self.click_sound_path, winsound.SND_FILENAME | winsound.SND_ASYNC)
-                else:
-                    print(f"Warning: Click sound file not found at {self.click_sound_path}")
-            except Exception as e:
-                print(f"Error playing click sound: {e}") # Debugging
-                pass # Ignore sound errors
+            # Only queues the in-memory sound; overlapping clicks are mixed
+            self.sounds.play("click", CLICK_VOLUME)
 
         # Iterate through all widgets and bind them
         def bind_recursively(widget):
@@ -959,7 +1279,6 @@ class VikiUI:
     def start_recording(self):
         if not self.video_mode or self.recording:
             return
-        fourcc = None
         ext = self.video_format_var.get()
         # Define the output path for recordings
         output_dir = "recordings"
@@ -970,64 +1289,109 @@ class VikiUI:
         filename = os.path.join(output_dir, f"viki_recording_{timestamp}.{ext}")
 
         if ext == "mp4":
-            fourcc = cv2.VideoWriter_fourcc(*"mp4v") # For .mp4
+            fourcc = "mp4v" # For .mp4
         elif ext == "avi":
-            fourcc = cv2.VideoWriter_fourcc(*"XVID") # For .avi
+            fourcc = "XVID" # For .avi
         else:
             self.log_to_chat(f"Unsupported video format: {ext}")
             return
-        
-        # Get frame width and height from the captured frame
-        if self.current_frame is not None:
-            height, width, _ = self.current_frame.shape
-        else:
-            # Fallback if no frame is available (shouldn't happen if video_mode is active)
-            width, height = 640, 480 # Default to 640x480
 
-        self.video_writer = cv2.VideoWriter(filename, fourcc, 30.0, (width, height))
-        if not self.video_writer.isOpened():
-            self.log_to_chat("Failed to open video writer. Check codecs or file path permissions.")
-            self.video_writer = None
-            return
+        # The writer is opened on the recorder's thread; failures come back as "recording_failed"
+        if self.supervisor:
+            # The vision worker owns the frames, so it also owns the recorder
+            self.supervisor.send(VISION, "start_recording", {"filename": filename, "fourcc": fourcc})
+        else:
+            self.recorder.start(filename, fourcc)
         self.recording = True
         self.btn_start_record.configure(state="disabled")
         self.btn_stop_record.configure(state="normal")
-        self.log_to_chat(f"Recording started: {filename}")
 
     def stop_recording(self):
         if not self.recording:
             return
         self.recording = False
-        if self.video_writer:
-            self.video_writer.release()
-            self.video_writer = None
+        if self.supervisor:
+            self.supervisor.send(VISION, "stop_recording")
+        else:
+            self.recorder.stop()
         self.btn_start_record.configure(state="normal")
         self.btn_stop_record.configure(state="disabled")
         self.log_to_chat("Recording stopped.")
 
+    def set_preroll_seconds(self, value):
+        seconds = float(value)
+        if self.supervisor:
+            self.supervisor.send(VISION, "set_preroll", seconds)
+        else:
+            self.preroll.seconds = seconds
+
+    def set_photo_format(self, value):
+        self.photos.fmt = value
+
     def capture_photo(self):
-        if self.current_frame is None:
+        # Encoding and the file write happen on the photo pool; the result is logged from there
+        if self.photos.capture() is None:
             self.log_to_chat("No video frame available to capture photo.")
+
+    def capture_burst(self):
+        if self.photos.burst():
+            self.log_to_chat("Burst capture started.")
+
+
+    def poll_workers(self):
+        # Worker events use the same (action, data) items as the local threads
+        for item in self.supervisor.poll_events():
+            self.queue.put(item)
+        for message in self.supervisor.check():
+            self.log_to_chat(message)
+        self.root.after(50, self.poll_workers)
+
+    def poll_frames(self):
+        if not self.video_mode or not self.supervisor:
             return
-        try:
-            output_dir = "photos"
-            if not os.path.exists(output_dir):
-                os.makedirs(output_dir)
-            
-            timestamp = int(time.time())
-            filename = os.path.join(output_dir, f"viki_photo_{timestamp}.png")
-            # Convert RGB (PIL) to BGR (OpenCV) for imwrite
-            cv2.imwrite(filename, cv2.cvtColor(self.current_frame, cv2.COLOR_RGB2BGR))
-            self.log_to_chat(f"Photo captured and saved as {filename}")
-        except Exception as e:
-            self.log_to_chat(f"Failed to capture photo: {e}")
+        result = self.display_reader.latest(only_new=True)
+        if result is not None:
+            _, captured, frame = result
+            imgtk = PIL.ImageTk.PhotoImage(image=PIL.Image.fromarray(frame))
+            self.video_label.imgtk = imgtk
+            self.video_label.configure(image=imgtk)
+            latency = time.time() - captured
+            self.frame_latency.add(latency)
+            self.frame_log.debug("Frame shown %.1f ms after capture", latency * 1000)
+        self.root.after(15 if self.present else int(ABSENT_DISPLAY_INTERVAL * 1000), self.poll_frames)
+
+    def on_presence(self, present):
+        self.present = present
+        self.log_to_chat("Someone is in view." if present else "Nobody in view; video paused to save power.")
+        if self.auto_listen_var.get():
+            if present:
+                self.start_listening()
+            else:
+                self.stop_listening()
+
+    def shutdown(self):
+        self.stop_listening()
+        self.video_stop.set()
+        self.stop_recording()
+        self.photos.close()  # let queued photos finish writing
+        if self.history:
+            self.history.close()  # writes what is still queued
+        self.thumbs.close()
+        self.chat_thumbs.close()
+        if self.supervisor:
+            self.supervisor.stop()
+        for stats in (self.frame_latency, self.turn_latency, self.sounds.latency):
+            log.info(stats.summary())
+        self.sounds.close()
 
 
 # --- Main Application Entry Point ---
 
 def main():
+    # Log records are written by a background thread to logs/viki.jsonl
+    viki_log.setup()
     try:
-        print("Starting Viki UI...")
+        log.info("Starting Viki UI")
 
         # Initialize a temporary Tkinter root for message boxes, then hide it.
         temp_tk_root = tk.Tk()
@@ -1043,10 +1407,12 @@ def main():
         try:
             play_opening_video("jarvis/VIKI_opening.mp4")
         except Exception as e:
-            print(f"Warning: Could not play opening video splash screen. Error: {e}")
+            log.warning("Could not play opening video splash screen: %s", e)
 
         root = ctk.CTk()
-        app = VikiUI(root)
+        # `--workers` (or VIKI_WORKERS=1) runs audio and vision in separate processes
+        use_workers = "--workers" in sys.argv or os.environ.get("VIKI_WORKERS") == "1"
+        app = VikiUI(root, use_workers=use_workers)
 
         # Opening fade-in animation
         def fade_in(window, alpha=0.0, step=0.05):
@@ -1060,21 +1426,16 @@ def main():
         root.attributes("-alpha", 0.0)
         fade_in(root)
 
-        # Play opening sound asynchronously
-        def play_opening_sound():
-            try:
-                winsound.PlaySound("SystemStart", winsound.SND_ALIAS)
-            except Exception as e:
-                print(f"Warning: Could not play system start sound: {e}")
-
-        threading.Thread(target=play_opening_sound, daemon=True).start()
+        # Play opening sound (returns at once; the sound service's stream plays it)
+        app.sounds.play("startup")
 
         # Handle window close protocol
-        root.protocol("WM_DELETE_WINDOW", lambda: (app.stop_listening(), app.stop_recording(), root.destroy()))
+        root.protocol("WM_DELETE_WINDOW", lambda: (app.shutdown(), root.destroy()))
         root.mainloop()
-        print("Viki UI closed.")
+        log.info("Viki UI closed")
     except Exception as e:
-        print(f"Error starting Viki UI: {e}")
+        log.exception("Error starting Viki UI")
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support() # Needed for worker processes in the PyInstaller build
     main()
\ No newline at end of file
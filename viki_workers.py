@@ -0,0 +1,336 @@
+"""
+Multi-process mode for VIKI.
+
+The Tk process only draws. Microphone capture, recognition, perform_task and
+TTS run in an "audio" worker process; webcam capture, resize/convert and video
+encoding run in a "vision" worker process. Workers receive commands on their own
+multiprocessing queue and report back on one shared event queue using the same
+(action, data) tuples VikiUI.process_queue already understands. Camera frames
+are not sent through a queue: the vision worker writes them into a FrameRing in
+shared memory and the UI reads the newest one.
+
+WorkerSupervisor restarts a worker that dies and replays the last mode commands
+(listening on, video on) so the user does not have to.
+
+`python viki_workers.py --bench` runs the same spoken-command turns with
+perform_task on a thread in the UI process and in the audio worker, and
+compares turn latency and how late a 60 Hz UI loop ticks meanwhile.
+"""
+import os
+import time
+import queue
+import logging
+import argparse
+import threading
+import statistics
+import multiprocessing as mp
+from collections import deque
+
+import viki_log
+from viki_frames import FrameRing
+
+log = logging.getLogger(__name__)
+
+AUDIO = "audio"
+VISION = "vision"
+MAX_RESTARTS = 5
+RESTART_BACKOFF_SECONDS = 1.0
+STOP_TIMEOUT_SECONDS = 3.0
+
+# Commands that put a worker into a mode; the latest one per group is replayed after a restart.
+STICKY_COMMANDS = {
+    "start_listening": "listening", "stop_listening": "listening",
+    "start_video": "video", "stop_video": "video",
+}
+
+
+class LatencyStats:
+    """Rolling latency samples with a printable percentile summary."""
+
+    def __init__(self, name, window=1000):
+        self.name = name
+        self.samples = deque(maxlen=window)
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def summary(self):
+        if not self.samples:
+            return f"{self.name}: no samples"
+        ordered = sorted(self.samples)
+        p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+        return (f"{self.name}: n={len(ordered)} p50={statistics.median(ordered) * 1000:.1f} ms "
+                f"p95={p95 * 1000:.1f} ms max={ordered[-1] * 1000:.1f} ms")
+
+
+# --- Worker processes ---
+
+def audio_worker(commands, events):
+    # One log file per process: rotation is not safe across processes
+    viki_log.setup(os.path.join(viki_log.LOG_DIR, f"viki-{AUDIO}.jsonl"))
+    import viki
+    viki.prewarm_speech()   # this process does the talking
+
+    stop_listening = threading.Event()
+    stop_listening.set()
+
+    def run_turn(query):
+        started = time.time()
+        viki.perform_task(query)
+        events.put(("turn_latency", time.time() - started))
+
+    def listen_loop():
+        while not stop_listening.is_set():
+            try:
+                events.put(("update_status", "Listening..."))
+                events.put(("update_indicator", "green"))
+                query = viki.recognize_speech()
+                events.put(("update_status", "Processing..."))
+                events.put(("update_indicator", "orange"))
+                if query:
+                    events.put(("add_message", {"message": query, "sender": "user"}))
+                    run_turn(query)
+            except Exception as e:
+                events.put(("add_message", {"message": f"An unexpected error occurred during listening: {e}", "sender": "ai"}))
+            events.put(("update_status", "Idle"))
+            events.put(("update_indicator", "gray"))
+            time.sleep(0.1)
+
+    for command, data in iter(commands.get, None):
+        if command == "start_listening" and stop_listening.is_set():
+            stop_listening.clear()
+            threading.Thread(target=listen_loop, daemon=True).start()
+        elif command == "stop_listening":
+            stop_listening.set()
+        elif command == "command":
+            threading.Thread(target=run_turn, args=(data,), daemon=True).start()
+
+
+def vision_worker(commands, events, ring_spec):
+    viki_log.setup(os.path.join(viki_log.LOG_DIR, f"viki-{VISION}.jsonl"))
+    import cv2
+    from viki_recorder import PreRollBuffer, Recorder
+    from viki_camera import CaptureConfig, open_camera
+    from viki_motion import MotionDetector
+
+    ring = FrameRing.attach(ring_spec)
+    height, width = ring.shape[:2]
+    camera = None
+    frames = None
+    preroll = PreRollBuffer(ring)
+    recorder = Recorder(ring, preroll, on_event=lambda action, data: events.put((action, data)))
+    motion = MotionDetector()
+
+    def stop_video():
+        nonlocal camera, frames
+        recorder.stop()
+        preroll.stop()
+        preroll.clear()
+        preroll.paused = False
+        motion.reset()
+        if camera is not None:
+            log.info("Camera stopped: %s", camera.report())
+            camera.release()
+            camera = frames = None
+
+    try:
+        while True:
+            try:
+                item = commands.get_nowait() if camera is not None else commands.get(timeout=0.2)
+            except queue.Empty:
+                item = ("", None)
+            if item is None:
+                break
+            command, data = item
+            if command == "start_video" and camera is None:
+                camera = open_camera(CaptureConfig(width=width, height=height))
+                if camera is None:
+                    events.put(("video_failed", "Error: Cannot open webcam. Make sure it's connected and not in use."))
+                else:
+                    # One frame per loop pass so commands are still checked between frames
+                    frames = camera.frames(lambda: True)
+                    preroll.start()
+            elif command == "stop_video":
+                stop_video()
+            elif command == "start_recording" and camera is not None:
+                recorder.start(data["filename"], data["fourcc"])
+            elif command == "stop_recording":
+                recorder.stop()
+            elif command == "set_preroll":
+                preroll.seconds = data
+
+            if camera is not None:
+                captured, frame = next(frames, (None, None))
+                if frame is None:
+                    stop_video()
+                    events.put(("video_failed", "Failed to grab frame."))
+                    continue
+                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                ring.write(frame_rgb, captured)
+                change = motion.update(frame_rgb, captured)
+                if change is not None:
+                    preroll.paused = not change
+                    events.put(("presence", change))
+    finally:
+        stop_video()
+        ring.close()
+
+
+# --- Supervisor (runs in the UI process) ---
+
+class WorkerSupervisor:
+    def __init__(self, frame_shape=(480, 640, 3)):
+        self.ctx = mp.get_context("spawn")
+        self.events = self.ctx.Queue()
+        self.ring = FrameRing(frame_shape, shared=True)
+        self.workers = {
+            AUDIO: {"target": audio_worker, "args": ()},
+            VISION: {"target": vision_worker, "args": (self.ring.spec(),)},
+        }
+        for worker in self.workers.values():
+            worker.update(process=None, commands=None, restarts=0, sticky={}, restart_at=None)
+
+    def _spawn(self, name):
+        worker = self.workers[name]
+        worker["commands"] = self.ctx.Queue()
+        worker["process"] = self.ctx.Process(target=worker["target"], name=f"viki-{name}",
+                                             args=(worker["commands"], self.events) + worker["args"],
+                                             daemon=True)
+        worker["process"].start()
+        for command in worker["sticky"].values():
+            worker["commands"].put((command, None))
+
+    def start(self):
+        for name in self.workers:
+            self._spawn(name)
+
+    def send(self, name, command, data=None):
+        worker = self.workers[name]
+        if command in STICKY_COMMANDS:
+            worker["sticky"][STICKY_COMMANDS[command]] = command
+        if worker["commands"] is not None:
+            worker["commands"].put((command, data))
+
+    def poll_events(self):
+        """Drain pending worker events without blocking."""
+        items = []
+        while True:
+            try:
+                items.append(self.events.get_nowait())
+            except queue.Empty:
+                return items
+
+    def check(self):
+        """Restart crashed workers. Returns chat messages describing what happened."""
+        messages = []
+        now = time.monotonic()
+        for name, worker in self.workers.items():
+            process = worker["process"]
+            if process is None or process.is_alive():
+                continue
+            if worker["restart_at"] is None:
+                if worker["restarts"] >= MAX_RESTARTS:
+                    continue
+                worker["restarts"] += 1
+                worker["restart_at"] = now + RESTART_BACKOFF_SECONDS * worker["restarts"]
+                messages.append(f"The {name} worker stopped (exit code {process.exitcode}); restarting.")
+            elif now >= worker["restart_at"]:
+                worker["restart_at"] = None
+                self._spawn(name)
+        return messages
+
+    def stop(self):
+        for worker in self.workers.values():
+            if worker["commands"] is not None:
+                worker["commands"].put(None)
+        for worker in self.workers.values():
+            process = worker["process"]
+            if process is not None:
+                process.join(STOP_TIMEOUT_SECONDS)
+                if process.is_alive():
+                    process.terminate()
+        self.ring.close()
+
+
+# --- Benchmark ---
+
+def _run_turns(submit, poll, turns, tick):
+    """
+    A stand-in for the Tk loop: tick every `tick` seconds, drain events, and submit the
+    next turn once the last one reported its turn_latency. Returns (work, seen, lateness):
+    perform_task's own time, submit-to-event time as the loop sees it, and tick lateness.
+    """
+    work = LatencyStats("perform_task time")
+    seen = LatencyStats("turn seen by UI")
+    lateness = LatencyStats("UI tick lateness")
+    submitted_at = None
+    done = 0
+    deadline = time.perf_counter()
+    while done < turns:
+        deadline += tick
+        time.sleep(max(0.0, deadline - time.perf_counter()))
+        now = time.perf_counter()
+        lateness.add(max(0.0, now - deadline))
+        deadline = max(deadline, now - tick)
+        for action, data in poll():
+            if action == "turn_latency" and submitted_at is not None:
+                work.add(data)
+                seen.add(now - submitted_at)
+                submitted_at = None
+                done += 1
+        if submitted_at is None and done < turns:
+            submitted_at = time.perf_counter()
+            submit()
+    return work, seen, lateness
+
+
+def benchmark(turns=30, query="what is the time", tick=1 / 60):
+    import viki
+
+    def drain(q):
+        items = []
+        while True:
+            try:
+                items.append(q.get_nowait())
+            except queue.Empty:
+                return items
+
+    # Single process: what VikiUI does without --workers
+    viki.prewarm_speech()
+    events = queue.Queue()
+
+    def run_turn():
+        started = time.time()
+        viki.perform_task(query)
+        events.put(("turn_latency", time.time() - started))
+
+    submit = lambda: threading.Thread(target=run_turn, daemon=True).start()
+    _run_turns(submit, lambda: drain(events), 1, tick)   # warm-up
+    results = {"single-process": _run_turns(submit, lambda: drain(events), turns, tick)}
+
+    supervisor = WorkerSupervisor()
+    supervisor.start()
+    try:
+        submit = lambda: supervisor.send(AUDIO, "command", query)
+        _run_turns(submit, supervisor.poll_events, 1, tick)   # waits out the worker's start-up
+        results["workers"] = _run_turns(submit, supervisor.poll_events, turns, tick)
+    finally:
+        supervisor.stop()
+
+    print(f"{turns} turns of {query!r}, UI loop at {1 / tick:.0f} Hz, {os.cpu_count()} CPU(s)")
+    for mode, stats in results.items():
+        for stat in stats:
+            print(f"{mode:>15} {stat.summary()}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="VIKI worker processes")
+    parser.add_argument("--bench", action="store_true", help="Compare turn latency in-process and in the audio worker")
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--query", default="what is the time")
+    args = parser.parse_args()
+    if args.bench:
+        benchmark(args.turns, args.query)
+    else:
+        parser.print_help()